@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+from PySide6.QtCore import QObject, Signal, QFile, QIODevice
+from services.request_service import async_request
+
+
+class UploadResumeStore:
+    """
+    断点续传记录：本地文件 -> 服务端 file_id
+    以 (绝对路径, 大小, 修改时间) 作为 key，文件变化后自动失效
+    """
+    FILE_PATH = "upload_resume.json"
+
+    def __init__(self):
+        self.data = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.FILE_PATH):
+            return
+        try:
+            with open(self.FILE_PATH, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+        except Exception:
+            self.data = {}
+
+    def save(self):
+        with open(self.FILE_PATH, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=4, ensure_ascii=False)
+
+    @staticmethod
+    def key_for(file_path):
+        st = os.stat(file_path)
+        return f"{os.path.abspath(file_path)}|{st.st_size}|{int(st.st_mtime)}"
+
+    def get(self, file_path):
+        return self.data.get(self.key_for(file_path))
+
+    def set(self, file_path, file_id):
+        self.data[self.key_for(file_path)] = file_id
+        self.save()
+
+    def remove(self, file_path):
+        if self.data.pop(self.key_for(file_path), None) is not None:
+            self.save()
+
+
+upload_resume_store = UploadResumeStore()
+
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    """流式计算文件 sha256，不一次性读入内存"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class ChunkedUploader(QObject):
+    """
+    分片上传参考图片：
+        1. POST /upload/sessions 初始化（或 GET /upload/sessions/{id} 续传）
+        2. 并发 PUT /upload/sessions/{id}/chunks/{n}?offset=...，失败的分片单独重试
+        3. POST /upload/sessions/{id}/complete 携带 sha256 校验
+    完成后发出 finished(data)，data 与 POST /upload 的返回一致（file_id、file_url）
+    """
+    progress = Signal(int, int)  # 已完成分片数, 总分片数
+    finished = Signal(dict)
+    failed = Signal(str)
+
+    def __init__(self, file_path, parent=None, max_parallel=3, max_retries=3):
+        super().__init__(parent)
+        self.file_path = file_path
+        self.max_parallel = max_parallel
+        self.max_retries = max_retries
+
+        self.file_id = None
+        self.checksum = None
+        self.chunk_size = 0
+        self.total_chunks = 0
+        self.pending = []          # 待上传的分片序号
+        self.in_flight = set()     # 正在上传的分片序号
+        self.done_count = 0
+        self.retries = {}
+        self.aborted = False
+        self.file = None
+
+    # ------------------------------
+    # 对外接口
+    # ------------------------------
+    def start(self):
+        if not os.path.isfile(self.file_path):
+            self.__fail(f"文件不存在: {self.file_path}")
+            return
+        self.checksum = file_sha256(self.file_path)
+
+        file_id = upload_resume_store.get(self.file_path)
+        if file_id:
+            # 之前上传过一部分，先问服务端已经收到哪些分片
+            async_request(
+                sender=self,
+                method="GET",
+                url=f"/upload/sessions/{file_id}",
+                data=None,
+                handle_response=self.__handle_resume_response,
+                handle_error=lambda _msg: self.__init_session(),
+            )
+        else:
+            self.__init_session()
+
+    def abort(self):
+        self.aborted = True
+        self.pending.clear()
+        self.__close_file()
+
+    def show_error(self, message: str):
+        # async_request 的 sender 约定接口
+        self.__fail(message)
+
+    # ------------------------------
+    # 初始化 / 续传
+    # ------------------------------
+    def __init_session(self):
+        data = {
+            "filename": os.path.basename(self.file_path),
+            "total_size": os.path.getsize(self.file_path),
+            "checksum": self.checksum,
+        }
+        async_request(
+            sender=self,
+            method="POST",
+            url="/upload/sessions",
+            data=data,
+            handle_response=self.__handle_session_response,
+        )
+
+    def __handle_resume_response(self, reply):
+        result = json.loads(reply.readAll().data().decode("utf-8"))
+        session_data = result.get("data") or {}
+        if result.get("code") != 200 or session_data.get("status") == "completed":
+            # 会话已失效（或已完成但结果未知），重新开始
+            upload_resume_store.remove(self.file_path)
+            self.__init_session()
+            return
+        self.__start_chunks(session_data)
+
+    def __handle_session_response(self, reply):
+        result = json.loads(reply.readAll().data().decode("utf-8"))
+        if result.get("code") != 200:
+            self.__fail(result.get("message", "初始化上传失败"))
+            return
+        session_data = result.get("data", {})
+        upload_resume_store.set(self.file_path, session_data.get("file_id"))
+        self.__start_chunks(session_data)
+
+    def __start_chunks(self, session_data):
+        self.file_id = session_data.get("file_id")
+        self.chunk_size = session_data.get("chunk_size") or 0
+        self.total_chunks = session_data.get("total_chunks") or 0
+        received = set(session_data.get("received") or [])
+        self.pending = [i for i in range(self.total_chunks) if i not in received]
+        self.done_count = self.total_chunks - len(self.pending)
+        self.progress.emit(self.done_count, self.total_chunks)
+
+        self.file = QFile(self.file_path)
+        if not self.file.open(QIODevice.ReadOnly):
+            self.__fail("无法读取文件")
+            return
+        self.__pump()
+
+    # ------------------------------
+    # 分片调度
+    # ------------------------------
+    def __pump(self):
+        if self.aborted:
+            return
+        if not self.pending and not self.in_flight:
+            self.__complete()
+            return
+        while self.pending and len(self.in_flight) < self.max_parallel:
+            self.__send_chunk(self.pending.pop(0))
+
+    def __send_chunk(self, index):
+        offset = index * self.chunk_size
+        # 只在发送时读取当前分片，不把整个文件放进内存
+        self.file.seek(offset)
+        payload = self.file.read(self.chunk_size)
+        self.in_flight.add(index)
+        async_request(
+            sender=self,
+            method="PUT",
+            url=f"/upload/sessions/{self.file_id}/chunks/{index}?offset={offset}",
+            data=payload,
+            timeout=30000,
+            handle_response=lambda reply, i=index: self.__handle_chunk_response(reply, i),
+            handle_error=lambda msg, i=index: self.__retry_chunk(i, msg),
+        )
+
+    def __handle_chunk_response(self, reply, index):
+        result = json.loads(reply.readAll().data().decode("utf-8"))
+        if result.get("code") != 200:
+            self.__retry_chunk(index, result.get("message", "分片上传失败"))
+            return
+        self.in_flight.discard(index)
+        self.done_count += 1
+        self.progress.emit(self.done_count, self.total_chunks)
+        self.__pump()
+
+    def __retry_chunk(self, index, message):
+        self.in_flight.discard(index)
+        if self.aborted:
+            return
+        self.retries[index] = self.retries.get(index, 0) + 1
+        if self.retries[index] > self.max_retries:
+            # 保留续传记录，下次选择同一文件时从断点继续
+            self.abort()
+            self.__fail(f"分片 {index} 上传失败: {message}")
+            return
+        self.pending.insert(0, index)
+        self.__pump()
+
+    # ------------------------------
+    # 完成
+    # ------------------------------
+    def __complete(self):
+        self.__close_file()
+        async_request(
+            sender=self,
+            method="POST",
+            url=f"/upload/sessions/{self.file_id}/complete",
+            data={"checksum": self.checksum},
+            timeout=30000,
+            handle_response=self.__handle_complete_response,
+        )
+
+    def __handle_complete_response(self, reply):
+        result = json.loads(reply.readAll().data().decode("utf-8"))
+        if result.get("code") != 200:
+            # 校验失败说明服务端分片已损坏，丢弃续传记录，下次重新上传
+            upload_resume_store.remove(self.file_path)
+            self.__fail(result.get("message", "上传失败"))
+            return
+        upload_resume_store.remove(self.file_path)
+        self.finished.emit(result.get("data", {}))
+
+    def __close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __fail(self, message):
+        self.__close_file()
+        self.failed.emit(message)
@@ -0,0 +1,104 @@
+import json
+from urllib.parse import quote
+from PySide6.QtCore import QObject, Signal
+from services.local_store import LocalDB
+from services.request_service import async_request
+
+
+class GenerationSync(QObject):
+    """
+    生成记录增量同步：从本地游标开始请求 /user/generation_list/changes，
+    把新增/修改写入 LocalDB（在数据库工作线程执行），按墓碑删除本地记录，直到 has_more 为 false。
+    本地没有游标时为全量同步，结束后删除服务器上已不存在的本地记录。
+    finished(changed) 在同步结束时发出，changed 表示本地副本是否有变化
+    """
+    RESOURCE = "generations"
+    finished = Signal(bool)
+    failed = Signal(str)
+
+    def __init__(self, username, parent=None):
+        super().__init__(parent)
+        self.username = username
+        self.running = False
+        self._changed = False
+        self._seen = None           # 全量同步时收到的全部 task_id
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._changed = False
+        self._seen = None
+        self._request(LocalDB.instance().get_sync_cursor(self.username, self.RESOURCE))
+
+    def _request(self, cursor):
+        url = "/user/generation_list/changes"
+        if cursor:
+            url += f"?cursor={quote(cursor)}"
+        async_request(
+            sender=self,
+            method="GET",
+            url=url,
+            data=None,
+            timeout=15000,
+            handle_response=self._on_response,
+            handle_error=self._on_error
+        )
+
+    def _on_response(self, reply):
+        result = json.loads(reply.readAll().data().decode("utf-8"))
+        if result.get("code") != 200:
+            self._on_error(result.get("message", "同步生成记录失败"))
+            return
+        data = result.get("data", {})
+        records = data.get("records", [])
+        deleted = data.get("deleted", [])
+        if data.get("full") and self._seen is None:
+            self._seen = set()
+        if self._seen is not None:
+            self._seen.update(r.get("task_id") for r in records)
+
+        # 写入放到数据库工作线程，大批量同步时界面不卡顿
+        job = LocalDB.instance().run_async(_apply_changes, self.username, records, deleted)
+        job.finished.connect(lambda changed: self._on_applied(data, changed))
+        job.failed.connect(self._on_error)
+
+    def _on_applied(self, data, changed):
+        # 游标有重叠窗口，每次都会重复收到最新的几条；只有本地内容真的变了才算有变化
+        self._changed = self._changed or changed
+        if data.get("has_more"):
+            self._request(data.get("cursor"))
+            return
+        job = LocalDB.instance().run_async(_finish_sync, self.username, self.RESOURCE,
+                                           self._seen, data.get("cursor"))
+        job.finished.connect(self._on_finished)
+        job.failed.connect(self._on_error)
+
+    def _on_finished(self, removed):
+        self.running = False
+        self.finished.emit(self._changed or removed > 0)
+
+    def _on_error(self, message):
+        # 游标只在整轮成功后保存，失败时下次从原游标重新同步
+        self.running = False
+        self.failed.emit(message)
+
+    def show_error(self, message: str):
+        # async_request 的 sender 接口
+        self._on_error(message)
+
+
+def _apply_changes(db, username, records, deleted):
+    """写入一页变化，返回本地副本是否有变化"""
+    with db.transaction():
+        changed = db.upsert_generations(username, records)
+        removed = db.delete_generations(username, deleted)
+    return changed + removed > 0
+
+
+def _finish_sync(db, username, resource, seen, cursor):
+    """全量同步时删除服务器上已不存在的记录，然后保存游标；返回删除条数"""
+    removed = db.retain_generations(username, seen) if seen is not None else 0
+    if cursor:
+        db.set_sync_cursor(username, resource, cursor)
+    return removed
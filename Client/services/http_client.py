@@ -1,12 +1,45 @@
 from PySide6.QtCore import QIODevice, QObject, Signal, QTimer, QByteArray, QUrl, QFile,qDebug
-from PySide6.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply, QHttpMultiPart, QHttpPart
+from PySide6.QtNetwork import (
+    QNetworkAccessManager, QNetworkRequest, QNetworkReply, QHttpMultiPart, QHttpPart, QNetworkDiskCache
+)
+import hashlib
 import json
+import os
 from services.config import app_config
 from services.mock_reply import MockReply, mock_reply_manager
 
 SPECIAL_PREFIXES = {
     "outputs"
 }
+# 支持 ETag / If-None-Match 重新验证的 JSON 列表接口
+# （生成记录改为经 /user/generation_list/changes 增量同步，不再整表 GET）
+CONDITIONAL_ENDPOINTS = {
+    "user/favorite_list"
+}
+
+
+class BufferedReply:
+    """
+    body 已经读出（或来自本地缓存）的 reply：readAll() 每次都返回同一份数据，
+    status 不为空时覆盖 HTTP 状态码，其余方法转给原始 reply
+    """
+    def __init__(self, reply, body: QByteArray, status=None):
+        self._reply = reply
+        self._body = body
+        self._status = status
+
+    def readAll(self):
+        return QByteArray(self._body)
+
+    def attribute(self, key):
+        if self._status is not None and key == QNetworkRequest.HttpStatusCodeAttribute:
+            return self._status
+        return self._reply.attribute(key)
+
+    def __getattr__(self, name):
+        return getattr(self._reply, name)
+
+
 class HttpClient(QObject):
     BASE_URL = app_config.get_base_url()
     """注释:
@@ -26,9 +59,20 @@ class HttpClient(QObject):
         https://api.xxx.com/api/v1/…     https://api.xxx.com/generated_outputs/…
     """
     
+    CACHE_DIR = "http_cache"
+    MEDIA_CACHE_SIZE = 512 * 1024 * 1024     # /outputs/ 媒体文件磁盘缓存上限
+
     def __init__(self):
         super().__init__()
         self.manager = QNetworkAccessManager()
+        # 生成结果的文件名唯一且内容不会变化，命中磁盘缓存时不再走网络
+        self.disk_cache = QNetworkDiskCache(self)
+        self.disk_cache.setCacheDirectory(os.path.join(self.CACHE_DIR, "media"))
+        self.disk_cache.setMaximumCacheSize(self.MEDIA_CACHE_SIZE)
+        self.manager.setCache(self.disk_cache)
+        self.json_cache_dir = os.path.join(self.CACHE_DIR, "json")
+        self.stats = {"media_cache_hits": 0, "media_downloads": 0, "not_modified": 0,
+                      "json_downloads": 0, "network_bytes": 0}
 
     # ------------------------------
     # 发起 HTTP 请求
@@ -37,18 +81,61 @@ class HttpClient(QObject):
     # 若content_type为"image/png"等，data应为文件路径字符串
     # 若content_type为"application/json"，data应为字典
     # ------------------------------
-    def request(self, method, endpoint_url, content_type="application/json", data=None, token=None):
-
+    def resolve_url(self, endpoint_url) -> QUrl:
+        """endpoint 转换为完整地址（静态资源去掉 /api/v1）"""
         remove_api = any(endpoint_url.lstrip('/').startswith(prefix) for prefix in SPECIAL_PREFIXES)
 
         if remove_api:
             final_url = f"{self.BASE_URL.rsplit('/api/v1', 1)[0]}/{endpoint_url.lstrip('/')}"
         else:
             final_url = f"{self.BASE_URL}/{endpoint_url.lstrip('/')}"
-            
-        url = QUrl(final_url)
+        return QUrl(final_url)
+
+    # ------------------------------
+    # JSON 列表的 ETag 缓存：按 token 对应的账号分开保存，重启后仍可使用
+    # ------------------------------
+    @staticmethod
+    def _endpoint_key(endpoint_url):
+        return endpoint_url.split("?", 1)[0].strip("/")
+
+    def _json_cache_path(self, endpoint_url, account):
+        digest = hashlib.sha1(f"{account}|{endpoint_url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.json_cache_dir, f"{digest}.json")
+
+    def _load_json_cache(self, endpoint_url, account):
+        try:
+            with open(self._json_cache_path(endpoint_url, account), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_json_cache(self, endpoint_url, account, etag, body: QByteArray):
+        os.makedirs(self.json_cache_dir, exist_ok=True)
+        with open(self._json_cache_path(endpoint_url, account), "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "body": body.data().decode("utf-8")}, f, ensure_ascii=False)
+
+    def _is_conditional(self, method, endpoint_url, account):
+        return method.upper() == "GET" and account and self._endpoint_key(endpoint_url) in CONDITIONAL_ENDPOINTS
+
+    def request(self, method, endpoint_url, content_type="application/json", data=None, token=None, account=None):
+        """account: 可选，当前账号；提供时列表接口带 If-None-Match 重新验证"""
+
+        url = self.resolve_url(endpoint_url)
         request = QNetworkRequest(url)
 
+        if method.upper() == "GET" and url.path().startswith("/outputs/"):
+            request.setAttribute(QNetworkRequest.CacheLoadControlAttribute, QNetworkRequest.PreferCache)
+            request.setAttribute(QNetworkRequest.CacheSaveControlAttribute, True)
+        else:
+            # 接口响应不进 Qt 磁盘缓存，列表接口由下面的 ETag 缓存处理
+            request.setAttribute(QNetworkRequest.CacheLoadControlAttribute, QNetworkRequest.AlwaysNetwork)
+            request.setAttribute(QNetworkRequest.CacheSaveControlAttribute, False)
+
+        if self._is_conditional(method, endpoint_url, account):
+            cached = self._load_json_cache(endpoint_url, account)
+            if cached and cached.get("etag"):
+                request.setRawHeader(b"If-None-Match", cached["etag"].encode())
+
         if isinstance(content_type, str) and content_type.strip():
             request.setHeader(QNetworkRequest.ContentTypeHeader, content_type)
 
@@ -77,12 +164,14 @@ class HttpClient(QObject):
         elif method.upper() == "DELETE":
             reply = self.manager.deleteResource(request)
         else:
-            if content_type.startswith("image/") and isinstance(data, str):
+            if content_type and content_type.startswith("image/") and isinstance(data, str):
                 file = QFile(data)
                 file.open(QIODevice.ReadOnly)
                 payload = file.readAll()
             elif content_type == "application/json":
                 payload = QByteArray(json.dumps(data or {}).encode("utf-8"))
+            elif isinstance(data, (bytes, bytearray)):
+                payload = QByteArray(bytes(data))
             else:
                 payload = data
             if method.upper() == "POST":
@@ -94,6 +183,45 @@ class HttpClient(QObject):
 
         return reply
 
+    # ------------------------------
+    # 请求完成后由调用方交给 finalize：
+    #   304 时换成本地缓存的 body；200 且带 ETag 时保存 body；同时统计缓存命中情况
+    # ------------------------------
+    def finalize(self, method, endpoint_url, reply, account=None):
+        if app_config.get_env() == "offline" or reply.error() != QNetworkReply.NoError:
+            return reply
+
+        from_cache = bool(reply.attribute(QNetworkRequest.SourceIsFromCacheAttribute))
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        result = reply
+        if not self._is_conditional(method, endpoint_url, account):
+            if reply.url().path().startswith("/outputs/"):
+                self.stats["media_cache_hits" if from_cache else "media_downloads"] += 1
+            if not from_cache:
+                self.stats["network_bytes"] += reply.bytesAvailable()
+        elif status == 304:
+            cached = self._load_json_cache(endpoint_url, account)
+            if cached is not None:
+                self.stats["not_modified"] += 1
+                result = BufferedReply(reply, QByteArray(cached["body"].encode("utf-8")), status=200)
+        else:
+            body = reply.readAll()
+            self.stats["json_downloads"] += 1
+            self.stats["network_bytes"] += body.size()
+            etag = reply.rawHeader(b"ETag").data().decode()
+            if status == 200 and etag:
+                self._save_json_cache(endpoint_url, account, etag, body)
+            result = BufferedReply(reply, body)
+
+        if app_config.is_debug():
+            print(f"[HttpCache] {method} {endpoint_url} status={status} from_cache={from_cache} "
+                  f"stats={self.cache_stats()}")
+        return result
+
+    def cache_stats(self) -> dict:
+        """缓存统计（调试模式下每次请求完成时打印）"""
+        return dict(self.stats, media_cache_bytes=self.disk_cache.cacheSize())
+
 http_client = HttpClient()
 
 
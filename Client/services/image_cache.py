@@ -0,0 +1,116 @@
+import os
+from collections import OrderedDict
+from PySide6.QtGui import QPixmap
+from services.local_store import LocalDB, safe_filename_from_url
+
+
+class ImageCache:
+    """
+    缩略图两级缓存（历史记录、收藏、详情对话框共用）：
+      1. 内存：按字节预算的 LRU，key 为 (result_url, width)，值为已缩放好的 QPixmap
+      2. 磁盘：预先缩放好的缩略图文件，索引记在 LocalDB 的 thumbnails 表
+    命中磁盘时只需解码一张小图，不再每次读取原图再缩放
+    """
+    _instance = None
+
+    MEMORY_BUDGET = 64 * 1024 * 1024        # 内存中缩略图的字节上限
+    DISK_BUDGET = 256 * 1024 * 1024         # 磁盘缩略图的字节上限
+    THUMB_DIR = "local_thumbs"
+    PRUNE_EVERY = 50                        # 每写入多少张检查一次磁盘占用
+
+    @staticmethod
+    def instance():
+        if ImageCache._instance is None:
+            ImageCache._instance = ImageCache()
+        return ImageCache._instance
+
+    def __init__(self, memory_budget=None, disk_budget=None):
+        self.memory_budget = memory_budget or self.MEMORY_BUDGET
+        self.disk_budget = disk_budget or self.DISK_BUDGET
+        self._memory = OrderedDict()        # (url, width) -> QPixmap
+        self._memory_bytes = 0
+        self._writes = 0
+        self.hits = {"memory": 0, "disk": 0, "miss": 0}
+
+    @staticmethod
+    def _pixmap_bytes(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    # ---------- 内存层 ----------
+    def peek(self, url: str, width: int):
+        """只查内存（绘制时调用，不做磁盘 IO）"""
+        key = (url, width)
+        pixmap = self._memory.get(key)
+        if pixmap is not None:
+            self._memory.move_to_end(key)
+        return pixmap
+
+    def remember(self, url: str, width: int, pixmap: QPixmap):
+        """只放入内存层（来源本身就是磁盘缩略图时使用）"""
+        key = (url, width)
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= self._pixmap_bytes(old)
+        self._memory[key] = pixmap
+        self._memory_bytes += self._pixmap_bytes(pixmap)
+        while self._memory_bytes > self.memory_budget and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= self._pixmap_bytes(evicted)
+
+    def thumbnail_path(self, url: str, width: int):
+        """磁盘层中该尺寸缩略图的路径（文件存在时），供后台线程解码"""
+        path = LocalDB.instance().get_thumbnail_path(url, width)
+        return path if path and os.path.exists(path) else None
+
+    # ---------- 两级查询 ----------
+    def get(self, url: str, width: int):
+        """先查内存，再查磁盘缩略图；都没有返回 None"""
+        pixmap = self.peek(url, width)
+        if pixmap is not None:
+            self.hits["memory"] += 1
+            return pixmap
+
+        path = self.thumbnail_path(url, width)
+        if path:
+            pixmap = QPixmap(path)
+            if not pixmap.isNull():
+                self.hits["disk"] += 1
+                self.remember(url, width, pixmap)
+                return pixmap
+        self.hits["miss"] += 1
+        return None
+
+    def thumbnail_target(self, url: str, width: int) -> str:
+        """新缩略图的写入路径（由解码线程写文件，写完再调用 add 登记）"""
+        name, _ = os.path.splitext(safe_filename_from_url(url))
+        return os.path.join(self.THUMB_DIR, f"{name}_{width}.jpg")
+
+    def add(self, url: str, width: int, pixmap: QPixmap, path: str = None):
+        """
+        放入一张已缩放好的缩略图；path 为后台线程已写好的磁盘缩略图时一并登记到磁盘层。
+        GUI 线程里不做任何缩放或编码
+        """
+        self.remember(url, width, pixmap)
+        if not path or not os.path.exists(path):
+            return
+        LocalDB.instance().insert_thumbnail(url, width, path, os.path.getsize(path))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._remove_files(LocalDB.instance().prune_thumbnails(self.disk_budget))
+
+    def invalidate(self, url: str):
+        """记录被删除时清掉该 URL 的所有尺寸（内存与磁盘）"""
+        for key in [k for k in self._memory if k[0] == url]:
+            self._memory_bytes -= self._pixmap_bytes(self._memory.pop(key))
+        self._remove_files(LocalDB.instance().delete_thumbnails_by_url(url))
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self._memory), "memory_bytes": self._memory_bytes, **self.hits}
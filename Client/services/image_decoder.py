@@ -0,0 +1,140 @@
+import os
+import threading
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QThread, QBuffer, QByteArray, QIODevice, QSize, Signal
+from PySide6.QtGui import QImage, QImageReader
+
+
+class DecodeJob(QObject):
+    """
+    一次解码请求的句柄（属于 GUI 线程）。
+    finished(QImage) / failed(str) 总是在 GUI 线程中发出；cancel() 之后不会再发出任何信号
+    """
+    finished = Signal(QImage)
+    failed = Signal(str)
+    _done = Signal(QImage, str)       # 工作线程 -> GUI 线程
+
+    def __init__(self):
+        super().__init__()
+        self._cancelled = threading.Event()
+        self._task = None
+        self._owner = None
+        self._done.connect(self._on_done)
+
+    def watch(self, owner: QObject):
+        """owner 被销毁时自动取消"""
+        self._owner = owner
+        owner.destroyed.connect(self.cancel)
+
+    def cancel(self):
+        self._cancelled.set()
+        # 还在排队的直接从线程池移除；已经在执行的等它结束后由 _on_done 释放
+        if self._task is not None and ImageDecoder.instance().pool.tryTake(self._task):
+            self._release()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _release(self):
+        self._task = None
+        if self._owner is not None:
+            try:
+                self._owner.destroyed.disconnect(self.cancel)
+            except (RuntimeError, TypeError):
+                pass
+            self._owner = None
+
+    def _on_done(self, image, error):
+        self._release()
+        if self.is_cancelled():
+            return
+        if error:
+            self.failed.emit(error)
+        else:
+            self.finished.emit(image)
+
+
+class _DecodeTask(QRunnable):
+    def __init__(self, job: DecodeJob, source, width, save_path, thumb_path):
+        super().__init__()
+        self.setAutoDelete(False)       # 由 DecodeJob 持有，便于 tryTake
+        self.job = job
+        self.source = source
+        self.width = width
+        self.save_path = save_path
+        self.thumb_path = thumb_path
+
+    def run(self):
+        if self.job.is_cancelled():
+            self.job._done.emit(QImage(), "已取消")
+            return
+        try:
+            image = self._decode()
+        except Exception as e:
+            image, error = QImage(), str(e)
+        else:
+            error = "" if not image.isNull() else "格式错误"
+        # 取消了也要通知，GUI 线程里的 _on_done 负责释放并丢弃结果
+        self.job._done.emit(image, error)
+
+    def _decode(self):
+        if isinstance(self.source, str):
+            reader = QImageReader(self.source)
+        else:
+            data = QByteArray(self.source)
+            if self.save_path:
+                # 下载的原图直接按原始字节落盘，不再解码后重新编码
+                os.makedirs(os.path.dirname(self.save_path) or ".", exist_ok=True)
+                with open(self.save_path, "wb") as f:
+                    f.write(data.data())
+            buffer = QBuffer()
+            buffer.setData(data)
+            buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+            reader = QImageReader(buffer)
+
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if self.width and size.isValid() and size.width() > self.width:
+            # 直接按目标尺寸解码，不生成整张原图
+            reader.setScaledSize(QSize(self.width, max(1, size.height() * self.width // size.width())))
+        image = reader.read()
+        if image.isNull():
+            raise RuntimeError(reader.errorString())
+        if self.thumb_path and not self.job.is_cancelled():
+            # 缩略图的 JPEG 编码也在后台线程完成；写入失败只是少了磁盘缓存，不影响显示
+            os.makedirs(os.path.dirname(self.thumb_path) or ".", exist_ok=True)
+            image.save(self.thumb_path, "JPG", 85)
+        return image
+
+
+class ImageDecoder:
+    """
+    图片解码线程池：QImageReader + setScaledSize 在后台线程按目标宽度解码，
+    QImage 通过信号交回 GUI 线程（QPixmap 只能在 GUI 线程创建）
+    """
+    _instance = None
+
+    @staticmethod
+    def instance():
+        if ImageDecoder._instance is None:
+            ImageDecoder._instance = ImageDecoder()
+        return ImageDecoder._instance
+
+    def __init__(self):
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max(2, QThread.idealThreadCount() - 1))
+
+    def decode(self, source, width=None, owner: QObject = None, save_path=None, thumb_path=None) -> DecodeJob:
+        """
+        source: 本地文件路径(str) 或图片字节(bytes / QByteArray)
+        width: 目标宽度，None 表示原尺寸
+        owner: 可选，owner 被销毁时自动取消
+        save_path: 可选，source 为字节时先原样写入该路径
+        thumb_path: 可选，解码后的图片编码为 JPEG 写入该路径（磁盘缩略图）
+        """
+        job = DecodeJob()
+        task = _DecodeTask(job, source, width, save_path, thumb_path)
+        job._task = task
+        if owner is not None:
+            job.watch(owner)
+        self.pool.start(task)
+        return job
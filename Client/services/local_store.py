@@ -1,8 +1,13 @@
 from PySide6.QtSql import QSqlDatabase, QSqlQuery
-from PySide6.QtCore import QMutex, QMutexLocker
+from PySide6.QtCore import QMutex, QMutexLocker, QObject, QRunnable, QThreadPool, Signal
+from contextlib import contextmanager
 from PySide6.QtGui import QPixmap
+import itertools
+import json
 import os
 import re
+import threading
+import time
 
 def safe_filename_from_url(url: str) -> str:
     base = os.path.basename(url)
@@ -37,9 +42,59 @@ def save_pixmap_from_url(url: str, pixmap: QPixmap, base_dir="local_result") ->
 
     return full_path
 
+class DBJob(QObject):
+    """
+    LocalDB.run_async 返回的句柄（属于发起调用的 GUI 线程）。
+    finished(result) / failed(message) 总是在 GUI 线程中发出
+    """
+    finished = Signal(object)
+    failed = Signal(str)
+    _done = Signal(object, str)       # 工作线程 -> GUI 线程
+
+    def __init__(self):
+        super().__init__()
+        self._done.connect(self._on_done)
+
+    def _on_done(self, result, error):
+        LocalDB._jobs.discard(self)
+        if error:
+            self.failed.emit(error)
+        else:
+            self.finished.emit(result)
+
+
+class _DBTask(QRunnable):
+    def __init__(self, job, fn, args):
+        super().__init__()
+        self.job = job
+        self.fn = fn
+        self.args = args
+
+    def run(self):
+        try:
+            result, error = self.fn(LocalDB.instance(), *self.args), ""
+        except Exception as e:
+            result, error = None, str(e) or type(e).__name__
+        self.job._done.emit(result, error)
+
+
 class LocalDB:
+    """
+    本地 SQLite 数据库。Qt 的数据库连接不能跨线程使用，所以每个线程第一次访问时
+    创建自己的命名连接（WAL 模式，读写互不阻塞），语句缓存与事务状态也按线程保存。
+    耗时的批量读写可以用 run_async 放到数据库工作线程执行，结果通过信号回到 GUI 线程
+    """
     _instance = None
     _mutex = QMutex()
+    _jobs = set()                   # 执行中的 DBJob，防止回调前被回收
+
+    DB_FILE = "local_records.db"
+    BUSY_TIMEOUT_MS = 5000          # 其他连接正在写入时最多等待的时间
+    WORKER_THREADS = 2
+
+    RECORD_FIELDS = ("id", "username", "local_path", "url", "generation_type", "prompt", "parameters")
+    # SQLite 单条语句最多 999 个参数，批量 IN 查询按这个大小分段
+    IN_CHUNK_SIZE = 500
 
     @staticmethod
     def instance():
@@ -58,16 +113,123 @@ class LocalDB:
         if hasattr(self, "_initialized"):
             return
 
-        self.db = QSqlDatabase.addDatabase("QSQLITE")
-        self.db.setDatabaseName("local_records.db")
+        self._local = threading.local()     # 每个线程的连接、语句缓存与事务深度
+        self._conn_seq = itertools.count()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
 
-        if not self.db.open():
-            raise RuntimeError("Failed to open database")
+        # 数据库工作线程：线程不过期，各自的连接可以一直复用
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(self.WORKER_THREADS)
+        self.pool.setExpiryTimeout(-1)
 
-        self._create_table()
+        self.db     # 在创建实例的线程里建表
 
         self._initialized = True
 
+    @property
+    def db(self) -> QSqlDatabase:
+        """当前线程的数据库连接（第一次访问时创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            name = f"local_records_{next(self._conn_seq)}"
+            conn = QSqlDatabase.addDatabase("QSQLITE", name)
+            conn.setDatabaseName(self.DB_FILE)
+            if not conn.open():
+                raise RuntimeError("Failed to open database")
+
+            query = QSqlQuery(conn)
+            # WAL：读写互不阻塞；synchronous=NORMAL 在 WAL 下仍然不会损坏数据库
+            query.exec("PRAGMA journal_mode=WAL")
+            query.exec("PRAGMA synchronous=NORMAL")
+            query.exec(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+
+            self._local.conn = conn
+            self._local.statements = {}     # SQL -> 已 prepare 的 QSqlQuery，重复执行时不再解析 SQL
+            self._local.tx_depth = 0
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self._create_table()
+                    self._schema_ready = True
+        return conn
+
+    def run_async(self, fn, *args) -> DBJob:
+        """
+        在数据库工作线程中执行 fn(db, *args)，返回 DBJob，结果通过 finished/failed 信号交回。
+        需要在有事件循环的线程（通常是 GUI 线程）中调用
+            LocalDB.instance().run_async(lambda db: db.get_generations(name)).finished.connect(...)
+        """
+        job = DBJob()
+        LocalDB._jobs.add(job)
+        self.pool.start(_DBTask(job, fn, args))
+        return job
+
+    # -------------------------------------------------------------
+    # 语句缓存与事务
+    # -------------------------------------------------------------
+
+    def _exec(self, sql, values=()):
+        """
+        执行一条带参数的语句，QSqlQuery 按 SQL 缓存复用。
+        返回的 query 读完结果后需要调用 finish()（_rows/_scalar 已处理）
+        """
+        conn = self.db
+        statements = self._local.statements
+        query = statements.get(sql)
+        if query is None:
+            query = QSqlQuery(conn)
+            if not query.prepare(sql):
+                raise RuntimeError(f"Prepare failed: {query.lastError().text()}")
+            statements[sql] = query
+        for i, v in enumerate(values):
+            query.bindValue(i, v)
+        if not query.exec():
+            print("SQL error:", query.lastError().text(), sql.split()[0])
+        return query
+
+    def _rows(self, sql, values=()):
+        query = self._exec(sql, values)
+        columns = query.record().count()
+        rows = []
+        while query.next():
+            rows.append(tuple(query.value(i) for i in range(columns)))
+        query.finish()
+        return rows
+
+    def _scalar(self, sql, values=()):
+        query = self._exec(sql, values)
+        value = query.value(0) if query.next() else None
+        query.finish()
+        return value
+
+    @contextmanager
+    def transaction(self):
+        """
+        批量写入放在一个事务里，只在最外层提交（可以嵌套）：
+            with db.transaction():
+                ...
+        """
+        conn = self.db
+        local = self._local
+        if local.tx_depth == 0:
+            conn.transaction()
+        local.tx_depth += 1
+        try:
+            yield
+        except Exception:
+            local.tx_depth -= 1
+            if local.tx_depth == 0:
+                conn.rollback()
+            raise
+        local.tx_depth -= 1
+        if local.tx_depth == 0:
+            conn.commit()
+
+    def _chunks(self, items):
+        items = list(items)
+        for i in range(0, len(items), self.IN_CHUNK_SIZE):
+            yield items[i:i + self.IN_CHUNK_SIZE]
+
     def _create_table(self):
         """
         创建业务表结构
@@ -86,98 +248,344 @@ class LocalDB:
             )
             """
         )
+        query.exec("CREATE INDEX IF NOT EXISTS idx_local_records_username ON local_records(username)")
+        query.exec("CREATE INDEX IF NOT EXISTS idx_local_records_type ON local_records(generation_type)")
+        # 服务器生成记录的本地副本（增量同步），data 为接口返回的整条记录 JSON
+        query.exec(
+            """
+            CREATE TABLE IF NOT EXISTS generations(
+                task_id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                created_at TEXT,
+                updated_at TEXT,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        query.exec("CREATE INDEX IF NOT EXISTS idx_generations_user_created ON generations(username, created_at)")
+        # 各账号各类数据的同步游标
+        query.exec(
+            """
+            CREATE TABLE IF NOT EXISTS sync_state(
+                username TEXT NOT NULL,
+                resource TEXT NOT NULL,
+                cursor TEXT,
+                PRIMARY KEY (username, resource)
+            )
+            """
+        )
+        # 缩略图磁盘缓存索引：同一 URL 可以有多个宽度
+        query.exec(
+            """
+            CREATE TABLE IF NOT EXISTS thumbnails(
+                url TEXT NOT NULL,
+                width INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                last_access INTEGER NOT NULL,
+                PRIMARY KEY (url, width)
+            )
+            """
+        )
+        self._create_fts_index()
+
+    # -------------------------------------------------------------
+    # 提示词全文索引
+    # -------------------------------------------------------------
+
+    # 中日韩字符：unicode61 分词会把连续的中文当成一个词，退化模式下逐字切开再按短语匹配
+    CJK_PATTERN = re.compile(r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])")
+    TRIGRAM_MIN_LEN = 3
+
+    def _create_fts_index(self):
+        """
+        generations 的提示词全文索引（FTS5），rowid 与 generations.rowid 一致。
+        优先使用 trigram 分词（任意子串匹配，适合中文）；SQLite 版本太旧不支持时
+        退化为 unicode61 + 中文逐字切分。FTS5 都不可用时 self.fts_mode 为 None，搜索返回 None
+        """
+        query = QSqlQuery(self.db)
+        created = False
+        for mode, tokenize in (("trigram", "trigram"), ("segmented", "unicode61")):
+            if query.exec(
+                f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts
+                USING fts5(prompt, extra, tokenize='{tokenize}')
+                """
+            ):
+                created = True
+                break
+        if not created:
+            self.fts_mode = None
+            return
+
+        query.exec("SELECT sql FROM sqlite_master WHERE name = 'generations_fts'")
+        sql = query.value(0) if query.next() else ""
+        self.fts_mode = "trigram" if "trigram" in sql else "segmented"
+        query.finish()
+
+        # 第一次建索引时把已有记录补进去
+        indexed = self._scalar("SELECT COUNT(*) FROM generations_fts")
+        total = self._scalar("SELECT COUNT(*) FROM generations")
+        if not indexed and total:
+            with self.transaction():
+                for rowid, data in self._rows("SELECT rowid, data FROM generations"):
+                    self._index_generation(rowid, json.loads(data))
+
+    def _fts_text(self, text):
+        if self.fts_mode == "segmented":
+            return self.CJK_PATTERN.sub(r" \1 ", text)
+        return text
+
+    def _index_generation(self, rowid, record):
+        """写入/覆盖一条记录的索引：prompt 与优化后的 prompt、参数文本"""
+        parameters = record.get("parameters")
+        extra = " ".join(filter(None, [
+            record.get("optimized_prompt") or "",
+            json.dumps(parameters, ensure_ascii=False) if parameters else ""
+        ]))
+        self._exec("DELETE FROM generations_fts WHERE rowid = ?", (rowid,))
+        self._exec("INSERT INTO generations_fts (rowid, prompt, extra) VALUES (?, ?, ?)",
+                   (rowid, self._fts_text(record.get("prompt") or ""), self._fts_text(extra)))
+
+    def search_generations(self, username, terms):
+        """
+        返回 prompt（或优化后的 prompt/参数）同时包含所有 terms 的记录 task_id 集合；
+        全文索引不可用时返回 None，由调用方退回逐条匹配
+        """
+        if not self.fts_mode:
+            return None
+        match, likes, values = [], [], []
+        for term in (t.strip() for t in terms):
+            if not term:
+                continue
+            if self.fts_mode == "trigram" and len(term) < self.TRIGRAM_MIN_LEN:
+                # trigram 至少需要 3 个字符，更短的词用 LIKE（仍在索引表内扫描）
+                pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                likes.append("(f.prompt LIKE ? ESCAPE '\\' OR f.extra LIKE ? ESCAPE '\\')")
+                values += [pattern, pattern]
+            else:
+                phrase = '"' + self._fts_text(term).strip().replace('"', '""') + '"'
+                match.append(phrase if self.fts_mode == "trigram" else phrase + " *")
+
+        sql = "SELECT g.task_id FROM generations_fts f JOIN generations g ON g.rowid = f.rowid WHERE g.username = ?"
+        params = [username]
+        if match:
+            sql += " AND generations_fts MATCH ?"
+            params.append(" AND ".join(match))
+        for clause in likes:
+            sql += " AND " + clause
+        params += values
+
+        # 每次的条件组合不同，不放进语句缓存
+        query = QSqlQuery(self.db)
+        query.prepare(sql)
+        for i, v in enumerate(params):
+            query.bindValue(i, v)
+        if not query.exec():
+            print("Search error:", query.lastError().text())
+            return None
+        ids = set()
+        while query.next():
+            ids.add(query.value(0))
+        return ids
 
     # -------------------------------------------------------------
     # 业务方法（直接可用）
     # -------------------------------------------------------------
 
+    INSERT_RECORD_SQL = """
+        INSERT OR IGNORE INTO local_records
+        (username, local_path, url, generation_type, prompt, parameters)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """
+
     def insert_record(self, username, local_path, url,
                       generation_type, prompt, parameters):
         """
         插入一条记录，URL 不重复（UNIQUE）时自动忽略
         """
-        query = QSqlQuery(self.db)
-        query.prepare(
-            """
-            INSERT OR IGNORE INTO local_records
-            (username, local_path, url, generation_type, prompt, parameters)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """
-        )
-        for v in (username, local_path, url,
-                  generation_type, prompt, parameters):
-            query.addBindValue(v)
+        self._exec(self.INSERT_RECORD_SQL, (username, local_path, url,
+                                            generation_type, prompt, parameters))
 
-        if not query.exec():
-            print("Insert error:", query.lastError().text())
+    def insert_records(self, records: list):
+        """
+        批量插入（单个事务），records 为 dict 列表，键同 insert_record 的参数
+        """
+        with self.transaction():
+            for r in records:
+                self._exec(self.INSERT_RECORD_SQL, (
+                    r.get("username"), r.get("local_path"), r.get("url"),
+                    r.get("generation_type"), r.get("prompt"), r.get("parameters")))
 
     def url_exists(self, url: str) -> bool:
         """
         判断 URL 是否存在
         """
-        query = QSqlQuery(self.db)
-        query.prepare(
-            "SELECT 1 FROM local_records WHERE url = ? LIMIT 1"
-        )
-        query.addBindValue(url)
-        query.exec()
-        return query.next()
+        return self._scalar("SELECT 1 FROM local_records WHERE url = ? LIMIT 1", (url,)) is not None
 
     def get_record_by_url(self, url: str):
         """
         根据 URL 获取整条记录，返回 dict 或 None
         """
-        query = QSqlQuery(self.db)
-        query.prepare(
-            """
-            SELECT id, username, local_path, url,
-                   generation_type, prompt, parameters
-            FROM local_records
-            WHERE url = ? LIMIT 1
-            """
-        )
-        query.addBindValue(url)
-        query.exec()
-
-        if query.next():
-            return {
-                "id": query.value(0),
-                "username": query.value(1),
-                "local_path": query.value(2),
-                "url": query.value(3),
-                "generation_type": query.value(4),
-                "prompt": query.value(5),
-                "parameters": query.value(6),
-            }
-        return None
+        rows = self._rows(
+            f"SELECT {', '.join(self.RECORD_FIELDS)} FROM local_records WHERE url = ? LIMIT 1", (url,))
+        return dict(zip(self.RECORD_FIELDS, rows[0])) if rows else None
+
+    def get_records_by_urls(self, urls) -> dict:
+        """
+        一次查询多个 URL，返回 {url: 记录 dict}，不存在的 URL 不在结果中
+        """
+        result = {}
+        for chunk in self._chunks(set(u for u in urls if u)):
+            placeholders = ", ".join("?" * len(chunk))
+            query = QSqlQuery(self.db)
+            query.prepare(f"SELECT {', '.join(self.RECORD_FIELDS)} FROM local_records WHERE url IN ({placeholders})")
+            for i, url in enumerate(chunk):
+                query.bindValue(i, url)
+            query.exec()
+            while query.next():
+                record = dict(zip(self.RECORD_FIELDS, (query.value(i) for i in range(len(self.RECORD_FIELDS)))))
+                result[record["url"]] = record
+        return result
 
     def get_value_by_url(self, url: str, field: str):
         """
         根据 URL 查找指定字段。例如：
             get_value_by_url(url, "local_path")
         """
-        allowed = {
-            "id", "username", "local_path",
-            "url", "generation_type", "prompt",
-            "parameters"
-        }
-
-        if field not in allowed:
+        if field not in self.RECORD_FIELDS:
             raise ValueError(f"Field not allowed: {field}")
 
-        query = QSqlQuery(self.db)
-        query.prepare(f"SELECT {field} FROM local_records WHERE url = ? LIMIT 1")
-        query.addBindValue(url)
-        query.exec()
-
-        return query.value(0) if query.next() else None
+        return self._scalar(f"SELECT {field} FROM local_records WHERE url = ? LIMIT 1", (url,))
     
     def delete_record_by_url(self, url: str):
         """
         根据 URL 删除对应记录
         """
-        query = QSqlQuery(self.db)
-        query.prepare("DELETE FROM local_records WHERE url = ?")
-        query.addBindValue(url)
-        if not query.exec():
-            print("Delete error:", query.lastError().text())
+        self._exec("DELETE FROM local_records WHERE url = ?", (url,))
+
+    def delete_records(self, urls):
+        """
+        批量删除（单个事务）
+        """
+        with self.transaction():
+            for url in urls:
+                self._exec("DELETE FROM local_records WHERE url = ?", (url,))
+
+    # -------------------------------------------------------------
+    # 生成记录本地副本与同步游标
+    # -------------------------------------------------------------
+
+    def get_generations(self, username) -> list:
+        """返回该账号本地保存的全部生成记录（按创建时间升序，与服务器列表一致）"""
+        rows = self._rows("SELECT data FROM generations WHERE username = ? ORDER BY created_at, rowid", (username,))
+        return [json.loads(data) for (data,) in rows]
+
+    def upsert_generations(self, username, records: list) -> int:
+        """
+        按 task_id 覆盖写入一批记录并更新全文索引（单个事务）。
+        与本地内容完全相同的记录跳过，返回实际新增/修改的条数
+        """
+        changed = 0
+        with self.transaction():
+            for record in records:
+                data = json.dumps(record, ensure_ascii=False)
+                if self._scalar("SELECT data FROM generations WHERE task_id = ? AND username = ?",
+                                (record.get("task_id"), username)) == data:
+                    continue
+                changed += 1
+                # ON CONFLICT DO UPDATE 保留原 rowid，全文索引按 rowid 覆盖
+                self._exec(
+                    """
+                    INSERT INTO generations (task_id, username, created_at, updated_at, data)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(task_id) DO UPDATE SET
+                        username = excluded.username,
+                        created_at = COALESCE(excluded.created_at, generations.created_at),
+                        updated_at = excluded.updated_at,
+                        data = excluded.data
+                    """,
+                    (record.get("task_id"), username, record.get("created_at"),
+                     record.get("updated_at"), data))
+                if self.fts_mode:
+                    rowid = self._scalar("SELECT rowid FROM generations WHERE task_id = ?", (record.get("task_id"),))
+                    self._index_generation(rowid, record)
+        return changed
+
+    def delete_generations(self, username, task_ids) -> int:
+        """删除一批记录及其全文索引（单个事务），返回本地实际删除的条数"""
+        removed = 0
+        with self.transaction():
+            for task_id in task_ids:
+                if self.fts_mode:
+                    rowid = self._scalar("SELECT rowid FROM generations WHERE username = ? AND task_id = ?",
+                                         (username, task_id))
+                    if rowid is not None:
+                        self._exec("DELETE FROM generations_fts WHERE rowid = ?", (rowid,))
+                query = self._exec("DELETE FROM generations WHERE username = ? AND task_id = ?", (username, task_id))
+                removed += max(0, query.numRowsAffected())
+        return removed
+
+    def retain_generations(self, username, task_ids) -> int:
+        """全量同步后删除不在 task_ids 中的本地记录，返回删除条数"""
+        keep = set(task_ids)
+        stale = [task_id for (task_id,) in self._rows("SELECT task_id FROM generations WHERE username = ?", (username,))
+                 if task_id not in keep]
+        self.delete_generations(username, stale)
+        return len(stale)
+
+    def get_sync_cursor(self, username, resource):
+        return self._scalar("SELECT cursor FROM sync_state WHERE username = ? AND resource = ? LIMIT 1",
+                            (username, resource))
+
+    def set_sync_cursor(self, username, resource, cursor):
+        self._exec("INSERT OR REPLACE INTO sync_state (username, resource, cursor) VALUES (?, ?, ?)",
+                   (username, resource, cursor))
+
+    # -------------------------------------------------------------
+    # 缩略图索引
+    # -------------------------------------------------------------
+
+    def get_thumbnail_path(self, url: str, width: int):
+        """查找指定宽度的缩略图文件路径，并刷新访问时间；没有返回 None"""
+        path = self._scalar("SELECT path FROM thumbnails WHERE url = ? AND width = ? LIMIT 1", (url, width))
+        if path is not None:
+            self._exec("UPDATE thumbnails SET last_access = ? WHERE url = ? AND width = ?",
+                       (int(time.time()), url, width))
+        return path
+
+    def insert_thumbnail(self, url: str, width: int, path: str, size: int):
+        """登记一张缩略图，已存在时覆盖"""
+        self._exec(
+            """
+            INSERT OR REPLACE INTO thumbnails (url, width, path, bytes, last_access)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (url, width, path, size, int(time.time())))
+
+    def delete_thumbnails_by_url(self, url: str) -> list:
+        """删除某个 URL 的所有缩略图索引，返回对应的文件路径（由调用方删除文件）"""
+        paths = [path for (path,) in self._rows("SELECT path FROM thumbnails WHERE url = ?", (url,))]
+        self._exec("DELETE FROM thumbnails WHERE url = ?", (url,))
+        return paths
+
+    def prune_thumbnails(self, max_bytes: int) -> list:
+        """
+        缩略图总大小超过 max_bytes 时按最久未访问淘汰索引，
+        返回被淘汰的文件路径（由调用方删除文件）
+        """
+        total = int(self._scalar("SELECT COALESCE(SUM(bytes), 0) FROM thumbnails") or 0)
+        if total <= max_bytes:
+            return []
+
+        evicted = []
+        for url, width, path, size in self._rows("SELECT url, width, path, bytes FROM thumbnails ORDER BY last_access"):
+            if total <= max_bytes:
+                break
+            evicted.append((url, width, path))
+            total -= int(size)
+
+        with self.transaction():
+            for url, width, _ in evicted:
+                self._exec("DELETE FROM thumbnails WHERE url = ? AND width = ?", (url, width))
+        return [path for _, _, path in evicted]
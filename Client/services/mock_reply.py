@@ -144,7 +144,8 @@ class MockReplyManager:
                 }
             }
         
-        # 精确匹配
+        # 精确匹配（忽略查询参数）
+        endpoint_url = endpoint_url.split("?", 1)[0]
         if endpoint_url in self.mock_data:
             if endpoint_url == "/user/favorite_list" and method.upper() == "POST":
                 import time
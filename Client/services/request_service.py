@@ -1,8 +1,10 @@
 import json
-from PySide6.QtCore import QTimer
+import heapq
+import itertools
+from PySide6.QtCore import QObject, QTimer, QByteArray
 from PySide6.QtNetwork import QNetworkReply, QNetworkRequest
 from services.session import session
-from services.http_client import http_client
+from services.http_client import http_client, BufferedReply
 import os
 import mimetypes
 from services.global_signals import global_signals
@@ -20,8 +22,12 @@ def get_content_type(data):
     根据 data 类型判断 Content-Type
     - dict -> application/json
     - str -> 文件路径，根据后缀返回 image/* MIME 类型
+    - bytes / QByteArray -> application/octet-stream（如分片上传）
     - 否则返回 None
     """
+    if isinstance(data, (bytes, bytearray, QByteArray)):
+        return "application/octet-stream"
+
     if is_json_serializable(data):
         return "application/json"
 
@@ -49,55 +55,233 @@ def check_if_unauthorized(reply: QNetworkReply):
         return True
     return False
 
-def async_request(sender,method, url, data, handle_response=None, timeout=3000):
-    print(url)
-    token = session.get_token()
-    content_type = get_content_type(data)
-    reply = http_client.request(method, url, content_type=content_type, data=data, token=token)
-    timer = QTimer(sender)
-    timer.setSingleShot(True)
-    is_timeout = False
-
-    def cleanup():
-        timer.deleteLater()
-        reply.deleteLater()
-
-    def on_timeout():
-        nonlocal is_timeout
-        if reply.isRunning():
-            is_timeout = True
-            reply.abort()
-            if sender:
-                sender.show_error("请求超时")
-            cleanup()
-
-    def on_finished():
-        nonlocal is_timeout
-        if is_timeout:
+# 请求优先级：交互操作 > 任务轮询 > 图片预取
+PRIORITY_INTERACTIVE = 0
+PRIORITY_POLLING = 1
+PRIORITY_PREFETCH = 2
+
+
+class _Waiter:
+    __slots__ = ("sender", "handle_response", "handle_error", "connection")
+
+    def __init__(self, sender, handle_response, handle_error):
+        self.sender = sender
+        self.handle_response = handle_response
+        self.handle_error = handle_error
+        self.connection = None
+
+
+class _PendingRequest:
+    __slots__ = ("method", "url", "content_type", "data", "token", "timeout", "priority", "seq",
+                 "host", "key", "waiters", "reply", "timer", "state")
+
+    def __init__(self, method, url, content_type, data, token, timeout, priority, host, key):
+        self.method = method
+        self.url = url
+        self.content_type = content_type
+        self.data = data
+        self.token = token
+        self.timeout = timeout
+        self.priority = priority
+        self.seq = 0
+        self.host = host
+        self.key = key
+        self.waiters = []
+        self.reply = None
+        self.timer = None
+        self.state = "queued"       # queued / running / done / cancelled
+
+
+class RequestScheduler(QObject):
+    """
+    客户端请求调度：
+      - 每个 host 最多 MAX_PER_HOST 个并发请求，其余按 (优先级, 提交顺序) 排队；
+        保留 RESERVED_INTERACTIVE 个名额只给交互请求，图片预取再多也不会挡住登录/生成
+      - 相同的 GET（同 URL、同 token）在排队或进行中时合并为一次网络请求，结果分发给所有回调
+      - sender 被销毁时移除它的回调；请求不再有任何回调时取消（排队中直接丢弃，进行中 abort）
+      - 超时从真正发出请求时开始计算，排队时间不算在内
+    """
+    MAX_PER_HOST = 4
+    RESERVED_INTERACTIVE = 1
+
+    def __init__(self):
+        super().__init__()
+        self._seq = itertools.count()
+        self._queues = {}           # host -> [(priority, seq, pending)]
+        self._running = {}          # host -> 进行中的数量
+        self._inflight = {}         # GET 合并 key -> pending
+        self.stats = {"started": 0, "coalesced": 0, "cancelled": 0}
+
+    def submit(self, sender, method, url, data, handle_response, timeout, handle_error, priority):
+        token = session.get_token()
+        key = None
+        if method.upper() == "GET" and data is None:
+            key = (url, token)
+            pending = self._inflight.get(key)
+            if pending is not None and pending.state in ("queued", "running"):
+                self.stats["coalesced"] += 1
+                pending.timeout = max(pending.timeout, timeout)
+                self._add_waiter(pending, sender, handle_response, handle_error)
+                if priority < pending.priority and pending.state == "queued":
+                    # 已在排队的预取被交互请求复用时提升优先级（旧的堆条目出队时跳过）
+                    pending.priority = priority
+                    self._push(pending)
+                    self._pump(pending.host)
+                return
+
+        qurl = http_client.resolve_url(url)
+        host = f"{qurl.host()}:{qurl.port()}"
+        pending = _PendingRequest(method, url, get_content_type(data), data, token, timeout, priority, host, key)
+        self._add_waiter(pending, sender, handle_response, handle_error)
+        if key is not None:
+            self._inflight[key] = pending
+        self._push(pending)
+        self._pump(host)
+
+    def _push(self, pending):
+        pending.seq = next(self._seq)
+        heapq.heappush(self._queues.setdefault(pending.host, []), (pending.priority, pending.seq, pending))
+
+    def _add_waiter(self, pending, sender, handle_response, handle_error):
+        waiter = _Waiter(sender, handle_response, handle_error)
+        if isinstance(sender, QObject):
+            waiter.connection = sender.destroyed.connect(lambda *_: self._on_sender_destroyed(pending, waiter))
+        pending.waiters.append(waiter)
+
+    def _release_waiters(self, pending):
+        for waiter in pending.waiters:
+            if waiter.connection is not None:
+                QObject.disconnect(waiter.connection)
+                waiter.connection = None
+
+    def _on_sender_destroyed(self, pending, waiter):
+        waiter.connection = None
+        if waiter in pending.waiters:
+            pending.waiters.remove(waiter)
+        if pending.waiters or pending.state not in ("queued", "running"):
             return
+        # 没有任何回调了，取消请求
+        self.stats["cancelled"] += 1
+        was_running = pending.state == "running"
+        pending.state = "cancelled"
+        self._forget(pending)
+        if was_running:
+            pending.timer.stop()
+            pending.reply.abort()
 
-        timer.stop()
-        if reply.error() != QNetworkReply.NoError:
-            if sender:
-                sender.show_error(f"网络错误: {reply.errorString()}")
-            cleanup()
+    def _forget(self, pending):
+        if pending.key is not None and self._inflight.get(pending.key) is pending:
+            del self._inflight[pending.key]
+
+    def _pump(self, host):
+        queue = self._queues.get(host, [])
+        while queue:
+            priority, seq, pending = queue[0]
+            if pending.state != "queued" or seq != pending.seq:
+                heapq.heappop(queue)        # 已取消或已提升优先级的旧条目
+                continue
+            limit = self.MAX_PER_HOST
+            if priority != PRIORITY_INTERACTIVE:
+                limit -= self.RESERVED_INTERACTIVE
+            if self._running.get(host, 0) >= limit:
+                break
+            heapq.heappop(queue)
+            self._start(pending)
+
+    def _start(self, pending):
+        pending.state = "running"
+        self._running[pending.host] = self._running.get(pending.host, 0) + 1
+        self.stats["started"] += 1
+        reply = http_client.request(pending.method, pending.url, content_type=pending.content_type,
+                                    data=pending.data, token=pending.token, account=session.get_user().get("account"))
+        pending.reply = reply
+        pending.timer = QTimer()
+        pending.timer.setSingleShot(True)
+        reply.finished.connect(lambda: self._on_finished(pending))
+        pending.timer.timeout.connect(lambda: self._on_timeout(pending))
+        pending.timer.start(pending.timeout)
+
+    def _done(self, pending):
+        """请求结束（完成/超时/取消）：释放名额并放行排队的请求"""
+        self._running[pending.host] -= 1
+        self._forget(pending)
+        self._release_waiters(pending)
+        pending.timer.deleteLater()
+        pending.reply.deleteLater()
+        self._pump(pending.host)
+
+    @staticmethod
+    def _safe_call(callback, *args):
+        """回调里的异常不能打断调度器的记账，否则该 host 的名额永远不会释放"""
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"请求回调出错: {e}")
+
+    def _fail(self, pending, message):
+        for waiter in list(pending.waiters):
+            if waiter.handle_error:
+                self._safe_call(waiter.handle_error, message)
+            elif waiter.sender:
+                self._safe_call(waiter.sender.show_error, message)
+
+    def _on_timeout(self, pending):
+        if pending.state != "running" or not pending.reply.isRunning():
             return
-        
-        if check_if_unauthorized(reply):
+        pending.state = "done"
+        try:
+            pending.reply.abort()
+            self._fail(pending, "请求超时")
+        finally:
+            self._done(pending)
+
+    def _on_finished(self, pending):
+        if pending.state == "cancelled":
+            self._done(pending)
+            return
+        if pending.state != "running":
+            return      # 已按超时处理
+        pending.state = "done"
+        pending.timer.stop()
+        try:
+            self._deliver(pending)
+        finally:
+            self._done(pending)
+
+    def _deliver(self, pending):
+        reply = http_client.finalize(pending.method, pending.url, pending.reply,
+                                     account=session.get_user().get("account"))
+
+        if reply.error() != QNetworkReply.NoError:
+            self._fail(pending, f"网络错误: {reply.errorString()}")
+        elif check_if_unauthorized(reply):
             session.clear_session()
             global_signals.unauthorized.emit()
-            cleanup()
-            return
-        
-        # 业务处理部分交给外部回调
-        if handle_response:
-            try:
-                handle_response(reply)
-            except Exception as e:
-                if sender:
-                    sender.show_error(f"处理响应时发生错误: {str(e)}")
-        cleanup()
-
-    reply.finished.connect(on_finished)
-    timer.timeout.connect(on_timeout)
-    timer.start(timeout)
\ No newline at end of file
+        else:
+            # 业务处理部分交给外部回调
+            # 合并后的 GET 有多个回调，body 只能读一次，先读出来共享
+            if pending.key is not None and not isinstance(reply, BufferedReply):
+                reply = BufferedReply(reply, reply.readAll())
+            for waiter in list(pending.waiters):
+                if not waiter.handle_response:
+                    continue
+                try:
+                    waiter.handle_response(reply)
+                except Exception as e:
+                    if waiter.sender:
+                        self._safe_call(waiter.sender.show_error, f"处理响应时发生错误: {str(e)}")
+
+
+request_scheduler = RequestScheduler()
+
+
+def async_request(sender, method, url, data, handle_response=None, timeout=3000, handle_error=None,
+                  priority=PRIORITY_INTERACTIVE):
+    """
+    handle_error: 可选，失败（超时/网络错误）时回调 handle_error(message)，
+                  提供时不再弹出 sender.show_error，便于调用方自行重试
+    priority: PRIORITY_INTERACTIVE / PRIORITY_POLLING / PRIORITY_PREFETCH，决定排队顺序
+    请求经 request_scheduler 排队发出，相同的 GET 会合并，sender 销毁后回调不再执行
+    """
+    print(url)
+    request_scheduler.submit(sender, method, url, data, handle_response, timeout, handle_error, priority)
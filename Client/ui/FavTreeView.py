@@ -2,12 +2,12 @@ import json
 from pathlib import Path
 from PySide6.QtWidgets import (
     QWidget, QTreeView, QVBoxLayout, QLabel, QMenu, QMessageBox,
-    QInputDialog, QListWidget, QListWidgetItem, QDialog, QPushButton, QHBoxLayout, QLineEdit, QFileDialog
+    QInputDialog, QDialog, QPushButton, QHBoxLayout, QLineEdit, QFileDialog
 )
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QIcon, QPixmap
+from PySide6.QtGui import QStandardItemModel, QStandardItem, QIcon
 from PySide6.QtCore import Qt, QModelIndex
 from ui.RecordDialog import RecordDialog
-from ui.HistoryPage import RecordWidget
+from ui.HistoryPage import HistoryModel, create_record_view
 from services.request_service import async_request
 from services.config import app_config
 # =====================================================
@@ -44,34 +44,21 @@ class AliasDialog(QDialog):
         return self.text_edit.text().strip()
 
 class FavSelectDialog(QDialog):
-    def __init__(self, parent, path_text, items_dict: dict):
+    def __init__(self, parent, path_text, model: HistoryModel):
         super().__init__(parent)
         self.setWindowTitle("新增收藏")
         self.resize(350, 500)
 
-        self.items_dict = items_dict
         self.selected_result = None   # 将在 accept 时保存最终数据
 
         layout = QVBoxLayout(self)
 
         layout.addWidget(QLabel(f"添加路径：{path_text}"))
 
-        # ---- 列表 ----
-        self.list = QListWidget()
+        # ---- 列表：与历史记录页共用同一个模型与缩略图 ----
+        self.list, _ = create_record_view(model, f"fav_select_{id(self)}", self)
         self.list.setSpacing(8)
 
-        # 将 QWidget 放入 QListWidget 中
-        for url, widget in self.items_dict.items():
-            new_record = RecordWidget(widget.get_record_dict())
-            new_map = QPixmap(widget.getpixmap())
-            new_record.img_label.setPixmap(new_map)
-            item = QListWidgetItem(self.list)
-            item.setData(Qt.UserRole, url)
-            item.setSizeHint(new_record.sizeHint())  # 保证显示正常
-            self.list.addItem(item)
-
-            self.list.setItemWidget(item, new_record)
-
         layout.addWidget(self.list)
 
         # ---- 按钮 ----
@@ -87,13 +74,13 @@ class FavSelectDialog(QDialog):
         cancel_btn.clicked.connect(self.reject)
 
         # 单击列表项 => 弹出别名输入框
-        self.list.itemClicked.connect(self._on_item_click)
+        self.list.clicked.connect(self._on_item_click)
 
     # ------------------ 事件处理 ------------------
 
-    def _on_item_click(self, item):
-        """用户点击某个 QWidget，则弹出输入别名对话框"""
-        url = item.data(Qt.UserRole)
+    def _on_item_click(self, index):
+        """用户点击某条记录，则弹出输入别名对话框"""
+        url = index.data(HistoryModel.RecordRole).result_url
 
         alias_dlg = AliasDialog(self)
         if alias_dlg.exec() == QDialog.Accepted:
@@ -110,12 +97,12 @@ class FavSelectDialog(QDialog):
 
     def _on_ok(self):
         """允许用户按确定结束，但必须选中+输入别名"""
-        item = self.list.currentItem()
-        if not item:
+        index = self.list.currentIndex()
+        if not index.isValid():
             self.reject()
             return
 
-        url = item.data(Qt.UserRole)
+        url = index.data(HistoryModel.RecordRole).result_url
 
         alias_dlg = AliasDialog(self)
         if alias_dlg.exec() == QDialog.Accepted:
@@ -145,8 +132,8 @@ class FavTreeView(QWidget):
         # node id 到树具体元组的映射表
         self.node_map = {}
 
-        # 可供“新增收藏”的候选字典，包含url和对应的记录项列表（外部设置）
-        self.url_to_available_fav_items = {}
+        # 可供“新增收藏”的候选记录（历史记录页的 HistoryModel，外部设置）
+        self.available_fav_model = None
 
 
         self.current_folder_id = None
@@ -332,9 +319,9 @@ class FavTreeView(QWidget):
         """获取当前的 JSON 树数据（外部调用）"""
         return self.json_data
 
-    def set_available_fav_items(self, items):
-        """设置新增收藏项列表（外部调用）"""
-        self.url_to_available_fav_items = items
+    def set_available_fav_items(self, model: HistoryModel):
+        """设置新增收藏的候选记录模型（外部调用）"""
+        self.available_fav_model = model
 
     def show_error(self, message: str):
         QMessageBox.critical(self, "错误", message)
@@ -485,7 +472,7 @@ class FavTreeView(QWidget):
     def show_file_detail(self, node):
         # info = f"名称：{node['name']}\n文件：{node.get('local_path')}\n"
         # QMessageBox.information(self, "文件详情", info)
-        record = self.url_to_available_fav_items.get(node.get("refer_url"))
+        record = self.available_fav_model.record_for_url(node.get("refer_url")) if self.available_fav_model else None
         if record:
             dlg = RecordDialog(record.get_record_dict(), self)
             dlg.show()
@@ -545,12 +532,12 @@ class FavTreeView(QWidget):
     #     添加收藏项（从列表选取）
     # =====================================================
     def select_and_add_fav_to_folder(self, folder_id):
-        if not self.url_to_available_fav_items:
+        if not self.available_fav_model or self.available_fav_model.rowCount() == 0:
             QMessageBox.warning(self, "无可选项目", "没有可添加的收藏项")
             return
 
         path_text = self.get_path(folder_id)
-        dlg = FavSelectDialog(self, path_text, self.url_to_available_fav_items)
+        dlg = FavSelectDialog(self, path_text, self.available_fav_model)
 
         if dlg.exec() != QDialog.Accepted:
             return
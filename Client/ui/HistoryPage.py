@@ -1,13 +1,19 @@
 import json
 import os
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QScrollArea, QHBoxLayout, QLineEdit, QPushButton, QMenu, QMessageBox
-from PySide6.QtGui import QIcon, QAction
-from PySide6.QtCore import Qt, Signal
-from services.local_store import LocalDB, save_pixmap_from_url
-from services.request_service import async_request
+from urllib.parse import urlparse
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QMenu, QMessageBox, QLabel,
+    QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+)
+from PySide6.QtGui import QIcon, QAction, QPixmap, QColor
+from PySide6.QtCore import (
+    Qt, Signal, QObject, QAbstractListModel, QModelIndex, QSortFilterProxyModel, QSize, QRect, QTimer
+)
+from services.local_store import LocalDB, safe_filename_from_url
+from services.image_cache import ImageCache
+from services.image_decoder import ImageDecoder
+from services.request_service import async_request, PRIORITY_PREFETCH
 from services.session import session
-from PySide6.QtGui import QPixmap
-from PySide6.QtWidgets import QLabel
 from enum import Enum
 from ui.RecordDialog import RecordDialog
 
@@ -28,162 +34,416 @@ DESC_TO_GEN_TYPE = {v: k for k, v in GEN_TYPE_DESC.items()}
 STR_TO_DESC = {t.value: desc for t, desc in GEN_TYPE_DESC.items()}
 
 
-# todo 右键菜单删除历史记录，左键浏览详情
-class RecordWidget(QWidget):
-    """单条记录展示组件"""
+class HistoryRecord:
     """
-record: dict
-    一条 AI 生成内容或收藏项的记录，JSON 格式如下：
-
+    一条 AI 生成内容的记录（纯数据，不是控件），由 HistoryModel 持有
+    record: dict
     {
-        "type": str,   # 生成类型，如 "文生图"、"文生视频"、"图生图" 等
-        "prompt": str,            # 用户输入的提示词，用于生成内容
-        "parameters": dict,       # 生成时使用的参数，可包含 size、model、seed 等
-        "result_url": str         # 生成结果的图片或封面图的网络地址（HTTP/HTTPS）
+        "type": str,         # 生成类型值，如 "t2i"、"t2v"
+        "prompt": str,       # 用户输入的提示词
+        "parameters": dict,  # 生成时使用的参数
+        "result_url": str,   # 生成结果的网络地址，生成未完成时为空
+        "task_id": str       # 可选，生成任务 ID
     }
+    """
+    __slots__ = ("type", "prompt", "prompt_lower", "parameters", "result_url", "local_path", "task_id")
 
-字段说明：
-    - type：用于在 UI 中展示记录属于哪种生成任务。
-    - prompt：记录主要描述文本，是最主要的内容展示来源。
-    - parameters：存放所有附加参数，通常不直接展示，但可用于 debug 或详情页。
-    - result_url：必须是有效 URL，界面将通过网络异步请求加载该图片。
+    def __init__(self, record: dict):
+        self.type = STR_TO_DESC.get(record.get("type", "未知类型"), "未知类型")
+        self.prompt = record.get("prompt", "") or ""
+        self.prompt_lower = self.prompt.lower()
+        self.parameters = record.get("parameters", {})
+        self.result_url = record.get("result_url", "") or ""
+        self.local_path = None
+        self.task_id = record.get("task_id")
 
-示例：
-    {
-        "type": "t2i",
-        "prompt": "一只站在月光下的狐狸",
-        "parameters": {"size": "512x512", "model": "SDXL"},
-        "result_url": "result/generated_image_001.png"
-    }
-"""
-    url_record_map = {}  # 类变量，缓存 URL 到 RecordWidget 实例的映射
-    def __init__(self, record, parent=None):
-        super().__init__(parent)
-        layout = QVBoxLayout()
-        self.image_size = 250
-
-        self.type=STR_TO_DESC.get(record.get("type", "未知类型"), "未知类型")
-        self.prompt=record.get("prompt", "")
-        self.parameters=record.get("parameters", {})
-        self.result_url=record.get("result_url", "")
-        self.local_path=None
-        if self.result_url and not RecordWidget.url_record_map.get(self.result_url):
-            RecordWidget.url_record_map[self.result_url] = self  # 缓存 URL 到实例的映射
-
-        # 显示文字信息
-        title_label = QLabel(f"{self.type}\n {self.prompt}")
-        title_label.setWordWrap(True)
-        layout.addWidget(title_label)
-        
-        # 图片
-        self.img_label = QLabel("图片加载中...")
-        layout.addWidget(self.img_label)
-        
-        self.setLayout(layout)
+    def get_record_dict(self):
+        return {
+            "type": DESC_TO_GEN_TYPE[self.type].value if self.type in DESC_TO_GEN_TYPE else self.type,
+            "prompt": self.prompt,
+            "parameters": self.parameters,
+            "result_url": self.result_url,
+            "local_path": self.local_path
+        }
 
-    def show_error(self, message: str):
-        QMessageBox.critical(self, "错误", message)
 
-    def show_info(self, message: str):
-        QMessageBox.information(self, "信息", message)
+class HistoryModel(QAbstractListModel):
+    """
+    历史记录模型：只保存数据，缩略图按需加载。
+    视图通过 set_visible 告诉模型哪些记录正在显示，模型只为这些记录加载缩略图；
+    缩略图本身放在共享的 ImageCache 中（内存 LRU 有字节上限），内存占用与记录总数无关
+    """
+    RecordRole = Qt.ItemDataRole.UserRole + 1
+    THUMBNAIL_WIDTH = 250
 
-    def serach_image_in_local(self, image_url):
-        db = LocalDB.instance()
-        record = db.get_record_by_url(image_url)
-        if record:
-            self.local_path = record.get("local_path")
-            if self.local_path:
-                pixmap = QPixmap(self.local_path)
-                if not pixmap.isNull():
-                    self.img_label.setPixmap(pixmap.scaledToWidth(self.image_size, Qt.TransformationMode.SmoothTransformation))
-                    return True
-        return False
-    
-    def remove_record(self):
-        db = LocalDB.instance()
-        db.delete_record_by_url(self.result_url)
-        if self.result_url in RecordWidget.url_record_map:
-            del RecordWidget.url_record_map[self.result_url]
-        if os.path.exists(self.local_path):
-            os.remove(self.local_path)
-            
-    
-    def request_image(self, image_url):
-        self.result_url=image_url
-        from urllib.parse import urlparse
-        image_url = urlparse(image_url)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._records = []
+        self._url_map = {}          # result_url -> HistoryRecord
+        self._loading = set()
+        self._jobs = {}             # result_url -> 正在后台解码的 DecodeJob
+        self._failed = set()
+        self._visible = {}          # 视图 key -> 正在显示的 HistoryRecord 集合
+
+    # ---------- QAbstractListModel ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{record.type}\n {record.prompt}"
+        if role == Qt.ItemDataRole.DecorationRole:
+            return ImageCache.instance().peek(record.result_url, self.THUMBNAIL_WIDTH) if record.result_url else None
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return record.prompt
+        if role == HistoryModel.RecordRole:
+            return record
+        return None
+
+    # ---------- 记录增删 ----------
+    def set_records(self, records: list):
+        """整体替换记录（列表中靠后的记录显示在上方，与服务器返回顺序一致）"""
+        self.beginResetModel()
+        self._records = [HistoryRecord(r) for r in reversed(records)]
+        self._url_map = {r.result_url: r for r in self._records if r.result_url}
+        # 一次查出所有已保存到本地的原图路径，加载缩略图时不再逐条查询（"" 表示本地没有）
+        local = LocalDB.instance().get_records_by_urls(self._url_map.keys())
+        for url, record in self._url_map.items():
+            record.local_path = (local.get(url) or {}).get("local_path") or ""
+        self._cancel_all()
+        self._failed.clear()
+        self.endResetModel()
+
+    def prepend_record(self, record: dict) -> HistoryRecord:
+        item = HistoryRecord(record)
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self._records.insert(0, item)
+        if item.result_url:
+            self._url_map.setdefault(item.result_url, item)
+        self.endInsertRows()
+        return item
+
+    def remove_record(self, record: HistoryRecord) -> bool:
+        if record not in self._records:
+            return False
+        row = self._records.index(record)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._records.pop(row)
+        if self._url_map.get(record.result_url) is record:
+            del self._url_map[record.result_url]
+        self._cancel(record.result_url)
+        self.endRemoveRows()
+        return True
+
+    def set_result_url(self, record: HistoryRecord, url: str):
+        """生成完成后补上结果地址，若正在显示则立即加载缩略图"""
+        record.result_url = url
+        self._url_map.setdefault(url, record)
+        self._failed.discard(url)
+        if self._is_visible(record):
+            self._load_thumbnail(record)
+        self._notify(record)
+
+    def record_for_url(self, url: str):
+        return self._url_map.get(url)
+
+    def records(self):
+        return list(self._records)
+
+    def _row_of(self, record):
         try:
-            # 异步请求图片数据
-            async_request(
-                sender=self,
-                method="GET",
-                url=image_url.path,
-                data=None,
-                handle_response=self.__update_image
+            return self._records.index(record)
+        except ValueError:
+            return None
+
+    def _notify(self, record):
+        row = self._row_of(record)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    # ---------- 缩略图懒加载 ----------
+    def is_failed(self, url):
+        return url in self._failed
+
+    def _is_visible(self, record):
+        return any(record in records for records in self._visible.values())
+
+    def set_visible(self, key, records):
+        """
+        视图 key 当前显示的记录；为其中内存缓存里还没有缩略图的记录加载，
+        已经滚出所有视图的记录取消尚未完成的解码。
+        加载失败的记录重新滚入视图时清除失败标记，再试一次
+        """
+        previous = self._visible.get(key, set())
+        self._visible[key] = set(records)
+        for record in self._visible[key] - previous:
+            self._failed.discard(record.result_url)
+        keep = {r.result_url for visible in self._visible.values() for r in visible}
+        for url in list(self._jobs):
+            if url not in keep:
+                self._cancel(url)
+        cache = ImageCache.instance()
+        for record in records:
+            if record.result_url and cache.peek(record.result_url, self.THUMBNAIL_WIDTH) is None:
+                self._load_thumbnail(record)
+
+    def _load_thumbnail(self, record):
+        url = record.result_url
+        if not url or url in self._loading or url in self._failed:
+            return
+        cache = ImageCache.instance()
+        if cache.peek(url, self.THUMBNAIL_WIDTH) is not None:
+            self._notify(record)
+            return
+        # 1. 磁盘缩略图：后台解码后只放入内存层
+        thumb_path = cache.thumbnail_path(url, self.THUMBNAIL_WIDTH)
+        if thumb_path:
+            self._decode(record, thumb_path, persist=False)
+            return
+        # 2. 本地已保存过的原图：后台按缩略图尺寸解码后写入缓存
+        if record.local_path is None:
+            local = LocalDB.instance().get_record_by_url(url)
+            record.local_path = local.get("local_path") if local else None
+        if record.local_path and os.path.exists(record.local_path):
+            self._decode(record, record.local_path, persist=True)
+            return
+        # 3. 从服务器下载
+        self._loading.add(url)
+        async_request(
+            sender=self,
+            method="GET",
+            url=urlparse(url).path,
+            data=None,
+            timeout=15000,
+            handle_response=lambda reply, r=record: self._on_image_reply(r, reply),
+            handle_error=lambda message, r=record: self._on_image_failed(r, message),
+            priority=PRIORITY_PREFETCH
+        )
+
+    def _decode(self, record, source, persist, save_path=None):
+        """在线程池中按缩略图宽度解码，完成后在 GUI 线程回调"""
+        url = record.result_url
+        self._loading.add(url)
+        # persist 时缩略图文件也由解码线程写好，GUI 线程只登记
+        thumb_path = ImageCache.instance().thumbnail_target(url, self.THUMBNAIL_WIDTH) if persist else None
+        job = ImageDecoder.instance().decode(source, self.THUMBNAIL_WIDTH, owner=self,
+                                             save_path=save_path, thumb_path=thumb_path)
+        job.finished.connect(lambda image, r=record: self._on_decoded(r, image, thumb_path, save_path))
+        job.failed.connect(lambda message, r=record: self._on_image_failed(r, message))
+        self._jobs[url] = job
+
+    def _cancel(self, url):
+        job = self._jobs.pop(url, None)
+        if job is not None:
+            job.cancel()
+        self._loading.discard(url)
+
+    def _cancel_all(self):
+        for job in self._jobs.values():
+            job.cancel()
+        self._jobs.clear()
+        self._loading.clear()
+
+    def _on_decoded(self, record, image, thumb_path, save_path):
+        url = record.result_url
+        self._jobs.pop(url, None)
+        self._loading.discard(url)
+        if save_path:
+            # 下载的原图已在后台线程写入磁盘，这里只登记到本地数据库
+            record.local_path = save_path
+            LocalDB.instance().run_async(
+                lambda db, values: db.insert_record(**values),
+                dict(
+                    username=session.get_user().get("account"),
+                    local_path=record.local_path,
+                    url=url,
+                    generation_type=record.type,
+                    prompt=record.prompt,
+                    parameters=record.parameters,
+                )
             )
+        ImageCache.instance().add(url, self.THUMBNAIL_WIDTH, QPixmap.fromImage(image), thumb_path)
+        self._notify(record)
+
+    def _on_image_failed(self, record, message):
+        self._jobs.pop(record.result_url, None)
+        self._loading.discard(record.result_url)
+        self._failed.add(record.result_url)
+        self._notify(record)
+
+    def _on_image_reply(self, record, reply):
+        self._loading.discard(record.result_url)
+        # 原图落盘与解码都交给线程池，网络回调里不做任何图片处理
+        save_path = os.path.join("local_result", safe_filename_from_url(record.result_url))
+        self._decode(record, reply.readAll(), persist=True, save_path=save_path)
+
+    def remove_local_copy(self, record: HistoryRecord):
+        """删除本地数据库中的记录、本地保存的图片与缩略图缓存"""
+        ImageCache.instance().invalidate(record.result_url)
+        LocalDB.instance().delete_record_by_url(record.result_url)
+        if record.task_id:
+            LocalDB.instance().delete_generations(session.get_user().get("account"), [record.task_id])
+        if record.local_path and os.path.exists(record.local_path):
+            os.remove(record.local_path)
 
-        except Exception as e:
-            self.img_label.setText("图片加载失败")
+    def show_error(self, message: str):
+        # async_request 的 sender 接口：缩略图加载失败已由 _on_image_failed 标记，不弹窗
+        pass
 
-    def getpixmap(self):
-        return self.img_label.pixmap()
 
-    
-    def get_record_dict(self):
-        return {
-            "type": DESC_TO_GEN_TYPE[self.type].value,
-            "prompt": self.prompt,
-            "parameters": self.parameters,
-            "result_url": self.result_url,
-            "local_path": self.local_path
-        }
-    
-    def __update_image(self, reply):
-        img_data = reply.readAll()
-        pixmap = QPixmap()
-        success = pixmap.loadFromData(img_data)
-
-        if pixmap.isNull():
-            self.img_label.setText("图片加载失败（格式错误）")
-            print("loadFromData success:", success)
-            print("img_data size:\n", len(img_data))
-            print(bytes(img_data[:20]).hex(" "))
-            from PySide6.QtGui import QImageReader
-            print(QImageReader.supportedImageFormats())
-
-            with open("debug_image.bin", "wb") as f:
-                f.write(img_data)
+class HistoryFilterProxy(QSortFilterProxyModel):
+    """
+    多标签过滤：只有 prompt 同时包含所有 tag 的记录才显示。
+    有全文索引的结果（task_id 集合）时直接按集合判断，否则退回逐条子串匹配
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tags = []
+        self.ids = None
+
+    def set_tags(self, tags, ids=None):
+        self.tags = [t.lower() for t in tags]
+        self.ids = ids
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.tags:
+            return True
+        record = self.sourceModel().index(source_row, 0, source_parent).data(HistoryModel.RecordRole)
+        if self.ids is not None and record.task_id:
+            return record.task_id in self.ids
+        return all(t in record.prompt_lower for t in self.tags)
+
+
+class RecordDelegate(QStyledItemDelegate):
+    """只绘制可见行：上方类型 + 提示词，下方缩略图（未加载时显示占位文字）"""
+    PADDING = 10
+    TEXT_HEIGHT = 44
+
+    def sizeHint(self, option, index):
+        width = max(option.rect.width(), HistoryModel.THUMBNAIL_WIDTH + 2 * self.PADDING)
+        return QSize(width, self.TEXT_HEIGHT + HistoryModel.THUMBNAIL_WIDTH + 3 * self.PADDING)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, QColor("#e8f1ff"))
+        elif option.state & QStyle.StateFlag.State_MouseOver:
+            painter.fillRect(option.rect, QColor("#f5f7fa"))
+
+        rect = option.rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        text_rect = QRect(rect.left(), rect.top(), rect.width(), self.TEXT_HEIGHT)
+        painter.setPen(option.palette.text().color())
+        painter.drawText(text_rect, Qt.TextFlag.TextWordWrap | Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop,
+                         index.data(Qt.ItemDataRole.DisplayRole))
+
+        image_rect = QRect(rect.left(), text_rect.bottom() + self.PADDING,
+                           HistoryModel.THUMBNAIL_WIDTH, HistoryModel.THUMBNAIL_WIDTH)
+        pixmap = index.data(Qt.ItemDataRole.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            target = pixmap.size().scaled(image_rect.size(), Qt.AspectRatioMode.KeepAspectRatio)
+            painter.drawPixmap(QRect(image_rect.topLeft(), target), pixmap)
         else:
-            self.img_label.setPixmap(pixmap.scaledToWidth(self.image_size, Qt.TransformationMode.SmoothTransformation))
-
-            # 缓存 URL 到实例的映射
-            RecordWidget.url_record_map[self.result_url] = self
-            # 保存图片到本地
-            self.local_path = save_pixmap_from_url(self.result_url, pixmap)
-            # 存储到本地数据库
-            db = LocalDB.instance()
-            db.insert_record(
-                username=session.get_user().get("account"),
-                local_path=self.local_path,
-                url=self.result_url,
-                generation_type=self.type,
-                prompt=self.prompt,
-                parameters=self.parameters,
-            )
+            record = index.data(HistoryModel.RecordRole)
+            model = index.model()
+            while isinstance(model, QSortFilterProxyModel):
+                model = model.sourceModel()
+            if not record.result_url:
+                placeholder = "生成中..."
+            elif model.is_failed(record.result_url):
+                placeholder = "图片加载失败"
+            else:
+                placeholder = "图片加载中..."
+            painter.setPen(QColor("#999999"))
+            painter.drawText(image_rect, Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop, placeholder)
+        painter.restore()
+
+
+class VisibleRowsTracker(QObject):
+    """
+    跟踪 QListView 当前可见的行（含上下预取余量），滚动/缩放/过滤后通知 HistoryModel，
+    由模型加载进入视野的缩略图、释放离开视野的缩略图
+    """
+    PREFETCH_ROWS = 3
+
+    def __init__(self, view: QListView, model: HistoryModel, key: str):
+        super().__init__(view)
+        self.view = view
+        self.model = model
+        self.key = key
+        # 连续的滚动事件合并成一次更新
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(30)
+        self.timer.timeout.connect(self.update)
+
+        view.verticalScrollBar().valueChanged.connect(self.schedule)
+        view_model = view.model()
+        for signal in (view_model.modelReset, view_model.rowsInserted, view_model.rowsRemoved,
+                       view_model.layoutChanged):
+            signal.connect(self.schedule)
+        view.viewport().installEventFilter(self)
+        view.destroyed.connect(lambda: model.set_visible(key, []))
+
+    def eventFilter(self, obj, event):
+        if event.type() in (event.Type.Resize, event.Type.Show):
+            self.schedule()
+        return False
+
+    def schedule(self):
+        self.timer.start()
+
+    def update(self):
+        view_model = self.view.model()
+        count = view_model.rowCount()
+        if count == 0 or not self.view.isVisible():
+            self.model.set_visible(self.key, [])
+            return
+        viewport = self.view.viewport().rect()
+        first = self.view.indexAt(viewport.topLeft())
+        last = self.view.indexAt(viewport.bottomLeft())
+        first_row = first.row() if first.isValid() else 0
+        last_row = last.row() if last.isValid() else count - 1
+        first_row = max(0, first_row - self.PREFETCH_ROWS)
+        last_row = min(count - 1, last_row + self.PREFETCH_ROWS)
+        records = [view_model.index(row, 0).data(HistoryModel.RecordRole)
+                   for row in range(first_row, last_row + 1)]
+        self.model.set_visible(self.key, records)
+
+
+def create_record_view(model: HistoryModel, key: str, parent=None):
+    """创建共享 HistoryModel 的列表视图（带过滤代理、委托与可见行跟踪），返回 (view, proxy)"""
+    proxy = HistoryFilterProxy(parent)
+    proxy.setSourceModel(model)
+    view = QListView(parent)
+    view.setModel(proxy)
+    view.setItemDelegate(RecordDelegate(view))
+    view.setUniformItemSizes(True)
+    view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+    view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+    view.setMouseTracking(True)
+    view.setSpacing(4)
+    VisibleRowsTracker(view, model, key)
+    return view, proxy
 
 
 class HistoryPage(QWidget):
     """
     可用于 QStackedWidget 的历史记录页面容器，
-    顶部带多标签搜索栏，可多关键词叠加过滤 RecordWidget。
+    顶部带多标签搜索栏，可多关键词叠加过滤记录。
+    记录由 HistoryModel 提供，QListView + RecordDelegate 只绘制可见行。
     """
     record_deleted = Signal(dict)  # 当记录被删除时发出信号，传递被删除的记录字典
     add_record_to_fav = Signal(dict)  # 当记录被添加到收藏夹时发出信号，传递被添加的记录字典
     def __init__(self, parent=None, spacing=10, margin=10):
         super().__init__(parent)
 
-        # 记录所有添加的 RecordWidgets
-        self.all_records = []
+        # 所有记录（与收藏夹的选择对话框共用）
+        self.model = HistoryModel(self)
         # 当前所有标签文本
         self.tags = []
 
@@ -252,29 +512,25 @@ class HistoryPage(QWidget):
 
         self.main_layout.addWidget(search_bar_container)
 
-        # ========== 滚动区域 ===========
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.main_layout.addWidget(self.scroll_area)
-
-        # 内容容器
-        self.container = QWidget()
-        self.scroll_area.setWidget(self.container)
-
-        # 垂直布局
-        self.layout = QVBoxLayout(self.container)
-        self.layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.layout.setSpacing(spacing)
-        self.layout.setContentsMargins(margin, margin, margin, margin)
-
-
+        # ========== 列表区域 ===========
+        self.view, self.proxy = create_record_view(self.model, "history", self)
+        self.view.setSpacing(spacing // 2)
+        self.view.setContentsMargins(margin, margin, margin, margin)
+        self.view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.view.clicked.connect(self.__on_clicked)
+        self.view.customContextMenuRequested.connect(self.__on_context_menu)
+        self.main_layout.addWidget(self.view)
 
     # ===============================
     # 添加记录
     # ===============================
-    def addWidget(self, widget: QWidget):
-        self.layout.insertWidget(0, widget)
-        self.all_records.append(widget)
+    def setRecords(self, records: list):
+        """用服务器返回的生成列表整体替换（一次模型重置，不逐条创建控件）"""
+        self.model.set_records(records)
+
+    def addRecord(self, record: dict) -> HistoryRecord:
+        """新生成的记录插入到最上方"""
+        return self.model.prepend_record(record)
 
     # ===============================
     # 搜索功能
@@ -290,11 +546,11 @@ class HistoryPage(QWidget):
         self.filterRecords()
 
     def filterRecords(self):
-        """只有 RecordWidget.prompt 同时包含所有 tag 才显示"""
-        for record in self.all_records:
-            text = getattr(record, "prompt", "").lower()
-            visible = all(t.lower() in text for t in self.tags)
-            record.setVisible(visible)
+        """只有 prompt 同时包含所有 tag 的记录才显示（查本地全文索引，得到 task_id 集合）"""
+        ids = None
+        if self.tags:
+            ids = LocalDB.instance().search_generations(session.get_user().get("account"), self.tags)
+        self.proxy.set_tags(self.tags, ids)
 
     # ===============================
     # 标签（tag/chip） 功能
@@ -359,35 +615,22 @@ class HistoryPage(QWidget):
             w.setMaximumWidth(new_w)
             w.setToolTip(self.tags[i])  # 悬停显示完整文本
 
-    def mousePressEvent(self, event):
-        # 获取点击位置相对于内容容器的位置
-        content_pos = self.container.mapFrom(self, event.position().toPoint())
-
-        # 找到被点击的 child
-        clicked = self.container.childAt(content_pos)
-
-        while clicked and not isinstance(clicked, RecordWidget):
-            clicked = clicked.parent()
-
-        # 不是 RecordWidget → 直接返回
-        if not isinstance(clicked, RecordWidget):
-            return super().mousePressEvent(event)
+    def __on_clicked(self, index):
+        if index.isValid():
+            self.openRecordDetail(index.data(HistoryModel.RecordRole))
 
-        if event.button() == Qt.MouseButton.LeftButton:
-            self.openRecordDetail(clicked)
-
-        elif event.button() == Qt.MouseButton.RightButton:
-            self.openContextMenu(clicked, event.globalPos())
-
-        return super().mousePressEvent(event)
+    def __on_context_menu(self, pos):
+        index = self.view.indexAt(pos)
+        if index.isValid():
+            self.openContextMenu(index.data(HistoryModel.RecordRole), self.view.viewport().mapToGlobal(pos))
 
     # 左键 → 打开详情
-    def openRecordDetail(self, record_widget: "RecordWidget"):
-        dlg = RecordDialog(record_widget.get_record_dict(), self)
+    def openRecordDetail(self, record: HistoryRecord):
+        dlg = RecordDialog(record.get_record_dict(), self)
         dlg.show()
 
     # 右键 → 弹出菜单
-    def openContextMenu(self, record_widget: "RecordWidget", global_pos):
+    def openContextMenu(self, record: HistoryRecord, global_pos):
         menu = QMenu(self)
         menu.setStyleSheet("""
             QMenu {
@@ -407,9 +650,9 @@ class HistoryPage(QWidget):
         delete_action = QAction("删除", self)
         menu.addAction(delete_action)
         menu.addAction("添加到收藏",
-            lambda: self.add_record_to_fav.emit(record_widget.get_record_dict())
+            lambda: self.add_record_to_fav.emit(record.get_record_dict())
         )
-        delete_action.triggered.connect(lambda: self.deleteRecordWidget(record_widget))
+        delete_action.triggered.connect(lambda: self.deleteRecord(record))
 
         menu.exec(global_pos)
 
@@ -420,7 +663,7 @@ class HistoryPage(QWidget):
         QMessageBox.information(self, "信息", message)
 
     # 删除
-    def deleteRecordWidget(self, widget: "RecordWidget"):
+    def deleteRecord(self, record: HistoryRecord):
         reply = QMessageBox.question(
             self, "确认删除",
             "删除记录将同时从本地与云端中删除生成结果与收藏夹中可能存在的对应记录，是否确认？",
@@ -429,24 +672,20 @@ class HistoryPage(QWidget):
         if reply != QMessageBox.Yes:
             return
         
-        def __on_delete_response(self:HistoryPage, reply, widget: RecordWidget):
+        def __on_delete_response(self:HistoryPage, reply, record: HistoryRecord):
             response_data = reply.readAll().data().decode("utf-8")
             result = json.loads(response_data)
             if result.get("code") != 200:
-                self.show_error("记录删除失败，状态码：" + str(reply.status_code))
+                self.show_error("记录删除失败，状态码：" + str(result.get("code")))
                 return
-            if widget in self.all_records:
-                self.all_records.remove(widget)
-                self.record_deleted.emit(widget.get_record_dict())
-                widget.remove_record()
-                widget.setParent(None)
-                widget.deleteLater()
+            if self.model.remove_record(record):
+                self.record_deleted.emit(record.get_record_dict())
+                self.model.remove_local_copy(record)
                 
         async_request(
             sender=self,
             method="POST",
             url="/user/generation_list",
-            data={"result_url": widget.result_url},
-            handle_response=lambda reply: __on_delete_response(self, reply, widget)
+            data={"result_url": record.result_url},
+            handle_response=lambda reply: __on_delete_response(self, reply, record)
         )
-
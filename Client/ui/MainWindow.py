@@ -3,16 +3,18 @@ from PySide6.QtWidgets import (
     QApplication, QMainWindow, QStackedWidget, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QPushButton, QTextEdit, QFileDialog, QScrollArea, QFrame, QMessageBox
 )
-from PySide6.QtGui import QPixmap, QCursor
+from PySide6.QtGui import QPixmap, QCursor, QImageReader
 from PySide6.QtCore import Qt, QSize, Signal
 import json
 import sys
 from enum import Enum
 from ui.FavTreeView import FavTreeView
-from services.request_service import async_request
+from services.request_service import async_request, PRIORITY_POLLING
+from services.chunk_uploader import ChunkedUploader
 from services.local_store import LocalDB, save_pixmap_from_url
 from services.session import session
-from ui.HistoryPage import DESC_TO_GEN_TYPE, GEN_TYPE_DESC, GenerationType, HistoryPage, RecordWidget
+from services.generation_sync import GenerationSync
+from ui.HistoryPage import DESC_TO_GEN_TYPE, GEN_TYPE_DESC, GenerationType, HistoryPage, HistoryRecord
 from ui.FavPathSelector import FavPathSelector
 
 class UploadPreview(QWidget):
@@ -88,47 +90,61 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("AIGC 内容生成客户端")
         self.setMinimumSize(800, 550)
         self.uploaded_image_path = None
+        self.uploader = None
         self.generation_list = []  # 生成记录列表数据初始化为空
         self.fav_list = []  # 收藏列表数据初始化为空
         self.__setup_ui()
+
+        # 先用本地副本立即显示历史记录，再增量同步服务器上的变化
+        self.username = session.get_user().get("account")
+        self.__load_seq = 0  # 本地加载的序号，只采用最后一次发起的加载结果
+        self.__load_local_generations()
+        self.generation_sync = GenerationSync(self.username, self)
+        self.generation_sync.finished.connect(self.__on_generation_sync_finished)
+        self.generation_sync.failed.connect(self.__on_generation_sync_failed)
+        self.generation_sync.start()
+
+    def __load_local_generations(self):
+        # 在数据库工作线程读取，读完回到界面线程
+        # 数据库线程池有多个线程，先发起的加载可能后完成，过期的结果直接丢弃
+        self.__load_seq += 1
+        seq = self.__load_seq
+        job = LocalDB.instance().run_async(lambda db, username: db.get_generations(username), self.username)
+        job.finished.connect(lambda records: self.__on_local_generations_loaded(seq, records))
+
+    def __on_local_generations_loaded(self, seq, records):
+        if seq != self.__load_seq:
+            return
+        self.generation_list = records
+        # 只建模型数据，缩略图由列表视图在滚动到可见时再加载
+        self.history_page.setRecords(self.generation_list)
+
+    def __on_generation_sync_finished(self, changed):
+        if changed:
+            self.__load_local_generations()
+        # 同步完成后再获取收藏列表
+        self.__request_favorite_list()
+
+    def __on_generation_sync_failed(self, message):
+        # 同步失败仍然可以浏览本地副本
+        print(f"同步生成记录失败: {message}")
+        self.__request_favorite_list()
+
+    def __request_favorite_list(self):
         async_request(
             sender=self,
             method="GET",
-            url="/user/generation_list",
+            url="/user/favorite_list",
             data=None,
-            handle_response=self.__handle_get_generation_list_response,
+            handle_response=self.__handle_get_favorite_list_response,
         )
 
-
-    def __handle_get_generation_list_response(self, reply):
-        response_data = reply.readAll().data().decode("utf-8")
-        result = json.loads(response_data)
-        if result.get("code") == 200:
-            self.generation_list = result.get("data", [])
-            for record in self.generation_list:
-                record_widget = RecordWidget(record)
-                if not record_widget.serach_image_in_local(record.get("result_url", "")):
-                    record_widget.request_image(record.get("result_url", ""))
-                
-                self.history_page.addWidget(record_widget)
-
-            # 加载完成后再获取收藏列表
-            async_request(
-                sender=self,
-                method="GET",
-                url="/user/favorite_list",
-                data=None,
-                handle_response=self.__handle_get_favorite_list_response,
-            )
-        else:
-            self.show_error(result.get("message", "获取生成列表失败"))
-
     def __handle_get_favorite_list_response(self, reply):
         response_data = reply.readAll().data().decode("utf-8")
         result = json.loads(response_data)
         if result.get("code") == 200:
             self.fav_list = result.get("data", [])
-            self.fav_page.set_available_fav_items(RecordWidget.url_record_map)
+            self.fav_page.set_available_fav_items(self.history_page.model)
             self.fav_page.set_json_tree(self.fav_list)
         else:
             self.show_error(result.get("message", "获取收藏列表失败"))
@@ -203,13 +219,20 @@ class MainWindow(QMainWindow):
         if not self.upload_area.isEnabled():
             return
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "选择图片", "", "图片文件 (*.png *.jpg *.jpeg)"
+            self, "选择图片", "", "图片文件 (*.png *.jpg *.jpeg *.gif *.bmp)"
         )
         if file_path:
-            pixmap = QPixmap(file_path).scaled(
-                QSize(140, 140), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation
-            )
-            self.upload_preview.setImage(pixmap)
+            # 直接按预览尺寸解码，不把整张原图解码进内存；同时按 EXIF 方向摆正
+            reader = QImageReader(file_path)
+            reader.setAutoTransform(True)
+            size = reader.size()
+            if size.isValid():
+                reader.setScaledSize(size.scaled(QSize(140, 140), Qt.AspectRatioMode.KeepAspectRatio))
+            image = reader.read()
+            if image.isNull():
+                self.show_error(f"无法读取图片: {reader.errorString()}")
+                return
+            self.upload_preview.setImage(QPixmap.fromImage(image))
             self.upload_label.setText("已选择图片")
             self.upload_label.setStyleSheet("color: #409EFF; font-size: 14px;")
             self.uploaded_image_path = file_path
@@ -232,13 +255,13 @@ class MainWindow(QMainWindow):
                 self.show_error("请上传参考图片")
                 return
             # todo 多图的同步上传暂不支持，先只上传一张
-            async_request(
-                sender=self,
-                method="POST",
-                url="/upload",
-                data=self.uploaded_image_path,
-                handle_response=lambda reply: self.__handle_image_upload_response(reply, gen_type, text, parameters={}),
-            )
+            # 分片上传：大图按分片并发上传，中断后再次生成会从断点继续
+            self.uploader = ChunkedUploader(self.uploaded_image_path, parent=self)
+            self.uploader.progress.connect(self.__on_upload_progress)
+            self.uploader.finished.connect(lambda data: self.__handle_image_upload_finished(data, gen_type, text, parameters={}))
+            self.uploader.failed.connect(self.__on_upload_failed)
+            self.generate_button.setEnabled(False)
+            self.uploader.start()
         else:
             # 仅依赖文本的生成直接发起生成请求
             data = {"type": gen_type.value, "prompt": text, "parameters": {}}
@@ -251,22 +274,27 @@ class MainWindow(QMainWindow):
             )
 
 
-    def __handle_image_upload_response(self, reply, gen_type, prompt, parameters):
-        response_data = reply.readAll().data().decode("utf-8")
-        result = json.loads(response_data)
-        if result.get("code") == 200:
-            self.show_info("图片上传成功")
-            # 上传成功后继续生成
-            data = {"type": gen_type.value, "prompt": prompt, "parameters": parameters, "image": result.get("data", {}).get("file_id")}
-            async_request(
-                sender=self,
-                method="POST",
-                url="/generation",
-                data=data,
-                handle_response=self.__handle_generate_response,
-            )
-        else:
-            self.show_error(result.get("message", "图片上传失败"))
+    def __on_upload_progress(self, done, total):
+        self.upload_label.setText(f"上传中 {done}/{total}")
+
+    def __on_upload_failed(self, message):
+        self.generate_button.setEnabled(True)
+        self.upload_label.setText("上传中断，再次点击生成将断点续传")
+        self.show_error(message)
+
+    def __handle_image_upload_finished(self, upload_data, gen_type, prompt, parameters):
+        self.generate_button.setEnabled(True)
+        self.upload_label.setText("已选择图片")
+        self.show_info("图片上传成功")
+        # 上传成功后继续生成
+        data = {"type": gen_type.value, "prompt": prompt, "parameters": parameters, "image": upload_data.get("file_id")}
+        async_request(
+            sender=self,
+            method="POST",
+            url="/generation",
+            data=data,
+            handle_response=self.__handle_generate_response,
+        )
 
 
     def __handle_generate_response(self, reply):
@@ -274,13 +302,15 @@ class MainWindow(QMainWindow):
         result = json.loads(response_data)
         if result.get("code") == 200:
             self.show_info("生成请求已提交，稍后请在历史记录中查看结果")
-            record_widget = RecordWidget(result.get("data", {}))
-            self.history_page.addWidget(record_widget)
-            self.start_polling_generation(result.get("data").get("task_id"), record_widget)
+            # 先写入本地副本（并建立全文索引），下一次同步时会被完整记录覆盖
+            LocalDB.instance().run_async(lambda db, username, data: db.upsert_generations(username, [data]),
+                                         self.username, result.get("data", {}))
+            record = self.history_page.addRecord(result.get("data", {}))
+            self.start_polling_generation(result.get("data").get("task_id"), record)
         else:
             self.show_error(result.get("message", "生成请求失败"))
 
-    def start_polling_generation(self, task_id, record_widget):
+    def start_polling_generation(self, task_id, record):
         from PySide6.QtCore import QTimer
 
         def poll():
@@ -289,7 +319,8 @@ class MainWindow(QMainWindow):
                 method="GET",
                 url=f"/generation/{task_id}",
                 data=None,
-                handle_response=lambda reply: self.__handle_poll_response(reply, task_id, record_widget, timer),
+                handle_response=lambda reply: self.__handle_poll_response(reply, task_id, record, timer),
+                priority=PRIORITY_POLLING,
             )
 
         timer = QTimer(self)
@@ -297,7 +328,7 @@ class MainWindow(QMainWindow):
         timer.start(2000)  # 每2秒轮询一次
         poll()  # 立即执行一次
 
-    def __handle_poll_response(self, reply, task_id, record_widget: RecordWidget, timer):
+    def __handle_poll_response(self, reply, task_id, record: HistoryRecord, timer):
         response_data = reply.readAll().data().decode("utf-8")
         result = json.loads(response_data)
         if result.get("code") == 200:
@@ -305,7 +336,7 @@ class MainWindow(QMainWindow):
             if status == "completed":
                 timer.stop()
                 self.show_info("生成完成")
-                record_widget.request_image(result.get("data", {}).get("result_url", ""))
+                self.history_page.model.set_result_url(record, result.get("data", {}).get("result_url", ""))
             elif status == "failed":
                 timer.stop()
                 self.show_error("生成失败")
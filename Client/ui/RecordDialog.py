@@ -1,8 +1,13 @@
+import os
 from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QDialog, QLabel, QScrollArea, QVBoxLayout, QPushButton
 from PySide6.QtGui import QPixmap
+from services.image_cache import ImageCache
+from services.image_decoder import ImageDecoder
 
 class RecordDialog(QDialog):
+    DETAIL_WIDTH = 560      # 详情图按对话框宽度缩放后缓存，不再每次解码原图
+
     def __init__(self, detail, parent=None):
         super().__init__(parent)
         self.setWindowTitle("详情")
@@ -19,12 +24,13 @@ class RecordDialog(QDialog):
         text_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
         main_layout.addWidget(text_label)
 
-        # ============ 图片部分（允许原尺寸） ============
-        pix = QPixmap(detail.get("local_path", ""))
-
-        img_label = QLabel()
-        img_label.setPixmap(pix)
+        # ============ 图片部分（走共享的缩略图缓存，缓存未命中时在后台线程解码） ============
+        url = detail.get("result_url", "")
+        local_path = detail.get("local_path") or ""
+        self.img_label = img_label = QLabel()
         img_label.setAlignment(Qt.AlignCenter)
+        self._job = None
+        self.__load_image(url, local_path)
 
         # 如果图太大，使用 QScrollArea 避免窗口超屏
         scroll = QScrollArea()
@@ -43,6 +49,33 @@ class RecordDialog(QDialog):
         # 非模态方式打开
         self.setModal(False)
 
+    def __load_image(self, url, local_path):
+        cache = ImageCache.instance()
+        pix = cache.peek(url, self.DETAIL_WIDTH) if url else None
+        if pix is not None:
+            self.img_label.setPixmap(pix)
+            return
+        # 有磁盘缩略图直接解码它；否则解码原图，并在后台线程写出缩略图
+        source = cache.thumbnail_path(url, self.DETAIL_WIDTH) if url else None
+        thumb_path = None
+        if source is None:
+            if not local_path or not os.path.exists(local_path):
+                self.img_label.setText("图片不存在")
+                return
+            source = local_path
+            thumb_path = cache.thumbnail_target(url, self.DETAIL_WIDTH) if url else None
+
+        self.img_label.setText("加载中...")
+        self._job = ImageDecoder.instance().decode(source, self.DETAIL_WIDTH, owner=self, thumb_path=thumb_path)
+        self._job.finished.connect(lambda image: self.__on_decoded(url, image, thumb_path))
+        self._job.failed.connect(lambda message: self.img_label.setText("图片加载失败"))
+
+    def __on_decoded(self, url, image, thumb_path):
+        pix = QPixmap.fromImage(image)
+        if url:
+            ImageCache.instance().add(url, self.DETAIL_WIDTH, pix, thumb_path)
+        self.img_label.setPixmap(pix)
+
 if __name__ == "__main__":
     from PySide6.QtWidgets import QApplication
     import sys
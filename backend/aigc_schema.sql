@@ -8,8 +8,12 @@ CREATE DATABASE IF NOT EXISTS aigc
 USE aigc;
 
 DROP TABLE IF EXISTS collections;
+DROP TABLE IF EXISTS generation_tombstones;
 DROP TABLE IF EXISTS generations;
 DROP TABLE IF EXISTS nfts;
+DROP TABLE IF EXISTS nft_assets;
+DROP TABLE IF EXISTS nft_jobs;
+DROP TABLE IF EXISTS uploads;
 DROP TABLE IF EXISTS users;
 
 SET FOREIGN_KEY_CHECKS = 1;
@@ -64,16 +68,38 @@ CREATE TABLE `generations` (
   `parameters` json DEFAULT NULL,
   `result_url` varchar(512) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
   `physical_path` varchar(512) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `file_size` bigint unsigned DEFAULT NULL,
   `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `completed_at` timestamp NULL DEFAULT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
   UNIQUE KEY `uk_uuid` (`uuid`),
+  KEY `idx_physical_path` (`physical_path`),
   KEY `idx_user_status` (`user_id`,`status`),
+  KEY `idx_user_updated` (`user_id`,`updated_at`,`id`),
+  KEY `idx_user_created` (`user_id`,`created_at`),
+  FULLTEXT KEY `ft_prompt` (`prompt`) /*!50100 WITH PARSER `ngram` */,
   CONSTRAINT `fk_generations_user_id` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 
 
+-- ============================
+-- Table structure for `generation_tombstones`
+-- ============================
+
+CREATE TABLE `generation_tombstones` (
+  `id` bigint unsigned NOT NULL AUTO_INCREMENT,
+  `user_id` bigint unsigned NOT NULL,
+  `uuid` varchar(36) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `deleted_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `idx_user_deleted` (`user_id`,`deleted_at`),
+  CONSTRAINT `fk_tombstones_user_id` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+
 -- ============================
 -- Table structure for `collections`
 -- ============================
@@ -127,6 +153,89 @@ CREATE TABLE `nfts` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 
+-- ============================
+-- Table structure for `nft_assets`
+-- ============================
+
+
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+ /*!50503 SET character_set_client = utf8mb4 */;
+
+CREATE TABLE `nft_assets` (
+  `id` bigint unsigned NOT NULL AUTO_INCREMENT,
+  `content_hash` varchar(64) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `ipfs_uri` varchar(512) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `file_size` bigint unsigned DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_content_hash` (`content_hash`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- ============================
+-- Table structure for `nft_jobs`
+-- ============================
+
+
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+ /*!50503 SET character_set_client = utf8mb4 */;
+
+CREATE TABLE `nft_jobs` (
+  `id` bigint unsigned NOT NULL AUTO_INCREMENT,
+  `uuid` varchar(36) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `user_id` bigint unsigned NOT NULL,
+  `collection_id` bigint unsigned DEFAULT NULL,
+  `to_address` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `status` enum('queued','running','completed','failed') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'queued',
+  `stage` varchar(20) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `total` int NOT NULL DEFAULT 0,
+  `processed` int NOT NULL DEFAULT 0,
+  `succeeded` int NOT NULL DEFAULT 0,
+  `failed` int NOT NULL DEFAULT 0,
+  `skipped` int NOT NULL DEFAULT 0,
+  `items` json DEFAULT NULL,
+  `error` text COLLATE utf8mb4_unicode_ci,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `completed_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_uuid` (`uuid`),
+  KEY `idx_user_id` (`user_id`),
+  CONSTRAINT `fk_nft_jobs_user_id` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT `fk_nft_jobs_collection_id` FOREIGN KEY (`collection_id`) REFERENCES `collections` (`id`) ON DELETE SET NULL ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
+-- ============================
+-- Table structure for `uploads`
+-- ============================
+
+
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+ /*!50503 SET character_set_client = utf8mb4 */;
+
+CREATE TABLE `uploads` (
+  `id` bigint unsigned NOT NULL AUTO_INCREMENT,
+  `file_id` varchar(32) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `user_id` bigint unsigned NOT NULL,
+  `filename` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `ext` varchar(10) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `status` enum('uploading','completed') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'uploading',
+  `total_size` bigint unsigned DEFAULT NULL,
+  `chunk_size` int unsigned DEFAULT NULL,
+  `checksum` varchar(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `physical_path` varchar(512) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `parameters` json DEFAULT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `completed_at` timestamp NULL DEFAULT NULL,
+  `last_used_at` timestamp NULL DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_file_id` (`file_id`),
+  KEY `idx_user_status` (`user_id`,`status`),
+  KEY `idx_status_last_used` (`status`,`last_used_at`),
+  CONSTRAINT `fk_uploads_user_id` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+
 -- =====================================================
 -- Trigger: Auto-create root collection on user insertion
 -- =====================================================
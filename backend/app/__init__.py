@@ -19,6 +19,14 @@ def create_app():
     jwt.init_app(app)
     db.init_app(app)
     mail.init_app(app)
+
+    # 结构化日志 (JSON 行)
+    from .utils.telemetry import configure_logging
+    configure_logging(app)
+
+    # 请求级性能剖析：接口耗时、SQL 次数/耗时、慢请求栈采样
+    from .utils.profiling import init_profiling
+    init_profiling(app)
     
     # 注册蓝图
     from .routes.auth_routes import auth_blueprint 
@@ -42,5 +50,21 @@ def create_app():
     # ⭐️⭐️⭐️ 新增：注册 upload 蓝图 ⭐️⭐️⭐️
     from .routes.upload_routes import upload_blueprint
     app.register_blueprint(upload_blueprint, url_prefix='/api/v1/upload')
+
+    # NFT: 批量 mint 收藏夹
+    from .routes.nft_routes import nft_blueprint
+    app.register_blueprint(nft_blueprint, url_prefix='/api/v1/nft')
+
+    # Prometheus 指标: /metrics
+    from .routes.metrics_routes import metrics_blueprint
+    app.register_blueprint(metrics_blueprint)
+
+    # 管理端接口（需要 admin 角色）
+    from .routes.admin_routes import admin_blueprint
+    app.register_blueprint(admin_blueprint, url_prefix='/api/v1/admin')
+
+    # 命令行: flask --app run storage-sweep
+    from .services.storage_service import register_storage_commands
+    register_storage_commands(app)
     
     return app
\ No newline at end of file
@@ -40,12 +40,24 @@ class Generation(db.Model):
     parameters = db.Column(db.JSON, nullable=True)
     result_url = db.Column(db.String(512), nullable=True)
     physical_path = db.Column(db.String(512), nullable=True)
+    # 结果文件大小（字节），用于用户空间配额统计
+    file_size = db.Column(db.BigInteger, nullable=True)
     created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
     completed_at = db.Column(db.TIMESTAMP, nullable=True)
+    # 任何修改都会刷新，客户端增量同步以 (updated_at, id) 作为游标
+    updated_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp(),
+                           onupdate=db.func.current_timestamp())
     
     # 关联到 User 模型
     user = db.relationship('User', backref=db.backref('generations', lazy=True))
 
+    __table_args__ = (
+        db.Index('idx_user_updated', 'user_id', 'updated_at', 'id'),
+        db.Index('idx_user_created', 'user_id', 'created_at'),
+        # 提示词全文检索，ngram 分词支持中文（MySQL 5.7.6+）
+        db.Index('ft_prompt', 'prompt', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
+
     def to_dict(self):
         params_data = self.parameters or {}
         review_info = params_data.get('review', {})
@@ -57,12 +69,26 @@ class Generation(db.Model):
             "status": self.status,
             "result_url": self.result_url,
             "completed_at": self.completed_at.isoformat() + "Z" if self.completed_at else None,
+            "updated_at": self.updated_at.isoformat() + "Z" if self.updated_at else None,
+            "optimized_prompt": params_data.get('optimized_prompt'),
             # 将审核信息也加入返回
             "review_status": review_info.get('status', 'pending'),
             "review_message": review_info.get('message', None)
         }
 
 
+class GenerationTombstone(db.Model):
+    """已删除生成记录的墓碑，客户端增量同步时据此删除本地副本"""
+    __tablename__ = 'generation_tombstones'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
+    uuid = db.Column(db.String(36), nullable=False)
+    deleted_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
+
+    __table_args__ = (db.Index('idx_user_deleted', 'user_id', 'deleted_at'),)
+
+
 class Collection(db.Model):
     __tablename__ = 'collections'
 
@@ -93,4 +119,118 @@ class Collection(db.Model):
         }
         if include_children:
             data['children'] = [child.to_dict(include_children=True) for child in self.children]
-        return data
\ No newline at end of file
+        return data
+
+class Upload(db.Model):
+    __tablename__ = 'uploads'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    # 对外暴露的文件ID，例如 ref_a1b2c3d4，生成任务里的 image 字段就是它
+    file_id = db.Column(db.String(32), unique=True, nullable=False)
+    user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=True)
+    ext = db.Column(db.String(10), nullable=False)
+    # uploading: 分片上传中；completed: 已合并/已保存
+    status = db.Column(db.Enum('uploading', 'completed'), nullable=False, default='uploading')
+    total_size = db.Column(db.BigInteger, nullable=True)
+    chunk_size = db.Column(db.Integer, nullable=True)
+    checksum = db.Column(db.String(64), nullable=True)
+    physical_path = db.Column(db.String(512), nullable=True)
+    parameters = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
+    completed_at = db.Column(db.TIMESTAMP, nullable=True)
+    # 最后一次被生成任务引用的时间（上传完成时初始化），参考图的保留期从这里算起
+    last_used_at = db.Column(db.TIMESTAMP, nullable=True)
+
+    user = db.relationship('User', backref=db.backref('uploads', lazy='dynamic'))
+
+    __table_args__ = (db.Index('idx_status_last_used', 'status', 'last_used_at'),)
+
+    @property
+    def total_chunks(self):
+        if not self.total_size or not self.chunk_size:
+            return 0
+        return (self.total_size + self.chunk_size - 1) // self.chunk_size
+
+    def to_dict(self):
+        return {
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "status": self.status,
+            "total_size": self.total_size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": self.total_chunks,
+            "created_at": self.created_at.isoformat() + "Z" if self.created_at else None,
+            "completed_at": self.completed_at.isoformat() + "Z" if self.completed_at else None
+        }
+
+
+class Nft(db.Model):
+    __tablename__ = 'nfts'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    generation_id = db.Column(db.BigInteger, db.ForeignKey('generations.id'), nullable=False, unique=True)
+    owner_user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
+    token_id = db.Column(db.String(255), nullable=True)
+    contract_address = db.Column(db.String(255), nullable=False)
+    transaction_hash = db.Column(db.String(255), nullable=True, unique=True)
+    status = db.Column(db.Enum('pending', 'confirmed', 'failed'), nullable=False, default='pending')
+    created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
+    confirmed_at = db.Column(db.TIMESTAMP, nullable=True)
+
+    generation = db.relationship('Generation', backref=db.backref('nft', uselist=False))
+
+
+class NftAsset(db.Model):
+    """已经上传到 IPFS 的文件，按内容哈希去重（同一张图只上传一次）"""
+    __tablename__ = 'nft_assets'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)
+    ipfs_uri = db.Column(db.String(512), nullable=False)
+    file_size = db.Column(db.BigInteger, nullable=True)
+    created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
+
+
+class NftJob(db.Model):
+    """批量 mint 任务，客户端轮询或订阅它的进度"""
+    __tablename__ = 'nft_jobs'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.BigInteger, db.ForeignKey('users.id'), nullable=False)
+    collection_id = db.Column(db.BigInteger, db.ForeignKey('collections.id'), nullable=True)
+    to_address = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.Enum('queued', 'running', 'completed', 'failed'), nullable=False, default='queued')
+    # hashing -> uploading -> metadata -> minting
+    stage = db.Column(db.String(20), nullable=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    succeeded = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    # 每个作品的处理结果: [{"generation_id", "name", "status", "token_id", "error", ...}]
+    items = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.TIMESTAMP, server_default=db.func.current_timestamp())
+    completed_at = db.Column(db.TIMESTAMP, nullable=True)
+
+    def to_dict(self, include_items=True):
+        data = {
+            "job_id": self.uuid,
+            "collection_id": self.collection_id,
+            "to_address": self.to_address,
+            "status": self.status,
+            "stage": self.stage,
+            "total": self.total,
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() + "Z" if self.created_at else None,
+            "completed_at": self.completed_at.isoformat() + "Z" if self.completed_at else None
+        }
+        if include_items:
+            data["items"] = self.items or []
+        return data
@@ -0,0 +1,59 @@
+# app/routes/admin_routes.py
+
+from flask import Blueprint, request
+from flask_jwt_extended import jwt_required
+from ..utils.helpers import api_response, admin_required
+from ..services import storage_service
+from ..services.generation_scheduler import get_generation_scheduler
+from ..utils import profiling
+
+admin_blueprint = Blueprint('admin', __name__)
+
+@admin_blueprint.route('/storage', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_storage_report():
+    """存储清理报表：清理线程统计 + 占用最多的用户"""
+    sweeper = storage_service.storage_sweeper
+    data = {
+        "sweeper": sweeper.stats if sweeper else None,
+        "top_users": storage_service.top_usage()
+    }
+    return api_response(code=200, message="成功", data=data)
+
+
+@admin_blueprint.route('/profiling', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_profiling_report():
+    """接口性能报表：各接口/各用户的耗时与 SQL 次数、最近的慢请求（含抽样到的调用栈）"""
+    profiler = profiling.request_profiler
+    if profiler is None:
+        return api_response(code=404, message="性能剖析未开启")
+    limit = request.args.get('limit', 20, type=int)
+    return api_response(code=200, message="成功", data=profiler.report(limit))
+
+
+@admin_blueprint.route('/scheduler', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_scheduler_report():
+    """生成任务调度：各通道排队/运行数、排队最多的用户、角色权重"""
+    return api_response(code=200, message="成功", data=get_generation_scheduler().snapshot())
+
+
+@admin_blueprint.route('/scheduler/weights', methods=['PUT'])
+@jwt_required()
+@admin_required
+def update_scheduler_weights():
+    """调整角色权重，例如 {"user": 1, "admin": 4}；只影响之后入队的任务，重启后恢复为配置值"""
+    data = request.get_json() or {}
+    try:
+        weights = {str(role): float(weight) for role, weight in data.items()}
+    except (TypeError, ValueError):
+        return api_response(code=400, message="请求参数不合规")
+    if not weights or any(w <= 0 for w in weights.values()):
+        return api_response(code=400, message="请求参数不合规")
+    scheduler = get_generation_scheduler()
+    scheduler.set_role_weights(weights)
+    return api_response(code=200, message="成功", data={"role_weights": scheduler.role_weights})
@@ -4,7 +4,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models import Collection, Generation, User
 from .. import db
-from ..utils.helpers import api_response 
+from ..utils.helpers import api_response, conditional_api_response
 collection_blueprint = Blueprint('collection', __name__)
 
 # ⭐️⭐️⭐️ --- 新增代码开始 --- ⭐️⭐️⭐️
@@ -113,7 +113,7 @@ def get_favorite_list():
              
         data_list.append(item)
 
-    return api_response(code=200, message="成功获取收藏夹列表", data=data_list)
+    return conditional_api_response(code=200, message="成功获取收藏夹列表", data=data_list)
 
 
 # --- 对应文档 API 9: 新增收藏夹内容 ---
@@ -1,109 +1,184 @@
 # app/routes/generation_routes.py
 
 import os
+import time
+import logging
 from flask import Blueprint, request, url_for, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import Generation
+from ..models import Generation, Upload, User
 from .. import db
-import threading
 from ..utils.helpers import api_response
 # 确保引用了最新的服务函数
-from ..services.ai_service import generate_image_with_jimeng, generate_video_with_jimeng
+from ..services.ai_service import (
+    generate_image_with_jimeng, generate_video_with_jimeng, T2I_REQ_KEY, T2I_PARAMS
+)
+from ..services.image_service import canonical_path_of
+from ..services.storage_service import check_quota, touch_uploads
+from ..services.object_storage import get_storage
+from ..services.generation_scheduler import get_generation_scheduler
+from ..services.prompt_cache import get_prompt_cache
+from ..utils.telemetry import (
+    new_trace_id, trace_context, current_trace, set_trace_attr, log_event, stage_timer,
+    GENERATION_QUEUE_WAIT, GENERATION_STAGE, GENERATION_TOTAL, GENERATION_IN_PROGRESS
+)
 
 generation_blueprint = Blueprint('generation', __name__)
 
+GENERATION_TYPES = ('t2i', 'i2i', 't2v', 'i2v')
+
 def find_file_path_by_id(file_id):
-    """根据 file_id (如 ref_1234) 在输出目录找到真实文件路径"""
+    """根据 file_id (如 ref_1234) 找到真实文件路径，优先使用上传时生成的标准版本"""
     if not file_id: return None
+
+    upload = Upload.query.filter_by(file_id=file_id, status='completed').first()
+    if upload:
+        return canonical_path_of(upload)
+
+    # 兼容没有上传记录的旧文件：只匹配 {file_id}.{ext}，避免误选 .preview/.norm 版本
     output_dir = current_app.config['REF_DIR']
-    
     if os.path.exists(output_dir):
         for fname in os.listdir(output_dir):
-            if fname.startswith(file_id):
+            if fname.rsplit('.', 1)[0] == file_id:
                 return os.path.join(output_dir, fname)
     return None
 
-def process_generation_task(generation_id, ref_image_id=None):
-    from app import create_app
-    app = create_app()
-    with app.app_context():
-        generation = Generation.query.get(generation_id)
-        if not generation: return
+def process_generation_task(app, generation_id, ref_image_id=None, trace_id=None, enqueued_at=None):
+    """调度器工作线程入口；app 为提交时的应用对象，所有任务共用（不再每个任务 create_app）"""
+    with app.app_context(), trace_context(trace_id, generation_id=generation_id):
+        if enqueued_at is not None:
+            GENERATION_QUEUE_WAIT.observe(time.time() - enqueued_at)
+        GENERATION_IN_PROGRESS.inc(1)
+        try:
+            _run_generation(generation_id, ref_image_id)
+        finally:
+            GENERATION_IN_PROGRESS.inc(-1)
 
-        prompt = generation.prompt
-        gen_type = generation.generation_type
-        ref_image_path = find_file_path_by_id(ref_image_id)
-        
-        ext = 'mp4' if gen_type in ['t2v', 'i2v'] else 'jpg'
-        output_filename = f"{generation.uuid}.{ext}"
-        
-        print(f"开始处理任务 {generation_id} [{gen_type}]")
 
-        saved_path = None
-        api_response_data = {} # 新增：用于存 API 原始返回
+def _run_generation(generation_id, ref_image_id):
+    task_start = time.perf_counter()
+    generation = Generation.query.get(generation_id)
+    if not generation: return
 
-        try:
-            # ⭐️ 核心修改：接收两个返回值 (路径, 原始JSON)
-            if gen_type in ['t2i', 'i2i']:
-                saved_path, api_response_data = generate_image_with_jimeng(prompt, output_filename, ref_image_path)
-            elif gen_type in ['t2v', 'i2v']:
-                saved_path, api_response_data = generate_video_with_jimeng(prompt, output_filename, ref_image_path)
-            else:
-                api_response_data = {"message": f"Unknown type {gen_type}"}
-
-        except Exception as e:
-            print(f"Task Error: {e}")
-            api_response_data = {"message": str(e)}
-
-        # --- 解析 Review 信息 (完全匹配前端给你的 JSON 结构) ---
-        
-        # 1. 提取 Code (10000 是成功)
-        code = api_response_data.get('code', -1)
-        
-        # 2. 提取 Message
-        # 优先看 data.algorithm_base_resp.status_message (算法层的详细信息)
-        # 其次看外层的 message
-        msg = api_response_data.get('message', 'Unknown Error')
-        if 'data' in api_response_data and isinstance(api_response_data['data'], dict):
-            algo_resp = api_response_data['data'].get('algorithm_base_resp')
-            if algo_resp and 'status_message' in algo_resp:
-                msg = algo_resp['status_message']
-
-        # 3. 决定 Status
-        # 只有当路径存在 且 API code 为 10000 时，才算 approved
-        if saved_path and code == 10000:
-            review_status = "approved"
-            final_status = 'completed'
-            generation.result_url = url_for('static_files.get_output_file', filename=output_filename, _external=True)
-            generation.physical_path = saved_path
+    prompt = generation.prompt
+    gen_type = generation.generation_type
+    ref_image_path = find_file_path_by_id(ref_image_id)
+    
+    ext = 'mp4' if gen_type in ['t2v', 'i2v'] else 'jpg'
+    output_filename = f"{generation.uuid}.{ext}"
+    
+    log_event('generation.started', type=gen_type, task_id=generation.uuid)
+
+    saved_path = None
+    api_response_data = {} # 新增：用于存 API 原始返回
+
+    # 服务重启前已提交到即梦的任务：跳过提交，直接继续轮询
+    upstream = (generation.parameters or {}).get('upstream') or {}
+
+    def checkpoint(req_key, task_id):
+        """异步任务提交成功后立即持久化即梦 task_id，进程崩溃后可以恢复轮询"""
+        params = dict(generation.parameters or {})
+        params['upstream'] = {"req_key": req_key, "task_id": task_id, "submitted_at": int(time.time())}
+        generation.parameters = params
+        db.session.commit()
+
+    # 文生图结果缓存：相同 prompt + 模型参数命中时直接复用已有输出，不再调用即梦
+    prompt_cache = get_prompt_cache()
+    cache_key = cache_hit = None
+    if prompt_cache.enabled and gen_type == 't2i' and not ref_image_path:
+        cache_key = prompt_cache.key_for(generation.user_id, prompt, gen_type, T2I_REQ_KEY, T2I_PARAMS)
+        cache_hit = prompt_cache.lookup(cache_key)
+
+    try:
+        # ⭐️ 核心修改：接收两个返回值 (路径, 原始JSON)
+        if cache_hit:
+            set_trace_attr('req_key', T2I_REQ_KEY)
+            output_filename = cache_hit['filename']
+            saved_path = cache_hit['physical_path']
+            api_response_data = {"code": 10000, "message": "Success"}
+            log_event('generation.cache_hit', source_task_id=cache_hit['task_id'])
+        elif gen_type in ['t2i', 'i2i']:
+            saved_path, api_response_data = generate_image_with_jimeng(
+                prompt, output_filename, ref_image_path,
+                resume_task_id=upstream.get('task_id'), checkpoint=checkpoint)
+        elif gen_type in ['t2v', 'i2v']:
+            saved_path, api_response_data = generate_video_with_jimeng(
+                prompt, output_filename, ref_image_path,
+                resume_task_id=upstream.get('task_id'), resume_req_key=upstream.get('req_key'),
+                checkpoint=checkpoint)
         else:
-            review_status = "rejected"
-            final_status = 'failed'
-            # 如果失败了，尽量让 msg 更有意义
-            if msg == "Success": msg = "Generation failed despite API success code"
-
-        # --- 更新数据库 ---
-        generation.status = final_status
-        current_params = generation.parameters or {}
-        
-        # 构造前端想要的 review 对象
-        current_params['review'] = {
-            "status": review_status,
-            "message": msg,
-            "api_code": code  # 把 code 也存进去，方便前端调试
-        }
-        
-        # 可选：如果 API 返回了优化的 Prompt，也可以存下来
-        if 'data' in api_response_data and isinstance(api_response_data['data'], dict):
-             llm_result = api_response_data['data'].get('llm_result')
-             if llm_result:
-                 current_params['optimized_prompt'] = llm_result
-
-        generation.parameters = current_params
-        generation.completed_at = db.func.current_timestamp()
+            api_response_data = {"message": f"Unknown type {gen_type}"}
+
+    except Exception as e:
+        log_event('generation.error', level=logging.ERROR, exc_info=True, error=str(e))
+        api_response_data = {"message": str(e)}
+
+    # --- 解析 Review 信息 (完全匹配前端给你的 JSON 结构) ---
+    
+    # 1. 提取 Code (10000 是成功)
+    code = api_response_data.get('code', -1)
+    
+    # 2. 提取 Message
+    # 优先看 data.algorithm_base_resp.status_message (算法层的详细信息)
+    # 其次看外层的 message
+    msg = api_response_data.get('message', 'Unknown Error')
+    if 'data' in api_response_data and isinstance(api_response_data['data'], dict):
+        algo_resp = api_response_data['data'].get('algorithm_base_resp')
+        if algo_resp and 'status_message' in algo_resp:
+            msg = algo_resp['status_message']
+
+    # 3. 决定 Status
+    # 只有当路径存在 且 API code 为 10000 时，才算 approved
+    if saved_path and code == 10000:
+        review_status = "approved"
+        final_status = 'completed'
+        generation.result_url = url_for('static_files.get_output_file', filename=output_filename, _external=True)
+        generation.physical_path = saved_path
+        if cache_hit:
+            # 文件与源记录共用，只计入源记录的配额；记 0 而不是 NULL，免得被存储清理线程回填
+            generation.file_size = 0
+        else:
+            generation.file_size = (get_storage().stat(saved_path) or {}).get('size')
+    else:
+        review_status = "rejected"
+        final_status = 'failed'
+        # 如果失败了，尽量让 msg 更有意义
+        if msg == "Success": msg = "Generation failed despite API success code"
+
+    # --- 更新数据库 ---
+    generation.status = final_status
+    # 复制一份再改，JSON 列赋回同一个对象不会被识别为修改
+    current_params = dict(generation.parameters or {})
+    
+    # 构造前端想要的 review 对象
+    current_params['review'] = {
+        "status": review_status,
+        "message": msg,
+        "api_code": code  # 把 code 也存进去，方便前端调试
+    }
+    
+    # 可选：如果 API 返回了优化的 Prompt，也可以存下来
+    if 'data' in api_response_data and isinstance(api_response_data['data'], dict):
+         llm_result = api_response_data['data'].get('llm_result')
+         if llm_result:
+             current_params['optimized_prompt'] = llm_result
+
+    if cache_hit:
+        current_params['cached_from'] = cache_hit['task_id']
+
+    generation.parameters = current_params
+    generation.completed_at = db.func.current_timestamp()
+    with stage_timer('db_commit'):
         db.session.commit()
-        
-        print(f"任务结束: {final_status}, Review: {review_status}, Msg: {msg}")
+
+    if cache_key and not cache_hit and final_status == 'completed':
+        prompt_cache.store(cache_key, generation.uuid, saved_path, output_filename)
+
+    req_key = current_trace().get('req_key', '')
+    duration = time.perf_counter() - task_start
+    GENERATION_TOTAL.inc(req_key=req_key, outcome=final_status)
+    GENERATION_STAGE.observe(duration, stage='total', req_key=req_key)
+    log_event('generation.finished', status=final_status, review=review_status, message=msg,
+              api_code=code, duration=round(duration, 4))
 
 
 @generation_blueprint.route('', methods=['POST'])
@@ -121,34 +196,152 @@ def create_generation_task():
     # 获取前端传来的 image (file_id)
     ref_image_id = data.get('image')
 
+    # 空间配额检查：超出配额的用户不能再发起生成
+    allowed, used, quota = check_quota(current_user_id)
+    if not allowed:
+        return api_response(code=413, message=f"存储空间已满（已用 {used} / {quota} 字节），请删除部分生成记录后重试")
+
+    # 追踪 ID：客户端可以通过 X-Request-ID 传入，否则新生成一个
+    trace_id = request.headers.get('X-Request-ID') or new_trace_id()
+    params = {"trace_id": trace_id}
+    if ref_image_id:
+        params["ref_image"] = ref_image_id
+
     try:
         new_generation = Generation(
             user_id=current_user_id,
             prompt=data['prompt'],
             generation_type=gen_type,
             status='processing',
-            parameters={"ref_image": ref_image_id} if ref_image_id else {}
+            parameters=params
         )
         db.session.add(new_generation)
+        touch_uploads([ref_image_id])
         db.session.commit()
         
-        # ⭐️ 启动线程时，传入 ref_image_id
-        thread = threading.Thread(target=process_generation_task, args=(new_generation.id, ref_image_id))
-        thread.start()
+        # 交给调度器：按类型进入快/慢通道，通道内按用户加权公平排队
+        user = User.query.get(current_user_id)
+        lane = get_generation_scheduler().submit(
+            new_generation.id, current_user_id, user.role if user else 'user', gen_type,
+            process_generation_task,
+            (current_app._get_current_object(), new_generation.id, ref_image_id, trace_id, time.time())
+        )
 
         response_data = {
             "task_id": new_generation.uuid,
             "created_at": new_generation.created_at.isoformat() + "Z",
             "type": new_generation.generation_type,
             "prompt": new_generation.prompt,
-            "image": ref_image_id 
+            "image": ref_image_id,
+            "trace_id": trace_id,
+            "queue": get_generation_scheduler().position(new_generation.id) or {"lane": lane}
         }
         return api_response(code=200, message="生成任务已创建", data=response_data)
     except Exception as e:
         db.session.rollback()
-        print(f"Task create error: {e}")
+        log_event('generation.create_failed', level=logging.ERROR, trace_id=trace_id, error=str(e))
+        return api_response(code=500, message="服务器内部错误")
+
+@generation_blueprint.route('/batch', methods=['POST'])
+@jwt_required()
+def create_generation_batch():
+    """批量发起任务：所有记录在一个事务中插入，再一次性交给调度器"""
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json()
+    items = data.get('items') if isinstance(data, dict) else None
+    max_items = current_app.config['GENERATION_BATCH_MAX_ITEMS']
+
+    if not isinstance(items, list) or not items:
+        return api_response(code=400, message="请求参数不完整")
+    if len(items) > max_items:
+        return api_response(code=400, message=f"单次最多提交 {max_items} 个任务")
+    for item in items:
+        if not isinstance(item, dict) or not item.get('prompt') or item.get('type') not in GENERATION_TYPES:
+            return api_response(code=400, message="请求参数不合规")
+
+    allowed, used, quota = check_quota(current_user_id)
+    if not allowed:
+        return api_response(code=413, message=f"存储空间已满（已用 {used} / {quota} 字节），请删除部分生成记录后重试")
+
+    # 整批共用一个 batch_id（可由 X-Request-ID 传入），每个任务有自己的 trace_id
+    batch_id = request.headers.get('X-Request-ID') or new_trace_id()
+
+    try:
+        generations = []
+        for item in items:
+            params = {"trace_id": new_trace_id(), "batch_id": batch_id}
+            if item.get('image'):
+                params["ref_image"] = item['image']
+            generations.append(Generation(
+                user_id=current_user_id,
+                prompt=item['prompt'],
+                generation_type=item['type'],
+                status='processing',
+                parameters=params
+            ))
+        db.session.add_all(generations)
+        touch_uploads([item.get('image') for item in items])
+        db.session.flush()
+        uuids = [g.uuid for g in generations]
+        db.session.commit()
+        # 提交后对象已过期，一条查询整批刷新（拿到 id/created_at），避免逐条懒加载
+        Generation.query.filter(Generation.uuid.in_(uuids)).all()
+
+        user = User.query.get(current_user_id)
+        role = user.role if user else 'user'
+        now = time.time()
+        app = current_app._get_current_object()
+        scheduler = get_generation_scheduler()
+        scheduler.submit_many([
+            (g.id, current_user_id, role, g.generation_type, process_generation_task,
+             (app, g.id, item.get('image'), g.parameters['trace_id'], now))
+            for g, item in zip(generations, items)
+        ])
+
+        tasks = [{
+            "task_id": g.uuid,
+            "created_at": g.created_at.isoformat() + "Z",
+            "type": g.generation_type,
+            "prompt": g.prompt,
+            "image": item.get('image'),
+            "trace_id": g.parameters['trace_id'],
+            "queue": scheduler.position(g.id)
+        } for g, item in zip(generations, items)]
+        log_event('generation.batch_created', batch_id=batch_id, count=len(tasks))
+        return api_response(code=200, message="生成任务已创建", data={"batch_id": batch_id, "tasks": tasks})
+    except Exception as e:
+        db.session.rollback()
+        log_event('generation.create_failed', level=logging.ERROR, trace_id=batch_id, error=str(e))
         return api_response(code=500, message="服务器内部错误")
 
+
+def _review_result(generation):
+    """
+    根据审核状态决定返回的 code 和 message：
+    失败任务优先透传第三方的错误码 (例如 20001) 与具体错误信息 (例如 "涉及敏感词")
+    """
+    if generation.status != 'failed':
+        return 200, "任务状态获取成功"
+
+    params = generation.parameters or {}
+    review = params.get('review', {})
+    stored_api_code = review.get('api_code')
+    stored_msg = review.get('message')
+
+    # 没有第三方码但任务失败了，给一个通用的错误码
+    response_code = stored_api_code if stored_api_code and stored_api_code != 10000 else 400
+    response_msg = stored_msg or "生成失败，请检查输入"
+    return response_code, response_msg
+
+
+def _status_data(generation, scheduler):
+    data = generation.to_dict()
+    if generation.status == 'processing':
+        # 排队位置与预计开始时间（任务不在本进程的调度器中时为 null）
+        data['queue'] = scheduler.position(generation.id)
+    return data
+
+
 @generation_blueprint.route('/<string:taskId>', methods=['GET'])
 @jwt_required()
 def get_generation_status(taskId):
@@ -160,40 +353,42 @@ def get_generation_status(taskId):
     if generation.user_id != current_user_id:
         return api_response(code=403, message="无权访问")
     
-    # 获取基本数据
-    data = generation.to_dict()
-    
-    # --- ⭐️ 核心修改开始：根据审核状态动态调整返回的 code 和 message ---
-    
-    # 默认状态
-    response_code = 200
-    response_msg = "任务状态获取成功"
-    
-    # 如果任务失败了，我们需要检查是因为什么失败
-    if generation.status == 'failed':
-        params = generation.parameters or {}
-        review = params.get('review', {})
-        
-        # 1. 尝试获取数据库里存的第三方 api_code (例如 20001)
-        stored_api_code = review.get('api_code')
-        
-        # 2. 尝试获取具体的错误信息 (例如 "涉及敏感词")
-        stored_msg = review.get('message')
-        
-        # 3. 决定返回给前端的 code
-        if stored_api_code and stored_api_code != 10000:
-            # 如果有第三方的错误码，直接透传给前端
-            response_code = stored_api_code 
-        else:
-            # 如果没有第三方码，但任务失败了，给一个通用的错误码 (如 400 或 -1)
-            response_code = 400 
-            
-        # 4. 决定返回给前端的 message
-        if stored_msg:
-            response_msg = stored_msg
-        else:
-            response_msg = "生成失败，请检查输入"
+    data = _status_data(generation, get_generation_scheduler())
+    response_code, response_msg = _review_result(generation)
+    return api_response(code=response_code, message=response_msg, data=data)
+
+
+@generation_blueprint.route('/batch/status', methods=['POST'])
+@jwt_required()
+def get_generation_batch_status():
+    """批量查询任务状态：一次查询返回多个 task_id 的状态，不属于当前用户或不存在的列入 missing"""
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json()
+    task_ids = data.get('task_ids') if isinstance(data, dict) else None
+    max_ids = current_app.config['GENERATION_BATCH_STATUS_MAX_IDS']
 
-    # --- 核心修改结束 ---
+    if not isinstance(task_ids, list) or not task_ids or not all(isinstance(t, str) for t in task_ids):
+        return api_response(code=400, message="请求参数不完整")
+    if len(task_ids) > max_ids:
+        return api_response(code=400, message=f"单次最多查询 {max_ids} 个任务")
 
-    return api_response(code=response_code, message=response_msg, data=data)
\ No newline at end of file
+    try:
+        generations = Generation.query.filter(
+            Generation.uuid.in_(task_ids),
+            Generation.user_id == current_user_id
+        ).all()
+        found = {g.uuid: g for g in generations}
+        scheduler = get_generation_scheduler()
+        tasks = []
+        for task_id in dict.fromkeys(task_ids):
+            generation = found.get(task_id)
+            if generation is None:
+                continue
+            item = _status_data(generation, scheduler)
+            item['code'], item['message'] = _review_result(generation)
+            tasks.append(item)
+        missing = [t for t in dict.fromkeys(task_ids) if t not in found]
+        return api_response(code=200, message="成功", data={"tasks": tasks, "missing": missing})
+    except Exception as e:
+        log_event('generation.batch_status_failed', level=logging.ERROR, error=str(e))
+        return api_response(code=500, message="服务器内部错误")
@@ -0,0 +1,14 @@
+# app/routes/metrics_routes.py
+
+from flask import Blueprint, Response, request, current_app, abort
+from ..utils.telemetry import registry
+
+metrics_blueprint = Blueprint('metrics', __name__)
+
+@metrics_blueprint.route('/metrics')
+def get_metrics():
+    """Prometheus 文本格式的进程内指标（供 Prometheus 抓取，不走 api_response 包装）"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        abort(401)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,104 @@
+# app/routes/nft_routes.py
+
+import json
+import time
+import threading
+from flask import Blueprint, request, Response, stream_with_context, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from ..models import Collection, NftJob
+from .. import db
+from ..utils.helpers import api_response
+from ..services.nft_pipeline import process_mint_job
+
+nft_blueprint = Blueprint('nft', __name__)
+
+
+@nft_blueprint.route('/collections/<int:collection_id>/mint', methods=['POST'])
+@jwt_required()
+def create_mint_job(collection_id):
+    """
+    接口 21: 批量 mint 收藏夹
+    请求体: {"to_address": "0x..."}
+    把文件夹（含子文件夹）下所有已完成的作品 mint 成 NFT，返回任务 ID，进度通过接口 22/23 获取
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+
+    to_address = data.get('to_address')
+    if not to_address:
+        return api_response(code=400, message="需要提供 to_address")
+
+    folder = Collection.query.filter_by(id=collection_id, user_id=current_user_id, node_type='folder').first()
+    if not folder:
+        return api_response(code=404, message="收藏夹不存在或无权访问")
+
+    # 同一个收藏夹同时只允许一个进行中的任务
+    running = NftJob.query.filter(
+        NftJob.collection_id == collection_id,
+        NftJob.status.in_(['queued', 'running'])
+    ).first()
+    if running:
+        return api_response(code=409, message="该收藏夹已有进行中的 mint 任务", data=running.to_dict(include_items=False))
+
+    try:
+        job = NftJob(user_id=current_user_id, collection_id=collection_id, to_address=to_address)
+        db.session.add(job)
+        db.session.commit()
+
+        thread = threading.Thread(target=process_mint_job, args=(job.id,))
+        thread.start()
+
+        return api_response(code=200, message="mint 任务已创建", data=job.to_dict(include_items=False))
+    except Exception as e:
+        db.session.rollback()
+        print(f"Create mint job error: {e}")
+        return api_response(code=500, message="服务器内部错误")
+
+
+@nft_blueprint.route('/jobs/<string:job_id>', methods=['GET'])
+@jwt_required()
+def get_mint_job(job_id):
+    """接口 22: 查询批量 mint 任务进度"""
+    current_user_id = int(get_jwt_identity())
+    job = NftJob.query.filter_by(uuid=job_id, user_id=current_user_id).first()
+    if not job:
+        return api_response(code=404, message="任务不存在")
+    return api_response(code=200, message="成功", data=job.to_dict())
+
+
+@nft_blueprint.route('/jobs/<string:job_id>/events', methods=['GET'])
+@jwt_required()
+def stream_mint_job(job_id):
+    """
+    接口 23: 订阅批量 mint 任务进度 (text/event-stream)
+    进度有变化时推送一条 progress 事件，任务结束时推送 done 事件后关闭连接
+    """
+    current_user_id = int(get_jwt_identity())
+    job = NftJob.query.filter_by(uuid=job_id, user_id=current_user_id).first()
+    if not job:
+        return api_response(code=404, message="任务不存在")
+
+    interval = current_app.config['NFT_JOB_STREAM_INTERVAL']
+
+    def generate():
+        last = None
+        while True:
+            # 任务在另一个线程里更新，每次都从数据库重新读
+            db.session.expire_all()
+            current = NftJob.query.filter_by(uuid=job_id).first()
+            if current is None:
+                break
+            data = current.to_dict()
+            finished = current.status in ('completed', 'failed')
+            if data != last:
+                event = 'done' if finished else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                last = data
+            if finished:
+                break
+            # 不持有数据库连接等待
+            db.session.remove()
+            time.sleep(interval)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,11 +1,20 @@
 # app/routes/static_routes.py
 
-from flask import Blueprint, send_from_directory, current_app
+from flask import Blueprint, abort
+from ..services.object_storage import get_storage
 
 static_files_blueprint = Blueprint('static_files', __name__)
 
 @static_files_blueprint.route('/outputs/<path:filename>')
 def get_output_file(filename):
-    """提供对生成的图片的访问"""
-    output_dir = current_app.config['OUTPUTS_DIR']
-    return send_from_directory(output_dir, filename)
\ No newline at end of file
+    """提供对生成的图片的访问（本地目录直接发送；对象存储则重定向到预签名地址或流式转发）"""
+    return get_storage().send('outputs', filename)
+
+@static_files_blueprint.route('/references/<path:filename>')
+def get_reference_file(filename):
+    """提供对上传的参考图（标准版本/预览版本）的访问"""
+    # 分片目录 (.chunks/) 里是未完成的上传，合并/写入中的临时文件也不对外提供
+    parts = filename.replace('\\', '/').split('/')
+    if any(part.startswith('.') for part in parts) or filename.endswith(('.merging', '.tmp')):
+        abort(404)
+    return get_storage().send('references', filename)
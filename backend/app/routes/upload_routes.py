@@ -2,10 +2,17 @@
 
 import os
 import uuid
+import shutil
+import hashlib
 from flask import Blueprint, request, current_app, url_for
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
+from ..models import Upload
+from .. import db
 from ..utils.helpers import api_response
+from ..services.image_service import normalize_image
+from ..services.storage_service import check_quota
+from ..services.object_storage import get_storage
 
 upload_blueprint = Blueprint('upload', __name__)
 
@@ -16,6 +23,76 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def new_file_id():
+    """生成唯一的 file_id，例如: ref_a1b2c3d4"""
+    return f"ref_{uuid.uuid4().hex[:8]}"
+
+def chunk_dir_for(file_id):
+    """某次分片上传的分片临时目录"""
+    return os.path.join(current_app.config['UPLOAD_CHUNK_DIR'], file_id)
+
+def publish_reference_files(upload):
+    """
+    把原图/标准版本/预览版本写入存储后端（/references 从存储后端取文件）
+    本地后端下文件本来就在 REF_DIR，这里什么也不做
+    """
+    storage = get_storage()
+    if storage.backend == 'local':
+        return
+    save_dir = os.path.dirname(upload.physical_path)
+    names = [os.path.basename(upload.physical_path)]
+    image_meta = (upload.parameters or {}).get('image') or {}
+    for key in ('canonical', 'preview'):
+        if image_meta.get(key):
+            names.append(image_meta[key]['filename'])
+    for name in names:
+        storage.save_file('references', name, os.path.join(save_dir, name))
+
+def normalize_upload(upload):
+    """
+    上传后处理：解码一次原图，生成标准版本与预览版本，元数据写入 upload.parameters['image']
+    处理失败（例如文件并不是合法图片）时保留原图，生成接口会退回使用原图
+    """
+    try:
+        image_meta = normalize_image(upload.physical_path, upload.file_id)
+        params = dict(upload.parameters or {})
+        params['image'] = image_meta
+        upload.parameters = params
+    except Exception as e:
+        print(f"Image normalize error ({upload.file_id}): {e}")
+    try:
+        publish_reference_files(upload)
+    except Exception as e:
+        print(f"Reference publish error ({upload.file_id}): {e}")
+
+def upload_result(upload):
+    """上传成功后的统一返回数据"""
+    image_meta = (upload.parameters or {}).get('image')
+    if not image_meta:
+        file_url = url_for('static_files.get_reference_file', filename=f"{upload.file_id}.{upload.ext}", _external=True)
+        return {"file_id": upload.file_id, "file_url": file_url}
+    return {
+        "file_id": upload.file_id,
+        "file_url": url_for('static_files.get_reference_file', filename=image_meta['canonical']['filename'], _external=True),
+        "preview_url": url_for('static_files.get_reference_file', filename=image_meta['preview']['filename'], _external=True),
+        "width": image_meta['width'],
+        "height": image_meta['height']
+    }
+
+def list_received_chunks(file_id):
+    """列出已经落盘的分片序号（断点续传时客户端据此跳过已传分片）"""
+    chunk_dir = chunk_dir_for(file_id)
+    if not os.path.isdir(chunk_dir):
+        return []
+    received = []
+    for fname in os.listdir(chunk_dir):
+        if fname.endswith('.part'):
+            try:
+                received.append(int(fname[:-5]))
+            except ValueError:
+                continue
+    return sorted(received)
+
 @upload_blueprint.route('', methods=['POST'])
 @jwt_required()
 def upload_image():
@@ -23,34 +100,39 @@ def upload_image():
     接口 12: 上传参考图片
     URI: /api/v1/upload (由 __init__.py 的 prefix 决定)
     """
+    current_user_id = int(get_jwt_identity())
+
     # 1. 检查请求中是否有文件
     if 'file' not in request.files:
         return api_response(code=400, message="请求中未包含文件(key应为'file')")
-    
+
     file = request.files['file']
-    
+
     # 2. 检查文件名是否为空
     if file.filename == '':
         return api_response(code=400, message="未选择文件")
 
+    # 空间配额检查（Content-Length 包含 multipart 开销，只是估算）
+    allowed, used, quota = check_quota(current_user_id, request.content_length or 0)
+    if not allowed:
+        return api_response(code=413, message="存储空间已满")
+
     # 3. 检查格式并保存
     if file and allowed_file(file.filename):
         # 获取文件后缀
         ext = file.filename.rsplit('.', 1)[1].lower()
-        
-        # 生成唯一的 file_id，例如: ref_a1b2c3d4
+
         # 使用 UUID 防止文件名冲突
-        random_id = uuid.uuid4().hex[:8]
-        file_id = f"ref_{random_id}"
+        file_id = new_file_id()
         new_filename = f"{file_id}.{ext}"
-        
+
         # 获取保存目录 (复用 config.py 里的 REF_DIR)
         save_dir = current_app.config['REF_DIR']
-        
+
         # 确保目录存在
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
-            
+
         # 保存文件
         save_path = os.path.join(save_dir, new_filename)
         try:
@@ -59,14 +141,224 @@ def upload_image():
             print(f"File save error: {e}")
             return api_response(code=500, message="文件保存失败")
 
+        # 记录上传信息，方便后续按 file_id 查找与清理
+        upload = Upload(
+            file_id=file_id,
+            user_id=current_user_id,
+            filename=secure_filename(file.filename),
+            ext=ext,
+            status='completed',
+            total_size=os.path.getsize(save_path),
+            physical_path=save_path,
+            completed_at=db.func.current_timestamp(),
+            last_used_at=db.func.current_timestamp()
+        )
+        # 解码一次，生成标准版本与预览版本
+        normalize_upload(upload)
+        try:
+            db.session.add(upload)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Upload record error: {e}")
+            return api_response(code=500, message="服务器内部错误")
+
         # 生成可访问的 URL
-        # 这里的 'static_files.get_output_file' 对应你 static_routes.py 里的函数名
+        # 这里的 'static_files.get_reference_file' 对应 static_routes.py 里的函数名
         # _external=True 会生成完整的 http://... 链接
-        file_url = url_for('static_files.get_output_file', filename=new_filename, _external=True)
-
-        return api_response(code=200, message="上传成功", data={
-            "file_id": file_id,
-            "file_url": file_url
-        })
+        return api_response(code=200, message="上传成功", data=upload_result(upload))
     else:
-        return api_response(code=400, message="不支持的文件格式(仅支持图片)")
\ No newline at end of file
+        return api_response(code=400, message="不支持的文件格式(仅支持图片)")
+
+
+# ==========================================
+# 分片上传（断点续传）
+# 流程: 初始化 -> PUT 分片 N (带 offset) -> 完成(校验 sha256)
+# ==========================================
+
+@upload_blueprint.route('/sessions', methods=['POST'])
+@jwt_required()
+def init_chunked_upload():
+    """
+    接口 17: 初始化分片上传
+    请求体: {"filename": "a.png", "total_size": 20971520, "checksum": "<sha256,可选>"}
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json()
+
+    if not data or 'filename' not in data or 'total_size' not in data:
+        return api_response(code=400, message="请求参数不完整")
+
+    filename = data['filename']
+    if not allowed_file(filename):
+        return api_response(code=400, message="不支持的文件格式(仅支持图片)")
+
+    try:
+        total_size = int(data['total_size'])
+    except (TypeError, ValueError):
+        return api_response(code=400, message="total_size 不合法")
+    if total_size <= 0 or total_size > current_app.config['UPLOAD_MAX_SIZE']:
+        return api_response(code=400, message="文件大小超出限制")
+
+    allowed, used, quota = check_quota(current_user_id, total_size)
+    if not allowed:
+        return api_response(code=413, message="存储空间已满")
+
+    try:
+        upload = Upload(
+            file_id=new_file_id(),
+            user_id=current_user_id,
+            filename=secure_filename(filename),
+            ext=filename.rsplit('.', 1)[1].lower(),
+            status='uploading',
+            total_size=total_size,
+            chunk_size=current_app.config['UPLOAD_CHUNK_SIZE'],
+            checksum=data.get('checksum')
+        )
+        db.session.add(upload)
+        db.session.commit()
+        os.makedirs(chunk_dir_for(upload.file_id), exist_ok=True)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Init upload error: {e}")
+        return api_response(code=500, message="服务器内部错误")
+
+    data = upload.to_dict()
+    data['received'] = []
+    return api_response(code=200, message="分片上传已创建", data=data)
+
+
+@upload_blueprint.route('/sessions/<string:file_id>', methods=['GET'])
+@jwt_required()
+def get_chunked_upload(file_id):
+    """接口 18: 查询分片上传进度（断点续传用）"""
+    current_user_id = int(get_jwt_identity())
+    upload = Upload.query.filter_by(file_id=file_id, user_id=current_user_id).first()
+    if not upload:
+        return api_response(code=404, message="上传任务不存在")
+
+    data = upload.to_dict()
+    data['received'] = list_received_chunks(file_id) if upload.status == 'uploading' else []
+    return api_response(code=200, message="成功", data=data)
+
+
+@upload_blueprint.route('/sessions/<string:file_id>/chunks/<int:index>', methods=['PUT'])
+@jwt_required()
+def put_chunk(file_id, index):
+    """
+    接口 19: 上传第 index 个分片
+    URI: /api/v1/upload/sessions/{file_id}/chunks/{index}?offset={字节偏移}
+    请求体: 分片的原始字节
+    同一分片可重复 PUT（幂等），用于失败重试
+    """
+    current_user_id = int(get_jwt_identity())
+    upload = Upload.query.filter_by(file_id=file_id, user_id=current_user_id).first()
+    if not upload:
+        return api_response(code=404, message="上传任务不存在")
+    if upload.status != 'uploading':
+        return api_response(code=409, message="上传已完成")
+
+    if index < 0 or index >= upload.total_chunks:
+        return api_response(code=400, message="分片序号越界")
+
+    # offset 必须与分片序号对齐，防止客户端分片大小与服务端不一致
+    offset = request.args.get('offset', type=int)
+    if offset is None or offset != index * upload.chunk_size:
+        return api_response(code=400, message="分片偏移不合法")
+
+    body = request.get_data(cache=False)
+    expected = min(upload.chunk_size, upload.total_size - offset)
+    if len(body) != expected:
+        return api_response(code=400, message=f"分片大小不合法(期望 {expected} 字节)")
+
+    chunk_dir = chunk_dir_for(file_id)
+    os.makedirs(chunk_dir, exist_ok=True)
+    part_path = os.path.join(chunk_dir, f"{index}.part")
+    # 先写临时文件再原子替换，避免并发/中断留下半个分片
+    tmp_path = f"{part_path}.{uuid.uuid4().hex[:6]}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, part_path)
+    except Exception as e:
+        print(f"Chunk save error: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return api_response(code=500, message="分片保存失败")
+
+    return api_response(code=200, message="分片上传成功", data={"index": index, "size": len(body)})
+
+
+@upload_blueprint.route('/sessions/<string:file_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_chunked_upload(file_id):
+    """
+    接口 20: 完成分片上传，按序合并并校验 sha256
+    请求体: {"checksum": "<sha256>"}
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+
+    upload = Upload.query.filter_by(file_id=file_id, user_id=current_user_id).first()
+    if not upload:
+        return api_response(code=404, message="上传任务不存在")
+
+    new_filename = f"{upload.file_id}.{upload.ext}"
+    if upload.status == 'completed':
+        # 重复提交完成请求（例如客户端没收到上次的响应），直接返回结果
+        return api_response(code=200, message="上传成功", data=upload_result(upload))
+
+    checksum = (data.get('checksum') or upload.checksum or '').lower()
+    if not checksum:
+        return api_response(code=400, message="缺少 checksum")
+
+    received = set(list_received_chunks(file_id))
+    missing = [i for i in range(upload.total_chunks) if i not in received]
+    if missing:
+        return api_response(code=400, message="分片不完整", data={"missing": missing})
+
+    save_dir = current_app.config['REF_DIR']
+    os.makedirs(save_dir, exist_ok=True)
+    save_path = os.path.join(save_dir, new_filename)
+    tmp_path = f"{save_path}.merging"
+    chunk_dir = chunk_dir_for(file_id)
+
+    # 流式合并，边写边算哈希，不把整个文件读进内存
+    sha256 = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as out:
+            for i in range(upload.total_chunks):
+                with open(os.path.join(chunk_dir, f"{i}.part"), 'rb') as part:
+                    while True:
+                        block = part.read(64 * 1024)
+                        if not block:
+                            break
+                        sha256.update(block)
+                        out.write(block)
+    except Exception as e:
+        print(f"Chunk merge error: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return api_response(code=500, message="分片合并失败")
+
+    if sha256.hexdigest() != checksum:
+        os.remove(tmp_path)
+        return api_response(code=400, message="文件校验失败(checksum 不匹配)")
+
+    try:
+        os.replace(tmp_path, save_path)
+        upload.status = 'completed'
+        upload.checksum = checksum
+        upload.physical_path = save_path
+        upload.completed_at = db.func.current_timestamp()
+        upload.last_used_at = db.func.current_timestamp()
+        normalize_upload(upload)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Complete upload error: {e}")
+        return api_response(code=500, message="服务器内部错误")
+
+    shutil.rmtree(chunk_dir, ignore_errors=True)
+
+    return api_response(code=200, message="上传成功", data=upload_result(upload))
@@ -1,11 +1,12 @@
 # app/routes/user_routes.py
 
 # from typing import Collection
-from flask import Blueprint, request
+from datetime import datetime, timedelta
+from flask import Blueprint, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import User, Generation, Collection
+from ..models import User, Generation, Collection, GenerationTombstone
 from .. import db
-from ..utils.helpers import api_response
+from ..utils.helpers import api_response, conditional_api_response
 
 user_blueprint = Blueprint('user', __name__)
 
@@ -73,11 +74,178 @@ def get_generation_list():
         # 你的 Generation 模型中 to_dict 已经适配了 task_id 等字段
         data_list = [gen.to_dict() for gen in generations]
         
-        return api_response(code=200, message="成功", data=data_list)
+        return conditional_api_response(code=200, message="成功", data=data_list)
     except Exception as e:
         print(f"Fetch list error: {e}")
         return api_response(code=500, message="服务器内部错误")
 
+def _parse_sync_cursor(cursor):
+    """游标格式为 "<updated_at ISO>|<id>"，为空或格式错误返回 (None, 0)"""
+    if not cursor:
+        return None, 0
+    try:
+        ts, _, last_id = cursor.partition('|')
+        return datetime.fromisoformat(ts.rstrip('Z')), int(last_id or 0)
+    except ValueError:
+        return None, 0
+
+
+def _format_sync_cursor(ts, last_id):
+    return f"{ts.isoformat()}Z|{last_id}"
+
+
+# --- 增量同步生成记录接口 ---
+@user_blueprint.route('/generation_list/changes', methods=['GET'])
+@jwt_required()
+def get_generation_changes():
+    """
+    按 (updated_at, id) 游标返回新增/修改的记录与删除墓碑，客户端据此维护本地副本。
+    没有游标（或游标早于墓碑保留期）时为全量同步，full=true，客户端应删除本地多余的记录
+    """
+    current_user_id = int(get_jwt_identity())
+    config = current_app.config
+    page_size = config['GENERATION_SYNC_PAGE_SIZE']
+    since_ts, since_id = _parse_sync_cursor(request.args.get('cursor'))
+    if since_ts and since_ts < datetime.now() - timedelta(days=config['GENERATION_TOMBSTONE_TTL_DAYS']):
+        since_ts, since_id = None, 0
+
+    query = Generation.query.filter(Generation.user_id == current_user_id)
+    if since_ts:
+        query = query.filter(db.or_(
+            Generation.updated_at > since_ts,
+            db.and_(Generation.updated_at == since_ts, Generation.id > since_id)
+        ))
+    rows = query.order_by(Generation.updated_at.asc(), Generation.id.asc()).limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    deleted = []
+    if since_ts:
+        tombstones = db.session.query(GenerationTombstone.uuid, GenerationTombstone.deleted_at)\
+            .filter(GenerationTombstone.user_id == current_user_id,
+                    GenerationTombstone.deleted_at >= since_ts).all()
+        deleted = [uuid for uuid, _ in tombstones]
+    else:
+        tombstones = []
+
+    if has_more:
+        cursor = _format_sync_cursor(rows[-1].updated_at, rows[-1].id)
+    else:
+        # 最后一页：游标往回退几秒，下次同步会重新拿到这段时间内提交的记录（客户端按 task_id 覆盖写入）
+        latest = max([r.updated_at for r in rows] + [t for _, t in tombstones] + ([since_ts] if since_ts else []),
+                     default=None)
+        cursor = _format_sync_cursor(
+            latest - timedelta(seconds=config['GENERATION_SYNC_OVERLAP_SECONDS']), 0) if latest else None
+
+    return api_response(code=200, message="成功", data={
+        "records": [gen.to_dict() for gen in rows],
+        "deleted": deleted,
+        "cursor": cursor,
+        "has_more": has_more,
+        "full": since_ts is None
+    })
+
+
+def _parse_search_date(value, end=False):
+    """YYYY-MM-DD 或 ISO 时间；只有日期时 end=True 取当天结束（返回次日 0 点，按 < 比较）"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.rstrip('Z'))
+    if end and len(value) <= 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def _fulltext_filters(q, ngram_size):
+    """
+    把搜索词拆成多个词，全部都要命中（AND）：
+    长度够 ngram 的词用 FULLTEXT 布尔模式的短语匹配（+"词"），更短的词用 LIKE
+    """
+    phrases, filters = [], []
+    for term in q.split():
+        term = term.replace('"', '')
+        if not term:
+            continue
+        if len(term) >= ngram_size:
+            phrases.append(f'+"{term}"')
+        else:
+            filters.append(Generation.prompt.contains(term, autoescape=True))
+    if phrases:
+        filters.insert(0, db.text("MATCH (generations.prompt) AGAINST (:q IN BOOLEAN MODE)")
+                       .bindparams(q=" ".join(phrases)))
+    return filters
+
+
+# --- 搜索生成记录接口 ---
+@user_blueprint.route('/generations/search', methods=['GET'])
+@jwt_required()
+def search_generations():
+    """
+    按提示词全文检索（FULLTEXT ngram 索引）并按类型/状态/日期过滤，分页返回，
+    同时返回类型与状态的分面计数（分面只受关键词与日期影响，不受类型/状态过滤影响）
+    """
+    current_user_id = int(get_jwt_identity())
+    config = current_app.config
+    args = request.args
+
+    q = (args.get('q') or '').strip()
+    types = [t for t in (args.get('type') or '').split(',') if t]
+    statuses = [t for t in (args.get('status') or '').split(',') if t]
+    try:
+        date_from = _parse_search_date(args.get('date_from'))
+        date_to = _parse_search_date(args.get('date_to'), end=True)
+        page = max(1, int(args.get('page', 1)))
+        page_size = min(max(1, int(args.get('page_size', 20))), config['GENERATION_SEARCH_MAX_PAGE_SIZE'])
+    except ValueError:
+        return api_response(code=400, message="请求参数不合规")
+    if any(t not in Generation.generation_type.type.enums for t in types) or \
+            any(s not in Generation.status.type.enums for s in statuses):
+        return api_response(code=400, message="type 或 status 不合规")
+
+    # 关键词与日期：结果与分面共用
+    base = [Generation.user_id == current_user_id]
+    if q:
+        base += _fulltext_filters(q, config['GENERATION_SEARCH_NGRAM_SIZE'])
+    if date_from:
+        base.append(Generation.created_at >= date_from)
+    if date_to:
+        base.append(Generation.created_at < date_to)
+
+    try:
+        # 分面：一次 GROUP BY (类型, 状态)，总数也从这里算，不再单独 COUNT
+        facet_rows = db.session.query(Generation.generation_type, Generation.status, db.func.count())\
+            .filter(*base).group_by(Generation.generation_type, Generation.status).all()
+        facets = {"type": {}, "status": {}}
+        total = 0
+        for gen_type, status, count in facet_rows:
+            if not statuses or status in statuses:
+                facets["type"][gen_type] = facets["type"].get(gen_type, 0) + count
+            if not types or gen_type in types:
+                facets["status"][status] = facets["status"].get(status, 0) + count
+            if (not types or gen_type in types) and (not statuses or status in statuses):
+                total += count
+
+        filters = list(base)
+        if types:
+            filters.append(Generation.generation_type.in_(types))
+        if statuses:
+            filters.append(Generation.status.in_(statuses))
+        rows = Generation.query.filter(*filters)\
+            .order_by(Generation.created_at.desc(), Generation.id.desc())\
+            .offset((page - 1) * page_size).limit(page_size).all() if total else []
+
+        return api_response(code=200, message="成功", data={
+            "items": [gen.to_dict() for gen in rows],
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "facets": facets
+        })
+    except Exception as e:
+        print(f"Search generations error: {e}")
+        return api_response(code=500, message="服务器内部错误")
+
+
 @user_blueprint.route('/generation_list', methods=['POST'])
 @jwt_required()
 def delete_generation_record():
@@ -106,10 +274,17 @@ def delete_generation_record():
         # 但显式删除更安全
         Collection.query.filter_by(generation_id=gen_record.id).delete()
 
-        # 2. 删除生成记录本身
+        # 2. 删除生成记录本身，并留下墓碑供其他设备增量同步
         db.session.delete(gen_record)
+        db.session.add(GenerationTombstone(user_id=current_user_id, uuid=gen_record.uuid))
+        ttl = current_app.config['GENERATION_TOMBSTONE_TTL_DAYS']
+        GenerationTombstone.query.filter(
+            GenerationTombstone.user_id == current_user_id,
+            GenerationTombstone.deleted_at < datetime.now() - timedelta(days=ttl)
+        ).delete(synchronize_session=False)
         
-        # 注意：这里我们只删除了数据库记录，物理文件 (gen_record.physical_path) 通常保留或由定期脚本清理
+        # 注意：这里我们只删除了数据库记录，物理文件 (gen_record.physical_path) 由后台存储清理线程
+        # (services/storage_service.py) 对账后删除，也可以手动运行 flask --app run storage-sweep
         
         db.session.commit()
         return api_response(code=200, message="生成记录删除成功", data={"result_url": result_url})
@@ -7,6 +7,14 @@ import time
 from flask import current_app
 from volcengine.visual.VisualService import VisualService
 import base64
+import logging
+from .object_storage import get_storage
+from .rate_limiter import get_upstream_limiter
+from .resilience import get_resilient_caller, RETRYABLE_CODES
+from ..utils.telemetry import (
+    log_event, stage_timer, set_trace_attr, current_trace,
+    GENERATION_STAGE, GENERATION_POLLS, DOWNLOAD_BYTES
+)
 
 # --- 1. 填坑用的伪造对象 ---
 class ApiInfoStruct:
@@ -40,11 +48,65 @@ def encode_image_to_base64(file_path):
         with open(file_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
     except Exception as e:
-        print(f"[Base64] 编码失败: {e}")
+        log_event('reference.encode_failed', level=logging.WARNING, error=str(e))
         return None
 
+def apply_endpoint(service):
+    """使用配置中的接口地址（压测时指向本地的假即梦服务）"""
+    service.service_info.host = current_app.config['VOLC_API_HOST']
+    service.service_info.scheme = current_app.config['VOLC_API_SCHEME']
+
+# 各接口对应的容错策略（见 config.UPSTREAM_RESILIENCE）
+UPSTREAM_OPS = {'SubmitTask': 'submit', 'GetResult': 'poll', 'CVProcess': 'sync'}
+
+def _sdk_error_response(e):
+    """SDK 在 HTTP 非 200 时抛出 Exception(响应体)；业务错误码（审核不通过、参数错误）原样返回，不重试"""
+    # 响应体是 bytes（Exception(resp.text.encode())），str(e) 会得到 "b'...'"，要取原始参数
+    resp = parse_sdk_response(e.args[0] if e.args else None)
+    code = resp.get('code')
+    if code is not None and code not in RETRYABLE_CODES:
+        return resp
+    raise e
+
+def call_upstream(service, action, body, stage=None):
+    """
+    所有即梦调用都经过:
+      1. 容错层：按操作重试/对冲，上游持续故障时熔断排队
+      2. 按 req_key 的限流器：超出 QPS/并发配额时在本地排队（每次重试/对冲都重新取配额）
+    stage 不为空时记录该次调用的耗时（不含排队时间）；返回解析后的响应字典
+    """
+    def send():
+        if action == 'CVProcess':
+            return service.cv_process(body)
+        return service.json(action, {}, json.dumps(body))
+
+    def invoke():
+        try:
+            if stage is None:
+                raw = send()
+            else:
+                with stage_timer(stage):
+                    raw = send()
+        except Exception as e:
+            return _sdk_error_response(e)
+        return parse_sdk_response(raw)
+
+    # 限流名额由容错层在每次尝试/对冲时获取，对冲计时只覆盖网络调用
+    limiter = get_upstream_limiter()
+    return get_resilient_caller().call(
+        UPSTREAM_OPS[action], invoke,
+        slot=lambda max_wait=None: limiter.slot(body['req_key'], max_wait))
+
 # --- 4. 图片生成服务 (文生图 + 图生图) ---
-def generate_image_with_jimeng(prompt, output_filename, ref_image_path=None):
+# 文生图的模型与除 prompt 外的固定参数（结果缓存的 key 也由它们组成）
+T2I_REQ_KEY = "jimeng_high_aes_general_v21_L"
+T2I_PARAMS = {"return_url": True}
+
+def generate_image_with_jimeng(prompt, output_filename, ref_image_path=None, resume_task_id=None, checkpoint=None):
+    """
+    resume_task_id: 服务重启前已提交的即梦任务 ID，传入时跳过提交直接轮询
+    checkpoint(req_key, task_id): 异步任务提交成功后回调，用于把任务 ID 持久化
+    """
     ak = current_app.config.get('VOLC_ACCESS_KEY_ID')
     sk = current_app.config.get('VOLC_SECRET_ACCESS_KEY')
     if not ak or not sk: return None, {"message": "AK/SK missing"}
@@ -52,15 +114,13 @@ def generate_image_with_jimeng(prompt, output_filename, ref_image_path=None):
     visual_service = VisualService()
     visual_service.set_ak(ak)
     visual_service.set_sk(sk)
+    apply_endpoint(visual_service)
 
     # ==========================================
     # 分支 A: 图生图 (i2i) - 使用 Jimeng 3.0 异步接口
     # ==========================================
-    if ref_image_path:
-        print(f">>> [Jimeng i2i v3.0] 启动异步图生图: {ref_image_path}")
-        
+    if ref_image_path or resume_task_id:
         # 1. 初始化服务配置 (异步接口需要配置 Host 和 API Info)
-        visual_service.service_info.host = 'visual.volcengineapi.com'
         visual_service.service_info.socket_timeout = 30
         visual_service.service_info.connection_timeout = 30
         
@@ -69,37 +129,45 @@ def generate_image_with_jimeng(prompt, output_filename, ref_image_path=None):
         if 'GetResult' not in visual_service.api_info:
             visual_service.api_info['GetResult'] = ApiInfoStruct('POST', '/', {'Action': 'CVSync2AsyncGetResult', 'Version': '2022-08-31'})
 
-        # 2. 准备参数
-        base64_str = encode_image_to_base64(ref_image_path)
-        if not base64_str:
-            return None, {"message": "Failed to encode reference image"}
-
         req_key = "jimeng_i2i_v30"
-        submit_body = {
-            "req_key": req_key,
-            "binary_data_base64": [base64_str], # 数组格式
-            "prompt": prompt,
-            "scale": 0.5,  # 0.5 是官方推荐值，数值越大越像 Prompt，越小越像原图
-            "seed": -1
-        }
+        set_trace_attr('req_key', req_key)
 
         try:
-            # 3. 提交任务
-            print(f">>> [i2i] 提交任务...")
-            raw_resp = visual_service.json('SubmitTask', {}, json.dumps(submit_body))
-            resp = parse_sdk_response(raw_resp)
+            if resume_task_id:
+                task_id = resume_task_id
+                log_event('upstream.resumed', req_key=req_key, upstream_task_id=task_id)
+            else:
+                # 2. 准备参数
+                base64_str = encode_image_to_base64(ref_image_path)
+                if not base64_str:
+                    return None, {"message": "Failed to encode reference image"}
 
-            if 'data' not in resp or 'task_id' not in resp['data']:
-                print(f"❌ [i2i] 提交失败: {resp}")
-                return None, resp
+                submit_body = {
+                    "req_key": req_key,
+                    "binary_data_base64": [base64_str], # 数组格式
+                    "prompt": prompt,
+                    "scale": 0.5,  # 0.5 是官方推荐值，数值越大越像 Prompt，越小越像原图
+                    "seed": -1
+                }
 
-            task_id = resp['data']['task_id']
-            print(f">>> [i2i] 任务ID: {task_id}，开始轮询...")
+                # 3. 提交任务
+                raw_resp = call_upstream(visual_service, 'SubmitTask', submit_body, stage='submit')
+                resp = parse_sdk_response(raw_resp)
+
+                if 'data' not in resp or 'task_id' not in resp['data']:
+                    log_event('upstream.submit_failed', level=logging.WARNING, req_key=req_key, response=resp)
+                    return None, resp
+
+                task_id = resp['data']['task_id']
+                log_event('upstream.submitted', req_key=req_key, upstream_task_id=task_id)
+                if checkpoint:
+                    checkpoint(req_key, task_id)
 
             # 4. 轮询结果
             last_resp = {}
+            processing_start = time.perf_counter()
             for i in range(60):
-                time.sleep(2) 
+                time.sleep(current_app.config['JIMENG_IMAGE_POLL_INTERVAL'])
                 # 查询时必须带上 return_url: true
                 query_body = {
                     "req_key": req_key,
@@ -107,12 +175,15 @@ def generate_image_with_jimeng(prompt, output_filename, ref_image_path=None):
                     "req_json": json.dumps({"return_url": True}) 
                 }
                 
-                raw_get_resp = visual_service.json('GetResult', {}, json.dumps(query_body))
+                raw_get_resp = call_upstream(visual_service, 'GetResult', query_body)
                 get_resp = parse_sdk_response(raw_get_resp)
                 last_resp = get_resp
                 
                 status = get_resp.get('data', {}).get('status')
                 
+                if status in ['done', 'failed', 'not_found', 'expired']:
+                    _record_upstream_done(req_key, i + 1, processing_start, status)
+
                 if status == 'done':
                     image_urls = get_resp['data'].get('image_urls', [])
                     if image_urls:
@@ -124,45 +195,54 @@ def generate_image_with_jimeng(prompt, output_filename, ref_image_path=None):
                 elif status in ['failed', 'not_found', 'expired']:
                     return None, get_resp
                 
-                print(f"    ... [i2i] {status}")
+                log_event('upstream.poll', level=logging.DEBUG, req_key=req_key, attempt=i + 1, status=status)
             
+            _record_upstream_done(req_key, 60, processing_start, 'timeout')
             return None, {"message": "Timeout", "last_response": last_resp}
 
         except Exception as e:
-            print(f"❌ [i2i Error] {e}")
+            log_event('upstream.error', level=logging.ERROR, req_key=req_key, error=str(e))
             return None, {"message": str(e)}
 
     # ==========================================
     # 分支 B: 文生图 (t2i) - 保持 V2.1 同步接口
     # ==========================================
     else:
-        print(f">>> [Jimeng t2i v2.1] 文生图模式")
-        form_data = {
-            "req_key": "jimeng_high_aes_general_v21_L", 
-            "prompt": prompt, 
-            "return_url": True
-        }
+        form_data = {"req_key": T2I_REQ_KEY, "prompt": prompt, **T2I_PARAMS}
+        set_trace_attr('req_key', form_data['req_key'])
         try:
-            res = visual_service.cv_process(form_data)
-            if 'data' not in res: return None, res 
+            # 同步接口：提交即处理，整段耗时记为 upstream 阶段
+            res = call_upstream(visual_service, 'CVProcess', form_data, stage='upstream')
+            if not res.get('data'): return None, res
             saved_path = download_file(res['data']['image_urls'][0], output_filename)
             return saved_path, res
         except Exception as e:
+            log_event('upstream.error', level=logging.ERROR, req_key=form_data['req_key'], error=str(e))
             return None, {"message": str(e), "code": -1}
 
 
+def _record_upstream_done(req_key, polls, processing_start, status):
+    """异步任务结束（成功/失败/超时）时记录轮询次数与上游处理耗时"""
+    GENERATION_POLLS.observe(polls, req_key=req_key)
+    duration = time.perf_counter() - processing_start
+    GENERATION_STAGE.observe(duration, stage='upstream', req_key=req_key)
+    log_event('stage.upstream', duration=round(duration, 4), req_key=req_key, polls=polls, status=status)
+
+
 # --- 5. 视频生成服务 (文生视频 + 图生视频) ---
-def generate_video_with_jimeng(prompt, output_filename, ref_image_path=None):
+def generate_video_with_jimeng(prompt, output_filename, ref_image_path=None, resume_task_id=None,
+                               resume_req_key=None, checkpoint=None):
+    """resume_task_id / resume_req_key / checkpoint 含义同 generate_image_with_jimeng"""
     ak = current_app.config.get('VOLC_ACCESS_KEY_ID')
     sk = current_app.config.get('VOLC_SECRET_ACCESS_KEY')
     if not ak or not sk:
-        print("❌ [Error] AK 或 SK 未配置！")
+        log_event('upstream.config_missing', level=logging.ERROR)
         return None, {"message": "AK/SK missing"}
 
     video_service = VisualService()
     video_service.set_ak(ak)
     video_service.set_sk(sk)
-    video_service.service_info.host = 'visual.volcengineapi.com'
+    apply_endpoint(video_service)
     video_service.service_info.socket_timeout = 30
     video_service.service_info.connection_timeout = 30
     
@@ -181,8 +261,10 @@ def generate_video_with_jimeng(prompt, output_filename, ref_image_path=None):
     }
 
     # 2. 如果有参考图 (图生视频)，切换 Key 和 参数
-    if ref_image_path:
-        print(f">>> [i2v] 正在处理参考图: {ref_image_path}")
+    if resume_task_id:
+        # 恢复轮询时不再编码参考图，req_key 以提交时记录的为准
+        submit_body["req_key"] = resume_req_key or submit_body["req_key"]
+    elif ref_image_path:
         base64_str = encode_image_to_base64(ref_image_path)
         if base64_str:
             submit_body["req_key"] = "jimeng_i2v_first_v30_1080"
@@ -191,61 +273,80 @@ def generate_video_with_jimeng(prompt, output_filename, ref_image_path=None):
             if "aspect_ratio" in submit_body:
                 del submit_body["aspect_ratio"]
         else:
-            print(">>> [i2v] 参考图编码失败，降级为文生视频")
+            log_event('reference.fallback_t2v', level=logging.WARNING)
 
+    req_key = submit_body['req_key']
+    set_trace_attr('req_key', req_key)
     try:
-        print(f">>> [Video] 提交任务 (Key: {submit_body['req_key']})...")
-        raw_resp = video_service.json('SubmitTask', {}, json.dumps(submit_body))
-        resp = parse_sdk_response(raw_resp)
+        if resume_task_id:
+            task_id = resume_task_id
+            log_event('upstream.resumed', req_key=req_key, upstream_task_id=task_id)
+        else:
+            raw_resp = call_upstream(video_service, 'SubmitTask', submit_body, stage='submit')
+            resp = parse_sdk_response(raw_resp)
 
-        if 'data' not in resp or 'task_id' not in resp['data']:
-            print(f"❌ [Error] 视频任务提交失败: {resp}")
-            return None, resp
+            if 'data' not in resp or 'task_id' not in resp['data']:
+                log_event('upstream.submit_failed', level=logging.WARNING, req_key=req_key, response=resp)
+                return None, resp
 
-        task_id = resp['data']['task_id']
-        print(f">>> [Video] 任务ID: {task_id}")
+            task_id = resp['data']['task_id']
+            log_event('upstream.submitted', req_key=req_key, upstream_task_id=task_id)
+            if checkpoint:
+                checkpoint(req_key, task_id)
 
         last_resp = {}
+        processing_start = time.perf_counter()
         for i in range(60):
-            time.sleep(5)
+            time.sleep(current_app.config['JIMENG_VIDEO_POLL_INTERVAL'])
             query_body = {"req_key": submit_body["req_key"], "task_id": task_id}
             
-            raw_get_resp = video_service.json('GetResult', {}, json.dumps(query_body))
+            raw_get_resp = call_upstream(video_service, 'GetResult', query_body)
             get_resp = parse_sdk_response(raw_get_resp)
             last_resp = get_resp 
             
             data = get_resp.get('data', {})
             status = data.get('status')
             
+            if status in ['done', 'failed', 'not_found', 'expired']:
+                _record_upstream_done(req_key, i + 1, processing_start, status)
+
             if status == 'done':
                 video_url = data.get('video_url')
                 saved_path = download_file(video_url, output_filename)
                 return saved_path, get_resp
             elif status in ['failed', 'not_found', 'expired']:
-                print(f"❌ [Error] 视频生成失败: {status}")
                 return None, get_resp
-            print(f"    ... [{i+1}/60] {status}")
+            log_event('upstream.poll', level=logging.DEBUG, req_key=req_key, attempt=i + 1, status=status)
 
+        _record_upstream_done(req_key, 60, processing_start, 'timeout')
         return None, {"message": "Timeout polling video", "last_response": last_resp}
     except Exception as e:
-        print(f"❌ [Error] generate_video 异常: {e}")
+        log_event('upstream.error', level=logging.ERROR, req_key=req_key, error=str(e))
         return None, {"message": str(e), "code": -1}
 
 
 # --- 6. 下载函数 ---
 def download_file(url, filename):
+    """
+    下载结果并写入存储后端，返回 locator（本地为绝对路径，对象存储为 s3://...）
+    响应体边下边写，大视频在对象存储下自动走分片上传
+    """
     try:
-        print(f">>> 下载文件: {url}")
+        start = time.perf_counter()
         resp = requests.get(url, stream=True, timeout=120, verify=False)
         resp.raise_for_status()
-        output_dir = current_app.config['OUTPUTS_DIR']
-        os.makedirs(output_dir, exist_ok=True)
-        output_path = os.path.join(output_dir, filename)
-        with open(output_path, 'wb') as f:
-            for chunk in resp.iter_content(4096):
-                f.write(chunk)
-        print(f"<<< 已保存: {output_path}")
+        resp.raw.decode_content = True
+        storage = get_storage()
+        output_path = storage.save_stream(
+            'outputs', filename, resp.raw,
+            content_type=resp.headers.get('Content-Type')
+        )
+        size = (storage.stat(output_path) or {}).get('size', 0)
+        duration = time.perf_counter() - start
+        DOWNLOAD_BYTES.inc(size)
+        GENERATION_STAGE.observe(duration, stage='download', req_key=current_trace().get('req_key', ''))
+        log_event('stage.download', duration=round(duration, 4), bytes=size, path=output_path)
         return output_path
     except Exception as e:
-        print(f"下载失败: {e}")
+        log_event('download.failed', level=logging.ERROR, url=url, error=str(e))
         return None
\ No newline at end of file
@@ -0,0 +1,58 @@
+# app/services/generation_recovery.py
+
+from datetime import datetime, timedelta
+from flask import current_app
+from .. import db
+from ..models import Generation, User
+from ..utils.telemetry import log_event
+from .generation_scheduler import get_generation_scheduler
+
+# 服务重启后未完成的任务状态
+UNFINISHED_STATUSES = ('queued', 'processing')
+STALE_MESSAGE = "服务重启，任务已超时"
+
+
+def recover_generations(app):
+    """
+    启动时对账未完成的生成任务（调度队列在内存中，进程重启后会丢失）：
+      1. 创建超过 GENERATION_RECOVERY_MAX_AGE_HOURS 的：一条 UPDATE 批量标记为失败
+      2. 已提交到即梦（parameters.upstream.task_id）的：重新入队，跳过提交直接轮询
+      3. 还没提交的：重新入队，从头执行
+    只适用于单进程部署（由 run.py 启动时调用）；返回各类数量
+    """
+    from ..routes.generation_routes import process_generation_task
+
+    with app.app_context():
+        cutoff = datetime.now() - timedelta(hours=current_app.config['GENERATION_RECOVERY_MAX_AGE_HOURS'])
+        unfinished = Generation.status.in_(UNFINISHED_STATUSES)
+
+        failed = Generation.query.filter(unfinished, Generation.created_at < cutoff).update({
+            Generation.status: 'failed',
+            Generation.completed_at: db.func.current_timestamp(),
+            Generation.parameters: db.func.json_set(
+                db.func.coalesce(Generation.parameters, db.func.json_object()),
+                '$.review',
+                db.func.json_object('status', 'rejected', 'message', STALE_MESSAGE, 'api_code', -1)
+            )
+        }, synchronize_session=False)
+        db.session.commit()
+
+        rows = db.session.query(Generation.id, Generation.user_id, Generation.generation_type,
+                                Generation.parameters, User.role)\
+            .join(User, User.id == Generation.user_id)\
+            .filter(unfinished).order_by(Generation.id).all()
+
+        resumed = 0
+        jobs = []
+        for gen_id, user_id, gen_type, params, role in rows:
+            params = params or {}
+            if (params.get('upstream') or {}).get('task_id'):
+                resumed += 1
+            jobs.append((gen_id, user_id, role, gen_type, process_generation_task,
+                         (app, gen_id, params.get('ref_image'), params.get('trace_id'), None)))
+        if jobs:
+            get_generation_scheduler().submit_many(jobs)
+
+        stats = {"failed": failed, "resumed": resumed, "requeued": len(jobs) - resumed}
+        log_event('generation.recovered', **stats)
+        return stats
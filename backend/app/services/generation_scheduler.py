@@ -0,0 +1,187 @@
+# app/services/generation_scheduler.py
+
+import time
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from ..utils.telemetry import registry, Gauge, log_event
+
+GENERATION_QUEUED = registry.register(Gauge(
+    'aigc_generation_queued', '排队等待执行的生成任务数', ('lane',)))
+
+
+class _Job:
+    __slots__ = ('generation_id', 'user_id', 'start_tag', 'finish_tag', 'seq', 'target', 'args', 'enqueued_at')
+
+    def __init__(self, generation_id, user_id, target, args):
+        self.generation_id = generation_id
+        self.user_id = user_id
+        self.target = target
+        self.args = args
+        self.enqueued_at = time.time()
+        self.start_tag = self.finish_tag = 0.0
+        self.seq = 0
+
+    def sort_key(self):
+        return (self.finish_tag, self.seq)
+
+    def __lt__(self, other):
+        return self.sort_key() < other.sort_key()
+
+
+class _Lane:
+    """
+    一条执行通道（例如快速的 t2i/i2i、慢速的 t2v/i2v），有自己的工作线程
+    通道内按用户做加权公平排队 (WFQ)：
+        start  = max(通道虚拟时间, 该用户上一个任务的 finish)
+        finish = start + 1 / weight
+    每次取 finish 最小的任务执行。一个用户一次提交 500 个任务，它们的 finish 依次递增，
+    其他用户新提交的任务 finish 从当前虚拟时间算起，很快就能插到前面
+    """
+    def __init__(self, name, types, workers, est_seconds):
+        self.name = name
+        self.types = set(types)
+        self.workers = workers
+        self.est_seconds = float(est_seconds)   # 单个任务耗时估计（指数滑动平均）
+        self.heap = []
+        self.virtual_time = 0.0
+        self.user_finish = {}
+        self.running = {}                       # generation_id -> 开始时间
+
+
+class GenerationScheduler:
+    def __init__(self, lanes, role_weights):
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.lanes = {name: _Lane(name, conf['types'], conf['workers'], conf.get('est_seconds', 30))
+                      for name, conf in lanes.items()}
+        self.role_weights = dict(role_weights)
+        self._jobs = {}                         # generation_id -> (lane, job)，只包含排队中的任务
+        for lane in self.lanes.values():
+            for i in range(lane.workers):
+                threading.Thread(target=self._worker, args=(lane,), daemon=True,
+                                 name=f"gen-{lane.name}-{i}").start()
+
+    def lane_for(self, gen_type):
+        for lane in self.lanes.values():
+            if gen_type in lane.types:
+                return lane
+        return next(iter(self.lanes.values()))
+
+    def weight_for(self, role):
+        return max(0.01, float(self.role_weights.get(role, self.role_weights.get('user', 1))))
+
+    def set_role_weights(self, weights):
+        """修改角色权重，只影响之后入队的任务"""
+        with self._cond:
+            self.role_weights.update(weights)
+
+    def submit(self, generation_id, user_id, role, gen_type, target, args):
+        return self.submit_many([(generation_id, user_id, role, gen_type, target, args)])[0]
+
+    def submit_many(self, items):
+        """
+        一次加锁入队多个任务，items 为 (generation_id, user_id, role, gen_type, target, args)
+        返回每个任务所在的通道名
+        """
+        lanes = []
+        with self._cond:
+            for generation_id, user_id, role, gen_type, target, args in items:
+                lane = self.lane_for(gen_type)
+                job = _Job(generation_id, user_id, target, args)
+                job.seq = next(self._seq)
+                job.start_tag = max(lane.virtual_time, lane.user_finish.get(user_id, 0.0))
+                job.finish_tag = job.start_tag + 1.0 / self.weight_for(role)
+                lane.user_finish[user_id] = job.finish_tag
+                heapq.heappush(lane.heap, job)
+                self._jobs[generation_id] = (lane, job)
+                lanes.append(lane)
+            for lane in set(lanes):
+                GENERATION_QUEUED.set(len(lane.heap), lane=lane.name)
+            self._cond.notify_all()
+        return [lane.name for lane in lanes]
+
+    def _worker(self, lane):
+        while True:
+            with self._cond:
+                while not lane.heap:
+                    self._cond.wait()
+                job = heapq.heappop(lane.heap)
+                self._jobs.pop(job.generation_id, None)
+                lane.virtual_time = max(lane.virtual_time, job.start_tag)
+                # 没有排队任务的用户不再需要记录 finish，避免字典无限增长
+                if lane.user_finish.get(job.user_id) == job.finish_tag:
+                    del lane.user_finish[job.user_id]
+                lane.running[job.generation_id] = time.time()
+                GENERATION_QUEUED.set(len(lane.heap), lane=lane.name)
+
+            start = time.time()
+            try:
+                job.target(*job.args)
+            except Exception as e:
+                log_event('scheduler.job_failed', generation_id=job.generation_id, lane=lane.name, error=str(e))
+            finally:
+                with self._cond:
+                    lane.running.pop(job.generation_id, None)
+                    lane.est_seconds = 0.8 * lane.est_seconds + 0.2 * (time.time() - start)
+
+    def position(self, generation_id):
+        """
+        排队中的任务返回所在通道、前面还有几个任务与预计开始时间；已开始执行返回 position=0；
+        不在本进程的调度器中（已结束或进程重启）返回 None
+        """
+        with self._cond:
+            entry = self._jobs.get(generation_id)
+            if entry is None:
+                for lane in self.lanes.values():
+                    if generation_id in lane.running:
+                        return {"lane": lane.name, "position": 0, "state": "running",
+                                "estimated_start": None}
+                return None
+            lane, job = entry
+            ahead = sum(1 for other in lane.heap if other.sort_key() < job.sort_key())
+            free = lane.workers - len(lane.running)
+            if ahead < free:
+                wait_seconds = 0.0
+            else:
+                # 正在运行的任务按平均剩一半估算，之后每轮 workers 个任务
+                wait_seconds = lane.est_seconds * ((ahead - free) // lane.workers + 0.5)
+            estimated = datetime.utcnow() + timedelta(seconds=wait_seconds)
+            return {"lane": lane.name, "position": ahead + 1, "state": "queued",
+                    "estimated_start": estimated.isoformat(timespec='seconds') + "Z"}
+
+    def snapshot(self):
+        """管理端查看：各通道排队/运行数、排队最多的用户与当前权重"""
+        with self._cond:
+            lanes = {}
+            for lane in self.lanes.values():
+                per_user = {}
+                for job in lane.heap:
+                    per_user[job.user_id] = per_user.get(job.user_id, 0) + 1
+                top = sorted(per_user.items(), key=lambda kv: kv[1], reverse=True)[:10]
+                lanes[lane.name] = {
+                    "types": sorted(lane.types),
+                    "workers": lane.workers,
+                    "running": len(lane.running),
+                    "queued": len(lane.heap),
+                    "est_seconds": round(lane.est_seconds, 1),
+                    "top_users": [{"user_id": uid, "queued": n} for uid, n in top]
+                }
+            return {"lanes": lanes, "role_weights": dict(self.role_weights)}
+
+
+# 进程内单例
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_generation_scheduler():
+    """按配置创建调度器并启动工作线程（需在 app_context 中首次调用）"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = current_app.config
+                _scheduler = GenerationScheduler(config['GENERATION_LANES'], config['GENERATION_ROLE_WEIGHTS'])
+    return _scheduler
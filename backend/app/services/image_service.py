@@ -0,0 +1,99 @@
+# app/services/image_service.py
+
+import os
+from flask import current_app
+from PIL import Image, ImageOps
+from .object_storage import get_storage
+
+# EXIF 中 Orientation 的 tag 编号
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+def _flatten_to_rgb(img):
+    """JPEG 不支持透明通道：带 alpha 的图铺到白底上再转 RGB"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    return img.convert('RGB')
+
+
+def _save_rendition(img, path, max_side, quality):
+    """按最长边等比缩小（只缩不放）后保存为 JPEG，返回该版本的信息"""
+    rendition = img.copy()
+    rendition.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    rendition.save(path, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return {
+        "filename": os.path.basename(path),
+        "width": rendition.width,
+        "height": rendition.height,
+        "size": os.path.getsize(path),
+        "format": "jpeg"
+    }
+
+
+def normalize_image(src_path, file_id):
+    """
+    上传后处理：只解码一次原图，生成
+        1. 标准版本 {file_id}.norm.jpg：纠正 EXIF 方向、去透明、限制最长边，供生成接口 base64 使用
+        2. 预览版本 {file_id}.preview.jpg：小尺寸缩略图，供客户端预览
+    返回写入 Upload.parameters['image'] 的元数据字典；解码失败抛出异常
+    """
+    save_dir = os.path.dirname(src_path)
+    canonical_path = os.path.join(save_dir, f"{file_id}.norm.jpg")
+    preview_path = os.path.join(save_dir, f"{file_id}.preview.jpg")
+
+    with Image.open(src_path) as img:
+        orig_format = (img.format or '').lower()
+        orig_width, orig_height = img.size
+        orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+
+        # GIF 等多帧图片只取第一帧
+        img.seek(0)
+        img = ImageOps.exif_transpose(img)
+        img = _flatten_to_rgb(img)
+
+        canonical = _save_rendition(
+            img, canonical_path,
+            current_app.config['IMAGE_CANONICAL_MAX_SIDE'],
+            current_app.config['IMAGE_CANONICAL_QUALITY']
+        )
+        preview = _save_rendition(
+            img, preview_path,
+            current_app.config['IMAGE_PREVIEW_MAX_SIDE'],
+            current_app.config['IMAGE_PREVIEW_QUALITY']
+        )
+
+    return {
+        "orig_format": orig_format,
+        "orig_width": orig_width,
+        "orig_height": orig_height,
+        "orig_size": os.path.getsize(src_path),
+        "orientation": orientation,
+        "width": canonical["width"],
+        "height": canonical["height"],
+        "canonical": canonical,
+        "preview": preview
+    }
+
+
+def canonical_path_of(upload):
+    """
+    返回上传记录的标准版本路径；没有标准版本（旧数据或处理失败）时退回原图
+    本地副本不存在（例如另一台 API 节点处理的上传）时从存储后端取回
+    """
+    params = upload.parameters or {}
+    canonical = params.get('image', {}).get('canonical')
+    if canonical and upload.physical_path:
+        path = os.path.join(os.path.dirname(upload.physical_path), canonical['filename'])
+        if os.path.exists(path):
+            return path
+        storage = get_storage()
+        if storage.backend != 'local':
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                return storage.fetch(storage.locator('references', canonical['filename']), path)
+            except Exception as e:
+                print(f"Reference fetch error ({upload.file_id}): {e}")
+    return upload.physical_path
@@ -0,0 +1,287 @@
+# app/services/nft_pipeline.py
+
+import os
+import hashlib
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app
+from .. import db
+from ..models import Collection, Nft, NftAsset, NftJob
+from ..utils.telemetry import log_event
+from .nft_service import get_nft_service
+from .object_storage import get_storage
+
+# 计算内容哈希时每次读取的块大小
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+def collect_folder_generations(folder):
+    """广度优先遍历文件夹，返回其下所有已完成、有结果文件的 (文件节点, Generation)"""
+    result = []
+    queue = [folder.id]
+    while queue:
+        nodes = Collection.query.filter(Collection.parent_id.in_(queue)).all()
+        queue = []
+        for node in nodes:
+            if node.node_type == 'folder':
+                queue.append(node.id)
+            elif node.generation and node.generation.status == 'completed' and node.generation.physical_path:
+                result.append((node, node.generation))
+    return result
+
+
+def _hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class MintPipeline:
+    """
+    把一个收藏夹里的全部作品 mint 成 NFT：
+        1. hashing   并发计算每个结果文件的 sha256，同一内容只处理一次
+        2. uploading 并发上传 IPFS 上还没有的文件（nft_assets 记录 哈希 -> ipfs uri）
+        3. metadata  metadata 按批打包成 IPFS 目录上传，每批一次请求
+        4. minting   并发 mint
+    网络请求都在线程池里做，数据库只在任务线程里读写；进度写回 NftJob 供客户端轮询/订阅
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.service = get_nft_service()
+        self.storage = get_storage()
+        self.concurrency = current_app.config['NFT_MINT_CONCURRENCY']
+        self.metadata_batch_size = current_app.config['NFT_METADATA_BATCH_SIZE']
+        self._tmp_dir = None
+
+    # ------------------------------
+    # 进度
+    # ------------------------------
+    def _save(self, **fields):
+        for key, value in fields.items():
+            setattr(self.job, key, value)
+        # JSON 列需要赋新对象才会被标记为已修改
+        self.job.items = [{k: v for k, v in item.items() if k != 'local_path'} for item in self.items]
+        db.session.commit()
+
+    def _finish_item(self, item, status, **fields):
+        item.update(fields)
+        item['status'] = status
+        self.job.processed += 1
+        if status == 'minted':
+            self.job.succeeded += 1
+        elif status == 'skipped':
+            self.job.skipped += 1
+        else:
+            self.job.failed += 1
+
+    def _fail_items(self, items, error):
+        for item in items:
+            self._finish_item(item, 'failed', error=error)
+
+    def _local_path(self, locator):
+        """对象存储中的结果先取到临时目录，本地后端直接用原路径"""
+        if self.storage.backend == 'local':
+            return locator
+        dest = os.path.join(self._tmp_dir.name, os.path.basename(locator))
+        if not os.path.exists(dest):
+            self.storage.fetch(locator, dest)
+        return dest
+
+    # ------------------------------
+    # 主流程
+    # ------------------------------
+    def run(self):
+        job = self.job
+        folder = Collection.query.get(job.collection_id)
+        pairs = collect_folder_generations(folder) if folder else []
+
+        self.items = []
+        self.generations = {}
+        for node, gen in pairs:
+            self.generations[gen.id] = gen
+            self.items.append({"generation_id": gen.id, "task_id": gen.uuid, "name": node.name, "status": "pending"})
+        job.total = len(self.items)
+        self._save(status='running', stage='hashing')
+
+        # 已经 mint 过（或正在 mint）的作品直接跳过
+        minted = {n.generation_id: n for n in Nft.query.filter(
+            Nft.generation_id.in_(list(self.generations.keys())),
+            Nft.status.in_(['pending', 'confirmed'])
+        ).all()} if self.generations else {}
+        pending = []
+        for item in self.items:
+            nft = minted.get(item['generation_id'])
+            if nft:
+                self._finish_item(item, 'skipped', token_id=nft.token_id, transaction_hash=nft.transaction_hash)
+            else:
+                pending.append(item)
+        self._save()
+
+        # 对象存储模式下结果文件取到临时目录；在各阶段的线程池启动前创建，避免多个线程各建一个
+        if self.storage.backend != 'local':
+            self._tmp_dir = tempfile.TemporaryDirectory(prefix='nft_')
+        try:
+            pending = self._hash_stage(pending)
+            pending = self._upload_stage(pending)
+            pending = self._metadata_stage(pending)
+            self._mint_stage(pending)
+            self._save(status='completed', stage=None, completed_at=db.func.current_timestamp())
+        finally:
+            if self._tmp_dir is not None:
+                self._tmp_dir.cleanup()
+                self._tmp_dir = None
+
+    def _hash_stage(self, items):
+        ok = []
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="nft-hash") as pool:
+            futures = {}
+            for item in items:
+                gen = self.generations[item['generation_id']]
+                futures[pool.submit(self._hash_one, gen.physical_path)] = item
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    item['local_path'], item['content_hash'] = future.result()
+                    ok.append(item)
+                except Exception as e:
+                    self._finish_item(item, 'failed', error=f"读取结果文件失败: {e}")
+        self._save(stage='uploading')
+        return ok
+
+    def _hash_one(self, locator):
+        path = self._local_path(locator)
+        return path, _hash_file(path)
+
+    def _upload_stage(self, items):
+        hashes = {item['content_hash'] for item in items}
+        known = {a.content_hash: a.ipfs_uri for a in
+                 NftAsset.query.filter(NftAsset.content_hash.in_(list(hashes))).all()} if hashes else {}
+
+        # 同一内容只上传一次
+        to_upload = {}
+        for item in items:
+            if item['content_hash'] not in known:
+                to_upload.setdefault(item['content_hash'], item['local_path'])
+
+        failed_hashes = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="nft-upload") as pool:
+            futures = {pool.submit(self.service.upload_file, path): (content_hash, path)
+                       for content_hash, path in to_upload.items()}
+            for future in as_completed(futures):
+                content_hash, path = futures[future]
+                try:
+                    uri = future.result()
+                    known[content_hash] = uri
+                    db.session.add(NftAsset(content_hash=content_hash, ipfs_uri=uri,
+                                            file_size=os.path.getsize(path)))
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    failed_hashes[content_hash] = str(e)
+
+        ok = []
+        for item in items:
+            content_hash = item['content_hash']
+            if content_hash in known:
+                item['image_uri'] = known[content_hash]
+                item['reused'] = content_hash not in to_upload
+                ok.append(item)
+            else:
+                self._fail_items([item], f"上传文件失败: {failed_hashes.get(content_hash)}")
+        self._save(stage='metadata')
+        return ok
+
+    def _metadata_stage(self, items):
+        ok = []
+        for start in range(0, len(items), self.metadata_batch_size):
+            batch = items[start:start + self.metadata_batch_size]
+            documents = []
+            for item in batch:
+                gen = self.generations[item['generation_id']]
+                documents.append({
+                    "name": item['name'],
+                    "description": gen.prompt or "",
+                    "image": item['image_uri'],
+                    "attributes": [{"trait_type": "type", "value": gen.generation_type}]
+                })
+            try:
+                uris = self.service.upload_metadata_batch(documents)
+            except Exception as e:
+                self._fail_items(batch, f"上传 metadata 失败: {e}")
+                continue
+            for item, uri in zip(batch, uris):
+                item['metadata_uri'] = uri
+                ok.append(item)
+        self._save(stage='minting')
+        return ok
+
+    def _mint_stage(self, items):
+        contract = current_app.config['THIRDWEB_NFT_CONTRACT']
+        to_address = self.job.to_address
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="nft-mint") as pool:
+            futures = {pool.submit(self.service.mint_nft, to_address, item['metadata_uri']): item
+                       for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self._finish_item(item, 'failed', error=f"mint 失败: {e}")
+                    self._save()
+                    continue
+                token_id = result.get('token_id') or result.get('tokenId')
+                tx_hash = result.get('tx_hash') or result.get('transactionHash')
+                try:
+                    self._record_nft(item['generation_id'], contract, token_id, tx_hash)
+                    db.session.flush()
+                except Exception as e:
+                    # 链上已经 mint 成功：保存记录失败只记日志，不能让整个任务失败
+                    db.session.rollback()
+                    log_event('nft.record_failed', level=logging.ERROR, job_id=self.job.uuid,
+                              generation_id=item['generation_id'], token_id=token_id,
+                              tx_hash=tx_hash, error=str(e))
+                    item['error'] = f"已 mint，保存记录失败: {e}"
+                self._finish_item(item, 'minted', token_id=token_id, transaction_hash=tx_hash)
+                self._save()
+
+    def _record_nft(self, generation_id, contract, token_id, tx_hash):
+        """写入 mint 结果；之前失败留下的记录（generation_id 唯一）直接更新"""
+        nft = Nft.query.filter_by(generation_id=generation_id).first()
+        if nft is None:
+            nft = Nft(generation_id=generation_id)
+            db.session.add(nft)
+        nft.owner_user_id = self.job.user_id
+        nft.token_id = str(token_id) if token_id is not None else None
+        nft.contract_address = contract
+        nft.transaction_hash = tx_hash
+        nft.status = 'confirmed' if tx_hash else 'pending'
+        nft.confirmed_at = db.func.current_timestamp() if tx_hash else None
+
+
+def process_mint_job(job_id):
+    """后台线程入口（与生成任务一样，自己创建 app_context）"""
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        job = NftJob.query.get(job_id)
+        if not job:
+            return
+        log_event('nft.job_started', job_id=job.uuid)
+        try:
+            MintPipeline(job).run()
+        except Exception as e:
+            db.session.rollback()
+            log_event('nft.job_failed', level=logging.ERROR, exc_info=True, job_id=job.uuid, error=str(e))
+            job.status = 'failed'
+            job.error = str(e)
+            job.completed_at = db.func.current_timestamp()
+            db.session.commit()
+        log_event('nft.job_finished', job_id=job.uuid, status=job.status,
+                  succeeded=job.succeeded, failed=job.failed, skipped=job.skipped)
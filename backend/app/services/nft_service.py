@@ -1,94 +1,245 @@
-from pathlib import Path
+# app/services/nft_service.py
+
+import os
+import json
+import time
+import random
+import threading
+import mimetypes
+import uuid
+from flask import current_app
 import requests
-from fastapi import HTTPException
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# 流式上传时每次从磁盘读取的块大小
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+# 这些状态码说明服务端暂时不可用，可以重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class NFTServiceError(Exception):
+    """thirdweb 调用失败（已重试仍失败或返回了不可重试的错误）"""
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# --- 1. 流式 multipart 请求体 ---
+class MultipartFileStream:
+    """
+    把单个文件包装成 multipart/form-data 请求体，按块从磁盘读取，不把整个文件读进内存
+    长度可以预先算出，所以请求带 Content-Length，不走 chunked 编码
+    """
+    def __init__(self, file_path, field_name='file', filename=None, content_type=None):
+        self.boundary = uuid.uuid4().hex
+        filename = filename or os.path.basename(file_path)
+        content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self._head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode('utf-8')
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode('utf-8')
+        self._file = open(file_path, 'rb')
+        self._length = len(self._head) + os.path.getsize(file_path) + len(self._tail)
+        self._parts = [self._head, None, self._tail]
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self._length
 
-from backend.app.core.config import THIRDWEB_CLIENT_ID, THIRDWEB_NFT_CONTRACT
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = UPLOAD_BLOCK_SIZE
+        while self._parts:
+            part = self._parts[0]
+            if part is None:
+                data = self._file.read(size)
+                if data:
+                    return data
+                self._parts.pop(0)
+                continue
+            self._parts.pop(0)
+            if part:
+                return part
+        return b''
 
-THIRDWEB_API_URL = "https://api.thirdweb.com/storage/upload"
+    def __iter__(self):
+        while True:
+            data = self.read(UPLOAD_BLOCK_SIZE)
+            if not data:
+                break
+            yield data
 
+    def close(self):
+        self._file.close()
+
+
+def _connect_failed(error):
+    """
+    连接是否在建立阶段就失败了（DNS 解析失败、连接被拒绝、连接超时），此时请求体一定没有发出。
+    同属 ConnectionError 的 "Connection aborted" / RemoteDisconnected 发生在请求发出之后，不算
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+# --- 2. thirdweb 客户端 ---
 class NFTService:
-    def __init__(self):
-        if not THIRDWEB_CLIENT_ID:
+    """
+    thirdweb 存储 (IPFS) 与 ERC721 mint 接口的客户端
+    - 进程内共用一个 requests.Session，按 host 复用连接池
+    - 文件流式上传，失败按指数退避重试（上传是按内容寻址的，重试是安全的）
+    - mint 不是幂等操作，只在连接没建立/服务端明确限流时重试
+    所有地址都可以在配置中替换，测试时可以指向本地的假 thirdweb 服务
+    """
+
+    def __init__(self, config=None):
+        config = config if config is not None else current_app.config
+        self.client_id = config.get('THIRDWEB_CLIENT_ID')
+        self.nft_contract = config.get('THIRDWEB_NFT_CONTRACT')
+        if not self.client_id:
             raise RuntimeError("THIRDWEB_CLIENT_ID not configured")
-        if not THIRDWEB_NFT_CONTRACT:
+        if not self.nft_contract:
             raise RuntimeError("THIRDWEB_NFT_CONTRACT is not configured.")
-        
-        self.client_id = THIRDWEB_CLIENT_ID
-        self.nft_contract = THIRDWEB_NFT_CONTRACT
-    
-    def upload_file(self, file_path: Path) -> str:
-        ##上传图片/文件到 thirdweb storage，返回 ipfs://CID 链接
-        file_bytes = Path(file_path).read_bytes()
 
-        headers = {
+        self.storage_upload_url = config.get('THIRDWEB_STORAGE_UPLOAD_URL', "https://storage.thirdweb.com/ipfs/upload")
+        self.api_base_url = config.get('THIRDWEB_API_BASE_URL', "https://api.thirdweb.com").rstrip('/')
+        self.timeout = (config.get('THIRDWEB_CONNECT_TIMEOUT', 5), config.get('THIRDWEB_READ_TIMEOUT', 60))
+        self.max_retries = config.get('THIRDWEB_MAX_RETRIES', 3)
+        self.backoff = config.get('THIRDWEB_RETRY_BACKOFF', 0.5)
+
+        pool_size = config.get('THIRDWEB_POOL_SIZE', 10)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
             "x-sdk-name": "thirdweb-python",
-            "x-client-id": self.client_id,
-        }
+            "x-client-id": self.client_id
+        })
 
-        files = {
-            "file": (Path(file_path).name, file_bytes)
-        }
+    # ------------------------------
+    # 重试
+    # ------------------------------
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = self.backoff * (2 ** attempt)
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            delay = max(delay, int(response.headers['Retry-After']))
+        # 加一点随机抖动，避免批量 mint 时所有线程同时重试
+        time.sleep(delay * (0.5 + random.random() / 2))
+
+    def _post(self, url, build_kwargs, idempotent=True, action="request"):
+        """
+        发送 POST 并按需重试
+        build_kwargs: 每次尝试都重新构造请求参数（流式请求体读过一次就不能再用）
+        """
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            kwargs = build_kwargs()
+            body = kwargs.get('data')
+            try:
+                resp = self.session.post(url, timeout=self.timeout, **kwargs)
+            except requests.ConnectionError as e:
+                last_error = NFTServiceError(f"{action} failed: {e}")
+                # 请求可能已经到达服务端，mint 只有在连接没建立时才能重试，否则可能重复 mint
+                if not idempotent and not _connect_failed(e):
+                    raise last_error
+            except requests.Timeout as e:
+                last_error = NFTServiceError(f"{action} timed out: {e}")
+                if not idempotent:
+                    raise last_error
+            else:
+                if resp.status_code == 200:
+                    return resp.json()
+                last_error = NFTServiceError(f"{action} failed: {resp.text}", resp.status_code)
+                retryable = resp.status_code == 429 or (idempotent and resp.status_code in RETRY_STATUS)
+                if not retryable:
+                    raise last_error
+                if attempt < self.max_retries:
+                    self._sleep_before_retry(attempt, resp)
+                continue
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            if attempt < self.max_retries:
+                self._sleep_before_retry(attempt)
+        raise last_error
+
+    @staticmethod
+    def _uri_of(data):
+        # thirdweb 统一返回 ipfs://CID 的格式；旧版接口只返回 IpfsHash
+        if data.get("uri"):
+            return data["uri"]
+        if data.get("IpfsHash"):
+            return f"ipfs://{data['IpfsHash']}"
+        return None
+
+    # ------------------------------
+    # 存储 / mint
+    # ------------------------------
+    def upload_file(self, file_path):
+        ##上传图片/文件到 thirdweb storage，返回 ipfs://CID 链接
+        def build():
+            stream = MultipartFileStream(file_path)
+            return {"data": stream, "headers": {"Content-Type": stream.content_type}}
+        return self._uri_of(self._post(self.storage_upload_url, build, action="Storage upload"))
 
-        response = requests.post(
-            THIRDWEB_STORAGE_UPLOAD_URL,
-            headers=headers,
-            files=files
-        )
-
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Storage upload failed: {response.text}"
-            )
-
-        data = response.json()
-        # thirdweb 统一返回 ipfs://CID 的格式
-        return data.get("uri", None)
-    
     ##metadata JSON:不能上链,传到IPFS里面,只有Mint 时传入 metadata URI。
-    def upload_metadata(self, metadata: dict) -> str:
+    def upload_metadata(self, metadata):
         ##上传 metadata JSON 到 thirdweb storage
-        headers = {
-            "x-sdk-name": "thirdweb-python",
-            "x-client-id": self.client_id,
-        }
+        data = self._post(self.storage_upload_url, lambda: {"json": {"metadata": metadata}},
+                          action="Metadata upload")
+        return self._uri_of(data)
+
+    def upload_metadata_batch(self, metadatas):
+        """
+        一次请求把多份 metadata 作为同一个 IPFS 目录上传
+        返回与输入顺序一致的 URI 列表: ipfs://{目录CID}/{序号}
+        """
+        if not metadatas:
+            return []
+        def build():
+            files = [
+                ("file", (str(i), json.dumps(m, ensure_ascii=False).encode('utf-8'), "application/json"))
+                for i, m in enumerate(metadatas)
+            ]
+            return {"files": files}
+        data = self._post(self.storage_upload_url, build, action="Metadata batch upload")
+        base_uri = self._uri_of(data)
+        if not base_uri:
+            raise NFTServiceError(f"Metadata batch upload returned no uri: {data}")
+        return [f"{base_uri.rstrip('/')}/{i}" for i in range(len(metadatas))]
 
-        response = requests.post(
-            THIRDWEB_STORAGE_UPLOAD_URL,
-            headers=headers,
-            json={"metadata": metadata}
-        )
-
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Metadata upload failed: {response.text}"
-            )
-
-        return response.json().get("uri", None)
-        
-    def mint_nft(self, to_address: str, metadata_uri: str) -> dict:
+    def mint_nft(self, to_address, metadata_uri):
         """
         调用 thirdweb ERC721 合约写入 API 进行 mint。
         返回: token_id, tx_hash, contract_address
         """
-        mint_url = f"https://api.thirdweb.com/contract/{self.contract}/erc721/mint"
-
-        headers = {
-            "x-client-id": self.client_id,
-            "Content-Type": "application/json"
-        }
-
+        mint_url = f"{self.api_base_url}/contract/{self.nft_contract}/erc721/mint"
         body = {
             "to": to_address,
             "metadataUri": metadata_uri
         }
+        return self._post(mint_url, lambda: {"json": body}, idempotent=False, action="Mint")
+
 
-        resp = requests.post(mint_url, headers=headers, json=body)
-        if resp.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Mint error: {resp.text}"
-            )
+# --- 3. 进程内单例（共用连接池）---
+_nft_service = None
+_nft_service_lock = threading.Lock()
 
-        return resp.json()
\ No newline at end of file
+def get_nft_service():
+    """返回进程内共享的 NFTService（需在 app_context 中首次调用）"""
+    global _nft_service
+    if _nft_service is None:
+        with _nft_service_lock:
+            if _nft_service is None:
+                _nft_service = NFTService()
+    return _nft_service
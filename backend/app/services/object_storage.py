@@ -0,0 +1,288 @@
+# app/services/object_storage.py
+
+import os
+import time
+import shutil
+import mimetypes
+import threading
+import uuid
+from collections import OrderedDict
+from flask import current_app, send_from_directory, redirect, abort, Response, stream_with_context
+
+# 读写文件时的块大小
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+# --- 1. 进程内元数据缓存 (LRU + TTL) ---
+class MetadataCache:
+    """
+    缓存文件的 size / content_type / etag，避免每次访问 /outputs 都去 stat 或 HEAD 对象存储
+    """
+    def __init__(self, max_entries=4096, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expire_at = item
+            if expire_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+def _temp_path_for(path):
+    """同目录下的唯一临时文件名：同一个 key 可能被多个线程同时写入/取回，固定的 .tmp 会互相覆盖"""
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# --- 2. 本地文件系统实现 ---
+class LocalStorage:
+    """
+    本地目录实现，locator 就是文件的绝对路径（与旧数据的 physical_path 完全兼容）
+    namespace: 'outputs' -> OUTPUTS_DIR, 'references' -> REF_DIR
+    """
+    backend = 'local'
+
+    def __init__(self, roots, cache):
+        self.roots = roots
+        self.cache = cache
+
+    def locator(self, namespace, key):
+        return os.path.join(self.roots[namespace], key)
+
+    def save_stream(self, namespace, key, stream, content_type=None):
+        path = self.locator(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = _temp_path_for(path)
+        try:
+            with open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(stream, f, COPY_BUFFER_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            _discard(tmp_path)
+            raise
+        self.cache.invalidate(path)
+        return path
+
+    def save_file(self, namespace, key, local_path, content_type=None):
+        path = self.locator(namespace, key)
+        if os.path.abspath(local_path) == os.path.abspath(path):
+            return path
+        with open(local_path, 'rb') as f:
+            return self.save_stream(namespace, key, f, content_type)
+
+    def stat(self, locator):
+        meta = self.cache.get(locator)
+        if meta is not None:
+            return meta
+        try:
+            st = os.stat(locator)
+        except OSError:
+            return None
+        meta = {
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+            "content_type": mimetypes.guess_type(locator)[0] or 'application/octet-stream'
+        }
+        self.cache.set(locator, meta)
+        return meta
+
+    def open(self, locator):
+        return open(locator, 'rb')
+
+    def delete(self, locator):
+        self.cache.invalidate(locator)
+        try:
+            os.remove(locator)
+        except FileNotFoundError:
+            pass
+
+    def fetch(self, locator, dest_path):
+        """把对象取到本地路径（本地实现下通常就是同一个文件）"""
+        if os.path.abspath(locator) != os.path.abspath(dest_path):
+            shutil.copyfile(locator, dest_path)
+        return dest_path
+
+    def presigned_url(self, locator, expires=None):
+        return None
+
+    def send(self, namespace, key):
+        return send_from_directory(self.roots[namespace], key)
+
+
+# --- 3. S3 兼容实现 (AWS S3 / MinIO 等) ---
+class S3Storage:
+    """
+    S3 兼容对象存储，locator 形如 s3://{bucket}/{prefix}{namespace}/{key}
+    本地联调可以用 MinIO：S3_ENDPOINT_URL = 'http://127.0.0.1:9000'
+    """
+    backend = 's3'
+
+    def __init__(self, config, cache):
+        # boto3 只有启用对象存储时才需要
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config as BotoConfig
+        from botocore.exceptions import ClientError
+
+        self.ClientError = ClientError
+        self.cache = cache
+        self.bucket = config['S3_BUCKET']
+        self.prefix = config.get('S3_PREFIX', '')
+        self.presign_expires = config.get('S3_PRESIGN_EXPIRES', 3600)
+        self.presign_redirect = config.get('S3_PRESIGN_REDIRECT', True)
+        self.client = boto3.client(
+            's3',
+            endpoint_url=config.get('S3_ENDPOINT_URL') or None,
+            aws_access_key_id=config.get('S3_ACCESS_KEY'),
+            aws_secret_access_key=config.get('S3_SECRET_KEY'),
+            region_name=config.get('S3_REGION') or None,
+            config=BotoConfig(
+                max_pool_connections=config.get('S3_MAX_POOL_CONNECTIONS', 20),
+                retries={'max_attempts': 3, 'mode': 'standard'},
+                # MinIO 等自建服务一般只支持 path-style
+                s3={'addressing_style': 'path'}
+            )
+        )
+        # 大于阈值的文件（生成的视频）自动走分片上传，边读边传，不落地、不整块进内存
+        self.transfer = TransferConfig(
+            multipart_threshold=config.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+            multipart_chunksize=config.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024),
+            max_concurrency=4
+        )
+
+    def _object_key(self, namespace, key):
+        return f"{self.prefix}{namespace}/{key}"
+
+    def _parse(self, locator):
+        bucket, _, object_key = locator[len('s3://'):].partition('/')
+        return bucket, object_key
+
+    def locator(self, namespace, key):
+        return f"s3://{self.bucket}/{self._object_key(namespace, key)}"
+
+    def save_stream(self, namespace, key, stream, content_type=None):
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_fileobj(stream, self.bucket, self._object_key(namespace, key),
+                                   ExtraArgs=extra, Config=self.transfer)
+        locator = self.locator(namespace, key)
+        self.cache.invalidate(locator)
+        return locator
+
+    def save_file(self, namespace, key, local_path, content_type=None):
+        content_type = content_type or mimetypes.guess_type(local_path)[0]
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_file(local_path, self.bucket, self._object_key(namespace, key),
+                                ExtraArgs=extra, Config=self.transfer)
+        locator = self.locator(namespace, key)
+        self.cache.invalidate(locator)
+        return locator
+
+    def stat(self, locator):
+        meta = self.cache.get(locator)
+        if meta is not None:
+            return meta
+        bucket, object_key = self._parse(locator)
+        try:
+            head = self.client.head_object(Bucket=bucket, Key=object_key)
+        except self.ClientError:
+            return None
+        meta = {
+            "size": head['ContentLength'],
+            "mtime": head['LastModified'].timestamp(),
+            "content_type": head.get('ContentType') or 'application/octet-stream',
+            "etag": head.get('ETag')
+        }
+        self.cache.set(locator, meta)
+        return meta
+
+    def open(self, locator):
+        bucket, object_key = self._parse(locator)
+        return self.client.get_object(Bucket=bucket, Key=object_key)['Body']
+
+    def delete(self, locator):
+        self.cache.invalidate(locator)
+        bucket, object_key = self._parse(locator)
+        self.client.delete_object(Bucket=bucket, Key=object_key)
+
+    def fetch(self, locator, dest_path):
+        bucket, object_key = self._parse(locator)
+        tmp_path = _temp_path_for(dest_path)
+        try:
+            self.client.download_file(bucket, object_key, tmp_path, Config=self.transfer)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            _discard(tmp_path)
+            raise
+        return dest_path
+
+    def presigned_url(self, locator, expires=None):
+        bucket, object_key = self._parse(locator)
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket, 'Key': object_key},
+            ExpiresIn=expires or self.presign_expires
+        )
+
+    def send(self, namespace, key):
+        locator = self.locator(namespace, key)
+        meta = self.stat(locator)
+        if meta is None:
+            abort(404)
+        # 302 到预签名地址，由对象存储直接出流量，API 节点不转发文件内容
+        if self.presign_redirect:
+            return redirect(self.presigned_url(locator), code=302)
+        body = self.open(locator)
+        headers = {"Content-Length": str(meta['size'])}
+        if meta.get('etag'):
+            headers['ETag'] = meta['etag']
+        return Response(stream_with_context(body.iter_chunks(COPY_BUFFER_SIZE)),
+                        mimetype=meta['content_type'], headers=headers)
+
+
+# --- 4. 进程内单例 ---
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """按 STORAGE_BACKEND 配置返回存储实现（需在 app_context 中首次调用）"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                config = current_app.config
+                cache = MetadataCache(config.get('STORAGE_META_CACHE_SIZE', 4096),
+                                      config.get('STORAGE_META_CACHE_TTL', 60))
+                if config.get('STORAGE_BACKEND') == 's3':
+                    _storage = S3Storage(config, cache)
+                else:
+                    _storage = LocalStorage({
+                        'outputs': config['OUTPUTS_DIR'],
+                        'references': config['REF_DIR']
+                    }, cache)
+    return _storage
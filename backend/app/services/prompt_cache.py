@@ -0,0 +1,75 @@
+# app/services/prompt_cache.py
+
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from flask import current_app
+from .object_storage import MetadataCache, get_storage
+from ..utils.telemetry import registry, Counter
+
+PROMPT_CACHE_REQUESTS = registry.register(Counter(
+    'aigc_prompt_cache_requests_total', '文生图结果缓存查询次数', ('result',)))
+
+
+def normalize_prompt(prompt):
+    """全角/半角统一、首尾空白去掉、连续空白合并为一个空格"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', prompt or '')).strip()
+
+
+class PromptResultCache:
+    """
+    相同 prompt 的文生图结果缓存 (LRU + TTL)
+    policy:
+      off     不缓存
+      user    只复用同一用户之前的结果
+      global  所有用户共用
+    命中时新记录直接指向已有的输出文件（physical_path 相同）。
+    清理线程只删除没有任何记录引用的文件，所以共用文件是安全的
+    """
+    def __init__(self, policy='off', max_entries=10000, ttl=86400):
+        self.policy = policy
+        self._cache = MetadataCache(max_entries, ttl)
+
+    @property
+    def enabled(self):
+        return self.policy in ('user', 'global')
+
+    def key_for(self, user_id, prompt, gen_type, req_key, params):
+        raw = json.dumps({
+            "user": user_id if self.policy == 'user' else None,
+            "prompt": normalize_prompt(prompt),
+            "type": gen_type,
+            "req_key": req_key,
+            "params": params
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        """返回 {"task_id", "physical_path", "filename"}；文件已被清理时视为未命中"""
+        entry = self._cache.get(key)
+        if entry is not None and get_storage().stat(entry['physical_path']) is None:
+            self._cache.invalidate(key)
+            entry = None
+        PROMPT_CACHE_REQUESTS.inc(result='hit' if entry else 'miss')
+        return entry
+
+    def store(self, key, task_id, physical_path, filename):
+        self._cache.set(key, {"task_id": task_id, "physical_path": physical_path, "filename": filename})
+
+
+# 进程内单例
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_prompt_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = current_app.config
+                _cache = PromptResultCache(config.get('PROMPT_CACHE_POLICY', 'off'),
+                                           config.get('PROMPT_CACHE_MAX_ENTRIES', 10000),
+                                           config.get('PROMPT_CACHE_TTL', 86400))
+    return _cache
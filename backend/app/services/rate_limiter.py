@@ -0,0 +1,205 @@
+# app/services/rate_limiter.py
+
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from flask import current_app
+from ..utils.telemetry import registry, Histogram, Gauge, log_event
+
+UPSTREAM_THROTTLED_SECONDS = registry.register(Histogram(
+    'aigc_upstream_throttled_seconds', '调用即梦前在本地排队等待的时间', ('req_key', 'reason'),
+    buckets=(0, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)))
+UPSTREAM_INFLIGHT = registry.register(Gauge(
+    'aigc_upstream_inflight', '正在进行的即梦调用数', ('req_key',)))
+
+
+class UpstreamBusyError(Exception):
+    """排队超过 UPSTREAM_LIMITER_MAX_WAIT 仍拿不到配额"""
+
+
+# ==========================================
+# 1. 进程内存储（单进程部署/开发环境）
+# ==========================================
+class MemoryLimiterStore:
+    """
+    令牌桶采用“预约”方式：令牌可以透支，调用方按透支量算出需要等待的时间，
+    这样并发请求按到达顺序排队，而不是一起醒来再抢
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._semaphores = {}
+
+    def reserve(self, key, rate, burst, max_wait):
+        """
+        预约一个令牌，返回需要等待的秒数
+        等待时间超过 max_wait 时不预约（不扣令牌），否则被拒绝的请求也会累积透支
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate) - 1
+            wait = 0.0 if tokens >= 0 else -tokens / rate
+            if wait <= max_wait:
+                self._buckets[key] = (tokens, now)
+        return wait
+
+    def acquire_slot(self, key, limit, timeout):
+        with self._lock:
+            sem = self._semaphores.get(key)
+            if sem is None:
+                sem = self._semaphores[key] = threading.BoundedSemaphore(limit)
+        return sem if sem.acquire(timeout=timeout) else None
+
+    def release_slot(self, key, token):
+        token.release()
+
+
+# ==========================================
+# 2. Redis 存储（多进程/多机共享配额）
+# ==========================================
+_RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate) - 1
+local wait = 0
+if tokens < 0 then wait = -tokens / rate end
+if wait <= max_wait then
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], 3600)
+end
+return tostring(wait)
+"""
+
+_ACQUIRE_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ttl * 2)
+    return 1
+end
+return 0
+"""
+
+
+class RedisLimiterStore:
+    """
+    所有 worker 共用 Redis 中的令牌桶与并发租约（ZSET，租约带过期时间，进程崩溃不会永久占用名额）
+    时间使用 Redis 服务器时间，避免各机器时钟不一致
+    """
+    def __init__(self, url, prefix='aigc:limiter:', lease_ttl=300, poll_interval=0.05):
+        # redis 只有使用共享存储时才需要
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self._reserve = self.client.register_script(_RESERVE_SCRIPT)
+        self._acquire = self.client.register_script(_ACQUIRE_SCRIPT)
+
+    def _now(self):
+        seconds, micros = self.client.time()
+        return seconds + micros / 1e6
+
+    def reserve(self, key, rate, burst, max_wait):
+        return float(self._reserve(keys=[f"{self.prefix}bucket:{key}"],
+                                   args=[rate, burst, self._now(), max_wait]))
+
+    def acquire_slot(self, key, limit, timeout):
+        lease = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._acquire(keys=[f"{self.prefix}slots:{key}"], args=[limit, self._now(), self.lease_ttl, lease]):
+                return lease
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def release_slot(self, key, token):
+        self.client.zrem(f"{self.prefix}slots:{key}", token)
+
+
+# ==========================================
+# 3. 限流器
+# ==========================================
+class UpstreamLimiter:
+    """
+    按 req_key 限制调用即梦的 QPS（令牌桶）与并发数
+    超出配额的调用在本地排队等待，而不是直接打到上游被限流后记为失败
+    """
+    def __init__(self, store, limits, max_wait):
+        self.store = store
+        self.limits = limits
+        self.max_wait = max_wait
+
+    def limits_for(self, req_key):
+        return {**self.limits.get('default', {}), **self.limits.get(req_key, {})}
+
+    @contextmanager
+    def slot(self, req_key, max_wait=None):
+        """max_wait: 本次最多排队的秒数，默认 UPSTREAM_LIMITER_MAX_WAIT；0 表示只在有空闲配额时进入"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        limits = self.limits_for(req_key)
+        qps = limits.get('qps')
+        burst = limits.get('burst') or qps
+        concurrency = limits.get('concurrency')
+        deadline = time.monotonic() + max_wait
+
+        # 1. 令牌桶
+        if qps:
+            # 超过 max_wait 时 store 不会扣令牌，拒绝不会造成透支
+            wait = self.store.reserve(req_key, qps, burst, max_wait)
+            if wait > max_wait:
+                raise UpstreamBusyError(f"{req_key} 排队时间过长 ({wait:.1f}s)")
+            UPSTREAM_THROTTLED_SECONDS.observe(wait, req_key=req_key, reason='rate')
+            if wait > 0:
+                time.sleep(wait)
+
+        # 2. 并发数
+        token = None
+        if concurrency:
+            start = time.monotonic()
+            token = self.store.acquire_slot(req_key, concurrency, max(0.0, deadline - start))
+            waited = time.monotonic() - start
+            UPSTREAM_THROTTLED_SECONDS.observe(waited, req_key=req_key, reason='concurrency')
+            if token is None:
+                raise UpstreamBusyError(f"{req_key} 并发已满，等待 {waited:.1f}s 后放弃")
+            if waited > 1:
+                log_event('upstream.throttled', req_key=req_key, waited=round(waited, 3), reason='concurrency')
+
+        UPSTREAM_INFLIGHT.inc(1, req_key=req_key)
+        try:
+            yield
+        finally:
+            UPSTREAM_INFLIGHT.inc(-1, req_key=req_key)
+            if token is not None:
+                self.store.release_slot(req_key, token)
+
+
+# 进程内单例
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_upstream_limiter():
+    """按配置创建限流器（需在 app_context 中首次调用）"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                config = current_app.config
+                if config.get('UPSTREAM_LIMITER_BACKEND') == 'redis':
+                    store = RedisLimiterStore(config['REDIS_URL'])
+                else:
+                    store = MemoryLimiterStore()
+                _limiter = UpstreamLimiter(store, config['UPSTREAM_RATE_LIMITS'],
+                                           config['UPSTREAM_LIMITER_MAX_WAIT'])
+    return _limiter
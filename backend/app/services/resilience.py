@@ -0,0 +1,265 @@
+# app/services/resilience.py
+
+import time
+import random
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app
+from ..utils.telemetry import (
+    registry, Counter, Gauge, log_event, current_trace, trace_context
+)
+from .rate_limiter import UpstreamBusyError
+
+UPSTREAM_RETRIES = registry.register(Counter(
+    'aigc_upstream_retries_total', '即梦调用重试次数', ('op', 'reason')))
+UPSTREAM_HEDGED = registry.register(Counter(
+    'aigc_upstream_hedged_total', '发出对冲请求的次数', ('op', 'winner')))
+CIRCUIT_STATE = registry.register(Gauge(
+    'aigc_upstream_circuit_open', '熔断器是否打开 (1=打开)', ('name',)))
+CIRCUIT_REJECTED = registry.register(Counter(
+    'aigc_upstream_circuit_rejected_total', '熔断期间排队超时被拒绝的调用数', ('name',)))
+
+# 即梦返回这些业务码表示限流/服务端临时错误，可以重试
+RETRYABLE_CODES = {50429, 50430, 50500, 50501, 50511}
+
+
+class UpstreamError(Exception):
+    """上游返回了可重试的错误码"""
+    def __init__(self, code, response):
+        super().__init__(f"upstream code {code}")
+        self.code = code
+        self.response = response
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开且排队超时"""
+
+
+# ==========================================
+# 1. 熔断器
+# ==========================================
+class CircuitBreaker:
+    """
+    closed    正常调用，连续 failure_threshold 次基础设施错误后打开
+    open      reset_timeout 内不调用上游；新调用最多排队 queue_wait 秒等待恢复，超时才快速失败
+    half_open 只放行一个探测调用，成功则关闭，失败则重新打开
+    只统计网络错误/限流/5xx，内容审核不通过等业务失败不计入
+    """
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, queue_wait=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.queue_wait = queue_wait
+        self._cond = threading.Condition()
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        return self._state
+
+    def before_call(self):
+        deadline = time.monotonic() + self.queue_wait
+        with self._cond:
+            while True:
+                if self._state == 'closed':
+                    return
+                now = time.monotonic()
+                if self._state == 'open' and now - self._opened_at >= self.reset_timeout:
+                    self._state = 'half_open'
+                if self._state == 'half_open' and not self._probing:
+                    self._probing = True
+                    return
+                remaining = deadline - now
+                if remaining <= 0:
+                    CIRCUIT_REJECTED.inc(name=self.name)
+                    raise CircuitOpenError(f"{self.name} 熔断中，排队 {self.queue_wait}s 后放弃")
+                # 排队等待：探测结果出来或者熔断时间到了再检查
+                wake_in = self._opened_at + self.reset_timeout - now if self._state == 'open' else remaining
+                self._cond.wait(max(0.01, min(remaining, wake_in)))
+
+    def on_success(self):
+        with self._cond:
+            if self._state != 'closed':
+                log_event('circuit.closed', name=self.name)
+            self._state = 'closed'
+            self._failures = 0
+            self._probing = False
+            CIRCUIT_STATE.set(0, name=self.name)
+            self._cond.notify_all()
+
+    def on_failure(self):
+        with self._cond:
+            self._failures += 1
+            if self._state == 'half_open' or self._failures >= self.failure_threshold:
+                if self._state != 'open':
+                    log_event('circuit.opened', name=self.name, failures=self._failures)
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+                self._probing = False
+                CIRCUIT_STATE.set(1, name=self.name)
+                self._cond.notify_all()
+
+    def on_skipped(self):
+        """调用根本没有发到上游（例如本地限流排队超时）：只释放探测名额，状态不变"""
+        with self._cond:
+            self._probing = False
+            self._cond.notify_all()
+
+    def on_neutral(self):
+        """调用结束但结果不说明上游好坏（例如业务失败），释放探测名额"""
+        with self._cond:
+            if self._probing:
+                self._probing = False
+                self._state = 'closed'
+                self._failures = 0
+                CIRCUIT_STATE.set(0, name=self.name)
+            self._cond.notify_all()
+
+
+# ==========================================
+# 2. 重试 + 对冲
+# ==========================================
+def _backoff(attempt, base_delay, max_delay):
+    # full jitter: 0 ~ min(max_delay, base * 2^n)
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+def _get_hedge_pool(size):
+    global _hedge_pool
+    if _hedge_pool is None:
+        with _hedge_pool_lock:
+            if _hedge_pool is None:
+                _hedge_pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="upstream-hedge")
+    return _hedge_pool
+
+
+def _hedged(op, fn, hedge_after, pool_size, slot):
+    """
+    先发一次请求，拿到限流名额后 hedge_after 秒内没返回就再发一次相同请求，取先成功的结果
+    只用于幂等调用（GetResult）
+    - 计时从主请求拿到名额开始，在本地排队的时间不触发对冲
+    - 对冲请求不排队：限流器没有空闲配额时直接放弃对冲，不给已经饱和的上游加压
+    """
+    app = current_app._get_current_object()
+    trace = dict(current_trace())
+    started = threading.Event()
+
+    def run(max_wait=None, on_start=None):
+        # 在线程池中执行，补上 app_context 与追踪上下文
+        with app.app_context(), trace_context(**trace):
+            with slot(max_wait):
+                if on_start is not None:
+                    on_start.set()
+                return fn()
+
+    pool = _get_hedge_pool(pool_size)
+    first = pool.submit(run, None, started)
+    # 主请求在排队期间失败（例如排队超时）也要结束等待
+    first.add_done_callback(lambda _: started.set())
+    started.wait()
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+
+    second = pool.submit(run, 0)
+    pending = {first: 'primary', second: 'hedge'}
+    errors = {}
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            winner = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                errors[winner] = e
+                continue
+            # 还没开始执行的一方直接取消；已经发出的请求无法中断，只能等它结束释放名额
+            for other in pending:
+                other.cancel()
+            UPSTREAM_HEDGED.inc(op=op, winner=winner)
+            return result
+    # 都失败时以主请求的错误为准（对冲请求可能只是没拿到配额）
+    raise errors.get('primary') or errors['hedge']
+
+
+class ResilientCaller:
+    def __init__(self, policies, breaker, hedge_pool_size=8):
+        self.policies = policies
+        self.breaker = breaker
+        self.hedge_pool_size = hedge_pool_size
+
+    def policy(self, op):
+        return {**self.policies.get('default', {}), **self.policies.get(op, {})}
+
+    def call(self, op, fn, slot=None):
+        """
+        op: 'submit' / 'poll' / 'sync'，对应 UPSTREAM_RESILIENCE 中的配置
+        fn: 实际调用，返回解析后的响应字典；抛异常或返回可重试的业务码都会按策略重试
+        slot: 可选，slot(max_wait) 返回限流上下文；每次尝试/对冲都在其中执行 fn
+        """
+        slot = slot or (lambda max_wait=None: nullcontext())
+        policy = self.policy(op)
+        max_attempts = policy.get('max_attempts', 1)
+        hedge_after = policy.get('hedge_after')
+        last_error = None
+
+        for attempt in range(max_attempts):
+            self.breaker.before_call()
+            try:
+                if hedge_after:
+                    resp = _hedged(op, fn, hedge_after, self.hedge_pool_size, slot)
+                else:
+                    with slot():
+                        resp = fn()
+                code = resp.get('code') if isinstance(resp, dict) else None
+                if code in RETRYABLE_CODES:
+                    raise UpstreamError(code, resp)
+            except UpstreamBusyError:
+                # 本地限流队列满了，与上游好坏无关：不计入熔断，也不重试（重试只会继续排队）
+                self.breaker.on_skipped()
+                raise
+            except Exception as e:
+                self.breaker.on_failure()
+                last_error = e
+                reason = f"code_{e.code}" if isinstance(e, UpstreamError) else type(e).__name__
+                if attempt + 1 < max_attempts:
+                    UPSTREAM_RETRIES.inc(op=op, reason=reason)
+                    delay = _backoff(attempt, policy.get('base_delay', 0.5), policy.get('max_delay', 10))
+                    log_event('upstream.retry', op=op, attempt=attempt + 1, reason=reason,
+                              delay=round(delay, 3), error=str(e))
+                    time.sleep(delay)
+                continue
+            if code is None or code == 10000:
+                self.breaker.on_success()
+            else:
+                self.breaker.on_neutral()
+            return resp
+
+        if isinstance(last_error, UpstreamError):
+            # 重试用完仍是限流/服务端错误，把上游响应交给调用方按失败处理
+            return last_error.response
+        raise last_error
+
+
+_caller = None
+_caller_lock = threading.Lock()
+
+def get_resilient_caller():
+    global _caller
+    if _caller is None:
+        with _caller_lock:
+            if _caller is None:
+                config = current_app.config
+                circuit = config['UPSTREAM_CIRCUIT']
+                breaker = CircuitBreaker('jimeng', circuit['failure_threshold'],
+                                         circuit['reset_timeout'], circuit['queue_wait'])
+                _caller = ResilientCaller(config['UPSTREAM_RESILIENCE'], breaker,
+                                          config.get('UPSTREAM_HEDGE_POOL_SIZE', 8))
+    return _caller
@@ -0,0 +1,350 @@
+# app/services/storage_service.py
+
+import os
+import time
+import shutil
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from .. import db
+from ..models import Generation, Upload
+from .object_storage import get_storage
+
+
+# --- 1. 配额统计 ---
+def get_user_usage(user_id):
+    """用户当前占用的字节数 = 生成结果 + 已完成的参考图上传"""
+    gen_bytes = db.session.query(db.func.coalesce(db.func.sum(Generation.file_size), 0))\
+        .filter(Generation.user_id == user_id).scalar()
+    ref_bytes = db.session.query(db.func.coalesce(db.func.sum(Upload.total_size), 0))\
+        .filter(Upload.user_id == user_id, Upload.status == 'completed').scalar()
+    return int(gen_bytes or 0) + int(ref_bytes or 0)
+
+
+def check_quota(user_id, incoming_bytes=0):
+    """
+    检查用户是否还有空间，返回 (是否允许, 已用字节, 配额字节)
+    STORAGE_USER_QUOTA_BYTES 为 0 表示不限制
+    """
+    quota = current_app.config.get('STORAGE_USER_QUOTA_BYTES', 0)
+    if not quota:
+        return True, 0, 0
+    used = get_user_usage(user_id)
+    return used + incoming_bytes <= quota, used, quota
+
+
+def top_usage(limit=20):
+    """按占用排序的用户列表（管理端报表用）"""
+    rows = db.session.query(Generation.user_id, db.func.sum(Generation.file_size))\
+        .group_by(Generation.user_id)\
+        .order_by(db.func.sum(Generation.file_size).desc())\
+        .limit(limit).all()
+    quota = current_app.config.get('STORAGE_USER_QUOTA_BYTES', 0)
+    result = []
+    for user_id, gen_bytes in rows:
+        used = get_user_usage(user_id)
+        result.append({
+            "user_id": user_id,
+            "used_bytes": used,
+            "generation_bytes": int(gen_bytes or 0),
+            "over_quota": bool(quota) and used > quota
+        })
+    return result
+
+
+def touch_uploads(file_ids):
+    """生成任务引用参考图时刷新其 last_used_at（随调用方的事务提交）"""
+    file_ids = list({f for f in file_ids if f})
+    if file_ids:
+        Upload.query.filter(Upload.file_id.in_(file_ids))\
+            .update({Upload.last_used_at: db.func.current_timestamp()}, synchronize_session=False)
+
+
+def _remove_file(path):
+    """删除文件并返回释放的字节数，文件不存在时返回 0"""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def remove_upload_files(upload):
+    """删除一次上传相关的所有文件（原图、标准版本、预览、分片目录），返回释放的字节数"""
+    freed = 0
+    if upload.physical_path:
+        names = [os.path.basename(upload.physical_path)]
+        image_meta = (upload.parameters or {}).get('image') or {}
+        for key in ('canonical', 'preview'):
+            rendition = image_meta.get(key)
+            if rendition:
+                names.append(rendition['filename'])
+        save_dir = os.path.dirname(upload.physical_path)
+        storage = get_storage()
+        for name in names:
+            freed += _remove_file(os.path.join(save_dir, name))
+            if storage.backend != 'local':
+                storage.delete(storage.locator('references', name))
+    chunk_dir = os.path.join(current_app.config['UPLOAD_CHUNK_DIR'], upload.file_id)
+    if os.path.isdir(chunk_dir):
+        for entry in os.scandir(chunk_dir):
+            if entry.is_file():
+                freed += entry.stat().st_size
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+    return freed
+
+
+# --- 2. 后台清理线程 ---
+class StorageSweeper:
+    """
+    存储生命周期管理：后台线程分批对账磁盘与数据库
+      - OUTPUTS_DIR 中文件名不属于任何 Generation 的文件 -> 孤儿，删除
+      - REF_DIR 中没有 Upload 记录的 ref_* 文件、残留的合并临时文件 -> 孤儿，删除
+      - 超过 STORAGE_REF_TTL_DAYS 未被引用的参考图上传、超过 UPLOAD_SESSION_TTL_HOURS 的未完成分片上传 -> 连同记录删除
+      - 回填旧数据的 Generation.file_size，供配额统计
+    每一步只处理 STORAGE_SWEEP_BATCH_SIZE 个目录项，目录迭代器跨步保留，
+    百万级文件的目录也不会一次性列出或长时间占用数据库。
+    多个进程各自运行也是安全的（删除是幂等的），只是重复劳动。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._iters = {}
+        self._verified = set()          # 本遍扫描已确认目录与数据库对得上的 key
+        self._output_dirs = set()       # 数据库中 physical_path 实际使用过的输出目录
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {
+            "started_at": None,
+            "last_step_at": None,
+            "scanned": 0,
+            "deleted_files": 0,
+            "reclaimed_bytes": 0,
+            "expired_uploads": 0,
+            "backfilled_sizes": 0,
+            "skipped_batches": 0,
+            "completed_passes": {"outputs": 0, "references": 0},
+            "errors": 0,
+            "last_error": None
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.stats["started_at"] = datetime.now().isoformat()
+        self._thread = threading.Thread(target=self._run, name="storage-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        interval = self.app.config['STORAGE_SWEEP_INTERVAL']
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.step()
+                except Exception as e:
+                    db.session.rollback()
+                    self.stats["errors"] += 1
+                    self.stats["last_error"] = str(e)
+                    print(f"[Storage] 清理出错: {e}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(interval)
+
+    def step(self):
+        """执行一小批清理工作（需在 app_context 中调用）"""
+        self._sweep_outputs()
+        self._sweep_references()
+        self._expire_uploads()
+        self._backfill_sizes()
+        self.stats["last_step_at"] = datetime.now().isoformat()
+
+    def run_full_pass(self):
+        """同步跑完整的一遍（命令行/定时任务用）"""
+        start = dict(self.stats["completed_passes"])
+        while any(self.stats["completed_passes"][k] == start[k] for k in start):
+            self.step()
+
+    # ------------------------------
+    # 目录增量扫描
+    # ------------------------------
+    def _next_batch(self, key, directory):
+        """从目录迭代器里取下一批足够“老”的文件，返回 [(path, name, size)]"""
+        it = self._iters.get(key)
+        if it is None:
+            if not os.path.isdir(directory):
+                self.stats["completed_passes"][key] += 1
+                return []
+            it = os.scandir(directory)
+            self._iters[key] = it
+            self._verified.discard(key)
+
+        batch_size = current_app.config['STORAGE_SWEEP_BATCH_SIZE']
+        # 宽限期内的文件可能属于尚未提交的任务/上传，不参与对账
+        cutoff = time.time() - current_app.config['STORAGE_ORPHAN_GRACE_SECONDS']
+        batch = []
+        scanned = 0
+        for entry in it:
+            scanned += 1
+            try:
+                if entry.is_file(follow_symlinks=False):
+                    st = entry.stat()
+                    if st.st_mtime < cutoff:
+                        batch.append((entry.path, entry.name, st.st_size))
+            except FileNotFoundError:
+                pass
+            if scanned >= batch_size:
+                break
+        else:
+            # 本遍扫描结束，下一步从头开始新的一遍
+            it.close()
+            del self._iters[key]
+            self.stats["completed_passes"][key] += 1
+        self.stats["scanned"] += scanned
+        return batch
+
+    def _delete_orphans(self, orphans):
+        for path, _ in orphans:
+            self.stats["reclaimed_bytes"] += _remove_file(path)
+            self.stats["deleted_files"] += 1
+
+    def _sweep_outputs(self):
+        """
+        按文件名对账，不比较当前的绝对路径：OUTPUTS_DIR 随工作目录/部署位置变化，
+        数据库里存的旧绝对路径可能与当前目录对不上
+        """
+        output_dir = current_app.config['OUTPUTS_DIR']
+        batch = self._next_batch("outputs", output_dir)
+        if not batch:
+            return
+        # 1. 输出文件名为 {generation.uuid}.{ext}，按 uuid 走唯一索引；顺便记下库里实际存的目录
+        stems = {name.rsplit('.', 1)[0] for _, name, _ in batch}
+        live = set()
+        for uuid_, path in db.session.query(Generation.uuid, Generation.physical_path)\
+                .filter(Generation.uuid.in_(list(stems))).all():
+            live.add(uuid_)
+            if path:
+                self._output_dirs.add(os.path.dirname(path))
+        known = {name for _, name, _ in batch if name.rsplit('.', 1)[0] in live}
+
+        # 2. 剩下的可能被结果缓存命中的记录共用（源记录已删除）：按已知目录拼出完整路径，走 idx_physical_path
+        rest = [(path, name) for path, name, _ in batch if name not in known]
+        if rest:
+            dirs = self._output_dirs | {output_dir}
+            candidates = {path for path, _ in rest} | {os.path.join(d, name) for d in dirs for _, name in rest}
+            rows = db.session.query(Generation.physical_path)\
+                .filter(Generation.physical_path.in_(list(candidates))).all()
+            known.update(os.path.basename(p) for (p,) in rows if p)
+
+        # 3. 每遍扫描第一次要删除前确认目录与数据库对得上，防止配置错误时把整个目录当成孤儿
+        if known:
+            self._verified.add("outputs")
+        elif "outputs" not in self._verified:
+            if not self._outputs_dir_matches(output_dir):
+                print(f"[Storage] {output_dir} 中找不到最近生成记录的文件，目录或数据库配置可能有误，本遍跳过删除")
+                self.stats["skipped_batches"] += 1
+                self._abort_pass("outputs")
+                return
+            self._verified.add("outputs")
+        self._delete_orphans([(path, size) for path, name, size in batch if name not in known])
+
+    @staticmethod
+    def _outputs_dir_matches(output_dir, sample=20):
+        """最近若干条已完成的生成记录中，至少有一条的结果文件在 output_dir 里"""
+        rows = db.session.query(Generation.physical_path)\
+            .filter(Generation.status == 'completed', Generation.physical_path.isnot(None))\
+            .order_by(Generation.id.desc()).limit(sample).all()
+        return any(os.path.exists(os.path.join(output_dir, os.path.basename(p))) for (p,) in rows)
+
+    def _abort_pass(self, key):
+        it = self._iters.pop(key, None)
+        if it is not None:
+            it.close()
+        self.stats["completed_passes"][key] += 1
+
+    def _sweep_references(self):
+        batch = self._next_batch("references", current_app.config['REF_DIR'])
+        if not batch:
+            return
+        orphans = []
+        candidates = {}
+        for path, name, size in batch:
+            if name.endswith('.merging') or name.endswith('.tmp'):
+                # 合并/写入中途崩溃留下的临时文件
+                orphans.append((path, size))
+            elif name.startswith('ref_'):
+                candidates.setdefault(name.split('.', 1)[0], []).append((path, size))
+        if candidates:
+            known = {f for (f,) in db.session.query(Upload.file_id)
+                     .filter(Upload.file_id.in_(list(candidates.keys()))).all()}
+            for file_id, files in candidates.items():
+                if file_id not in known:
+                    orphans.extend(files)
+        self._delete_orphans(orphans)
+
+    # ------------------------------
+    # 过期上传 / 配额回填
+    # ------------------------------
+    def _expire_uploads(self):
+        batch_size = current_app.config['STORAGE_SWEEP_BATCH_SIZE']
+        now = datetime.now()
+        ref_cutoff = now - timedelta(days=current_app.config['STORAGE_REF_TTL_DAYS'])
+        session_cutoff = now - timedelta(hours=current_app.config['UPLOAD_SESSION_TTL_HOURS'])
+
+        # 参考图的保留期从最后一次被引用算起（last_used_at，走 idx_status_last_used）；
+        # 旧数据 last_used_at 为 NULL，按上传时间算
+        expired = Upload.query.filter(db.or_(
+            db.and_(Upload.status == 'completed', Upload.created_at < ref_cutoff,
+                    db.or_(Upload.last_used_at.is_(None), Upload.last_used_at < ref_cutoff)),
+            db.and_(Upload.status == 'uploading', Upload.created_at < session_cutoff)
+        )).order_by(Upload.id).limit(batch_size).all()
+        if not expired:
+            return
+
+        for upload in expired:
+            self.stats["reclaimed_bytes"] += remove_upload_files(upload)
+            self.stats["expired_uploads"] += 1
+            db.session.delete(upload)
+        db.session.commit()
+
+    def _backfill_sizes(self):
+        batch_size = current_app.config['STORAGE_SWEEP_BATCH_SIZE']
+        rows = Generation.query.filter(Generation.physical_path.isnot(None), Generation.file_size.is_(None))\
+            .order_by(Generation.id).limit(batch_size).all()
+        if not rows:
+            return
+        storage = get_storage()
+        for gen in rows:
+            meta = storage.stat(gen.physical_path)
+            # 文件已经不存在时记为 0，防止反复回填
+            gen.file_size = meta['size'] if meta else 0
+        db.session.commit()
+        self.stats["backfilled_sizes"] += len(rows)
+
+
+# 进程内唯一的清理线程（由 run.py 启动）
+storage_sweeper = None
+
+def start_storage_sweeper(app):
+    global storage_sweeper
+    if not app.config.get('STORAGE_SWEEPER_ENABLED'):
+        return None
+    if storage_sweeper is None:
+        storage_sweeper = StorageSweeper(app)
+        storage_sweeper.start()
+        print("[Storage] 存储清理线程已启动")
+    return storage_sweeper
+
+
+def register_storage_commands(app):
+    """注册命令行: flask --app run storage-sweep，手动/定时跑完整一遍清理"""
+    @app.cli.command('storage-sweep')
+    def storage_sweep_command():
+        sweeper = StorageSweeper(app)
+        sweeper.run_full_pass()
+        print(f"[Storage] 清理完成: 删除 {sweeper.stats['deleted_files']} 个孤儿文件, "
+              f"过期上传 {sweeper.stats['expired_uploads']} 个, "
+              f"释放 {sweeper.stats['reclaimed_bytes']} 字节")
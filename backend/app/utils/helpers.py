@@ -1,5 +1,7 @@
 # app/utils/helpers.py
-from flask import jsonify
+from functools import wraps
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt_identity
 
 def api_response(code, message, data=None):
     """
@@ -12,4 +14,31 @@ def api_response(code, message, data=None):
     if data is not None:
         response['data'] = data
     # 所有业务逻辑都在JSON Body里体现，所以HTTP状态码统一为200
-    return jsonify(response), 200
\ No newline at end of file
+    return jsonify(response), 200
+
+
+def conditional_api_response(code, message, data=None):
+    """
+    与 api_response 相同，另外按响应内容生成 ETag：
+    客户端带 If-None-Match 且内容没变时返回 304（无响应体），用于列表类接口
+    """
+    response, status = api_response(code, message, data)
+    response.status_code = status
+    response.add_etag()
+    # private: 只允许客户端缓存；no-cache: 每次使用前都要带 ETag 重新验证
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def admin_required(fn):
+    """
+    管理员权限校验，需放在 @jwt_required() 之后使用
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        from ..models import User
+        user = User.query.get(int(get_jwt_identity()))
+        if not user or user.role != 'admin':
+            return api_response(code=403, message="需要管理员权限")
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,248 @@
+# app/utils/profiling.py
+
+import sys
+import time
+import random
+import threading
+from collections import deque, Counter as StackCounter
+from datetime import datetime
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .telemetry import registry, Histogram, Counter, log_event
+
+# --- 请求级指标（同时出现在 /metrics 中）---
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    'aigc_http_request_seconds', '接口耗时', ('endpoint', 'method')))
+HTTP_DB_QUERIES = registry.register(Histogram(
+    'aigc_http_db_queries', '每个请求执行的 SQL 条数', ('endpoint',),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)))
+HTTP_DB_SECONDS = registry.register(Histogram(
+    'aigc_http_db_seconds', '每个请求花在 SQL 上的时间', ('endpoint',)))
+HTTP_SLOW_TOTAL = registry.register(Counter(
+    'aigc_http_slow_requests_total', '超过慢请求阈值的请求数', ('endpoint',)))
+
+
+# ==========================================
+# 1. 栈采样器
+# 只对被抽中的请求采样：一个后台线程定时读取这些请求线程的调用栈，
+# 请求结束后如果是慢请求就保留折叠后的栈（flamegraph 的 folded 格式），否则丢弃
+# ==========================================
+class StackSampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._targets[thread_id] = StackCounter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = list(self._targets.items())
+            if not targets:
+                # 没有需要采样的请求时不占用 CPU
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in targets:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks[';'.join(reversed(parts))] += 1
+            time.sleep(self.interval)
+
+
+# ==========================================
+# 2. 汇总统计
+# ==========================================
+class RequestProfiler:
+    def __init__(self, app):
+        config = app.config
+        self.slow_ms = config['PROFILE_SLOW_MS']
+        self.sample_rate = config['PROFILE_SAMPLE_RATE']
+        self.n_plus_one = config['PROFILE_N_PLUS_ONE_THRESHOLD']
+        self.sampler = StackSampler(config['PROFILE_SAMPLE_INTERVAL'])
+        self.slow_dumps = deque(maxlen=config['PROFILE_MAX_DUMPS'])
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.users = {}
+        self.started_at = datetime.now().isoformat()
+
+    # --- 请求钩子 ---
+    def before_request(self):
+        g._prof = {
+            "start": time.perf_counter(),
+            "queries": 0,
+            "db_time": 0.0,
+            "statements": {},
+            "sampled": random.random() < self.sample_rate
+        }
+        if g._prof["sampled"]:
+            self.sampler.start(threading.get_ident())
+
+    def after_request(self, response):
+        prof = g.pop('_prof', None)
+        if prof is None:
+            return response
+        duration = time.perf_counter() - prof["start"]
+        stacks = self.sampler.stop(threading.get_ident()) if prof["sampled"] else None
+        endpoint = request.endpoint or 'unknown'
+        user_id = self._current_user_id()
+
+        HTTP_REQUEST_SECONDS.observe(duration, endpoint=endpoint, method=request.method)
+        HTTP_DB_QUERIES.observe(prof["queries"], endpoint=endpoint)
+        HTTP_DB_SECONDS.observe(prof["db_time"], endpoint=endpoint)
+
+        # 同一条 SQL 在一个请求里执行了很多次，大概率是 N+1
+        repeated = {stmt: n for stmt, n in prof["statements"].items() if n >= self.n_plus_one}
+        slow = duration * 1000 >= self.slow_ms
+        self._aggregate(endpoint, user_id, duration, prof, slow, bool(repeated))
+
+        if slow:
+            HTTP_SLOW_TOTAL.inc(endpoint=endpoint)
+            dump = {
+                "at": datetime.now().isoformat(),
+                "endpoint": endpoint,
+                "method": request.method,
+                "path": request.path,
+                "user_id": user_id,
+                "duration_ms": round(duration * 1000, 2),
+                "db_queries": prof["queries"],
+                "db_ms": round(prof["db_time"] * 1000, 2),
+                "repeated_statements": [{"sql": s[:300], "count": n} for s, n in
+                                        sorted(repeated.items(), key=lambda kv: -kv[1])[:5]],
+                "stacks": [{"stack": s, "samples": n} for s, n in stacks.most_common(20)] if stacks else None
+            }
+            self.slow_dumps.append(dump)
+            log_event('http.slow_request', **{k: v for k, v in dump.items() if k != 'stacks'})
+        return response
+
+    def teardown_request(self, exc):
+        # 视图抛异常时 after_request 不会执行，这里保证采样目标被移除
+        prof = g.pop('_prof', None)
+        if prof is not None and prof["sampled"]:
+            self.sampler.stop(threading.get_ident())
+
+    def _current_user_id(self):
+        try:
+            from flask_jwt_extended import get_jwt_identity
+            identity = get_jwt_identity()
+            return int(identity) if identity else None
+        except Exception:
+            return None
+
+    def _aggregate(self, endpoint, user_id, duration, prof, slow, suspected_n_plus_one):
+        with self._lock:
+            stats = self.routes.get(endpoint)
+            if stats is None:
+                stats = self.routes[endpoint] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0,
+                    "db_queries": 0, "db_ms": 0.0, "max_db_queries": 0, "n_plus_one": 0
+                }
+            ms = duration * 1000
+            stats["count"] += 1
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], ms)
+            stats["slow"] += int(slow)
+            stats["db_queries"] += prof["queries"]
+            stats["db_ms"] += prof["db_time"] * 1000
+            stats["max_db_queries"] = max(stats["max_db_queries"], prof["queries"])
+            stats["n_plus_one"] += int(suspected_n_plus_one)
+
+            if user_id is not None:
+                user = self.users.setdefault((user_id, endpoint), {"count": 0, "total_ms": 0.0, "slow": 0})
+                user["count"] += 1
+                user["total_ms"] += ms
+                user["slow"] += int(slow)
+
+    # --- SQL 钩子 ---
+    @staticmethod
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and '_prof' in g:
+            conn.info.setdefault('_prof_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not (has_request_context() and '_prof' in g):
+            return
+        starts = conn.info.get('_prof_start')
+        if not starts:
+            return
+        prof = g._prof
+        prof["queries"] += 1
+        prof["db_time"] += time.perf_counter() - starts.pop()
+        prof["statements"][statement] = prof["statements"].get(statement, 0) + 1
+
+    # --- 报表 ---
+    def report(self, limit=20):
+        with self._lock:
+            routes = []
+            for endpoint, s in self.routes.items():
+                routes.append({
+                    "endpoint": endpoint,
+                    "count": s["count"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 2),
+                    "max_ms": round(s["max_ms"], 2),
+                    "slow": s["slow"],
+                    "avg_db_queries": round(s["db_queries"] / s["count"], 2),
+                    "max_db_queries": s["max_db_queries"],
+                    "avg_db_ms": round(s["db_ms"] / s["count"], 2),
+                    "n_plus_one_requests": s["n_plus_one"]
+                })
+            users = [{
+                "user_id": user_id,
+                "endpoint": endpoint,
+                "count": u["count"],
+                "avg_ms": round(u["total_ms"] / u["count"], 2),
+                "slow": u["slow"]
+            } for (user_id, endpoint), u in self.users.items()]
+        routes.sort(key=lambda r: r["avg_ms"] * r["count"], reverse=True)
+        users.sort(key=lambda u: u["avg_ms"] * u["count"], reverse=True)
+        return {
+            "started_at": self.started_at,
+            "slow_ms": self.slow_ms,
+            "sample_rate": self.sample_rate,
+            "routes": routes[:limit],
+            "users": users[:limit],
+            "slow_requests": list(self.slow_dumps)
+        }
+
+
+# 进程内唯一的 profiler（由 init_profiling 创建）
+request_profiler = None
+_sql_hooks_installed = False
+
+def init_profiling(app):
+    """在 create_app 中调用：注册请求钩子与 SQL 钩子"""
+    global request_profiler, _sql_hooks_installed
+    if not app.config.get('PROFILE_ENABLED'):
+        return None
+    if request_profiler is None:
+        request_profiler = RequestProfiler(app)
+    app.before_request(request_profiler.before_request)
+    app.after_request(request_profiler.after_request)
+    app.teardown_request(request_profiler.teardown_request)
+    if not _sql_hooks_installed:
+        event.listen(Engine, 'before_cursor_execute', RequestProfiler.before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', RequestProfiler.after_cursor_execute)
+        _sql_hooks_installed = True
+    return request_profiler
@@ -0,0 +1,217 @@
+# app/utils/telemetry.py
+
+import json
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+
+# ==========================================
+# 1. 追踪上下文
+# 每个生成任务一个 trace_id，从 create_generation_task 一路传到后台线程，
+# 同一线程内的所有日志/指标都自动带上它
+# ==========================================
+_local = threading.local()
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace():
+    """当前线程的追踪上下文（字典），没有时返回空字典"""
+    return getattr(_local, 'trace', None) or {}
+
+
+def set_trace_attr(key, value):
+    """给当前追踪上下文补充属性（例如后台线程里才知道的 req_key）"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace[key] = value
+
+
+@contextmanager
+def trace_context(trace_id=None, **attrs):
+    """在当前线程开启一个追踪上下文，退出时恢复原来的上下文"""
+    previous = getattr(_local, 'trace', None)
+    _local.trace = {"trace_id": trace_id or new_trace_id(), **attrs}
+    try:
+        yield _local.trace
+    finally:
+        _local.trace = previous
+
+
+# ==========================================
+# 2. 结构化日志（每行一个 JSON）
+# ==========================================
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage()
+        }
+        trace_id = current_trace().get('trace_id')
+        if trace_id:
+            data["trace_id"] = trace_id
+        data.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+logger = logging.getLogger('aigc')
+
+
+def configure_logging(app):
+    """安装 JSON 日志处理器（重复调用只安装一次）"""
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    if not any(isinstance(h.formatter, JsonFormatter) for h in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+    logger.propagate = False
+
+
+def log_event(event, level=logging.INFO, exc_info=False, **fields):
+    """输出一条结构化日志: log_event('generation.completed', status='completed', duration=1.2)"""
+    logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+
+# ==========================================
+# 3. 进程内指标（Prometheus 文本格式导出）
+# ==========================================
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self, name, help_text, labelnames=(), buckets=None):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets or self.DEFAULT_BUCKETS)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(k, dict(v, counts=list(v["counts"]))) for k, v in self._values.items()]
+        lines = []
+        for key, state in items:
+            for bound, count in zip(self.buckets, state["counts"]):
+                labels = _format_labels(self.labelnames + ('le',), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames + ('le',), key + ('+Inf',))
+            lines.append(f"{self.name}_bucket{labels} {state['count']}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {state['sum']}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# --- 生成流水线的指标 ---
+GENERATION_QUEUE_WAIT = registry.register(Histogram(
+    'aigc_generation_queue_wait_seconds', '任务创建到后台线程开始处理的等待时间'))
+GENERATION_STAGE = registry.register(Histogram(
+    'aigc_generation_stage_seconds', '生成流水线各阶段耗时', ('stage', 'req_key')))
+GENERATION_POLLS = registry.register(Histogram(
+    'aigc_upstream_polls', '每个异步任务的轮询次数', ('req_key',),
+    buckets=(0, 1, 2, 5, 10, 20, 40, 60)))
+GENERATION_TOTAL = registry.register(Counter(
+    'aigc_generation_total', '生成任务数（按 req_key 与结果）', ('req_key', 'outcome')))
+DOWNLOAD_BYTES = registry.register(Counter(
+    'aigc_download_bytes_total', '从上游下载的结果字节数'))
+GENERATION_IN_PROGRESS = registry.register(Gauge(
+    'aigc_generation_in_progress', '正在处理的生成任务数'))
+
+
+@contextmanager
+def stage_timer(stage, **fields):
+    """
+    记录一个阶段的耗时：写入 aigc_generation_stage_seconds 并输出一条 stage 日志
+    req_key 没传时取追踪上下文里的值
+    """
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except Exception:
+        status = 'error'
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        req_key = fields.pop('req_key', None) or current_trace().get('req_key', '')
+        GENERATION_STAGE.observe(duration, stage=stage, req_key=req_key)
+        log_event(f"stage.{stage}", duration=round(duration, 4), req_key=req_key, status=status, **fields)
@@ -0,0 +1,234 @@
+# bench/fake_jimeng.py
+"""
+本地假即梦 (火山引擎视觉) 服务，供压测使用，不消耗真实额度
+
+支持:
+    POST /?Action=CVSync2AsyncSubmitTask   提交异步任务
+    POST /?Action=CVSync2AsyncGetResult    查询异步任务
+    POST /?Action=CVProcess                同步文生图
+    GET  /files/<name>                     下载结果文件
+    POST /admin/outage?seconds=N           模拟上游宕机 N 秒（所有接口返回 503），用于验证熔断
+
+用法 (在 backend 目录下):
+    python -m bench.fake_jimeng --port 9100 --processing 1.5 --failure-rate 0.05
+
+不稳定上游（验证重试/对冲/熔断）:
+    python -m bench.fake_jimeng --http-error-rate 0.2 --throttle-rate 0.1 --slow-rate 0.1 --slow-latency 8
+
+业务错误（HTTP 400 + 审核不通过，验证不重试、不计入熔断）:
+    python -m bench.fake_jimeng --reject-rate 0.1
+
+后端指向它:
+    VOLC_API_HOST=127.0.0.1:9100 VOLC_API_SCHEME=http JIMENG_IMAGE_POLL_INTERVAL=0.5 python run.py
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeJimeng:
+    def __init__(self, submit_latency=0.05, submit_jitter=0.02, processing=1.0, processing_jitter=0.5,
+                 failure_rate=0.0, http_error_rate=0.0, download_size=200 * 1024, download_latency=0.0,
+                 throttle_rate=0.0, slow_rate=0.0, slow_latency=5.0, reject_rate=0.0):
+        self.submit_latency = submit_latency
+        self.submit_jitter = submit_jitter
+        self.processing = processing
+        self.processing_jitter = processing_jitter
+        self.failure_rate = failure_rate
+        self.http_error_rate = http_error_rate
+        self.download_latency = download_latency
+        self.throttle_rate = throttle_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.reject_rate = reject_rate
+        self.outage_until = 0.0
+        self.payload = os.urandom(download_size)
+        self.tasks = {}
+        self.lock = threading.Lock()
+        self.stats = {"submit": 0, "get_result": 0, "cv_process": 0, "download": 0, "http_errors": 0,
+                      "throttled": 0, "slow": 0, "outage": 0, "rejected": 0}
+
+    def _sleep(self, base, jitter):
+        if base or jitter:
+            time.sleep(max(0.0, base + random.uniform(-jitter, jitter)))
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def file_url(self, host, req_key):
+        ext = 'mp4' if ('t2v' in req_key or 'i2v' in req_key) else 'jpg'
+        return f"http://{host}/files/{uuid.uuid4().hex}.{ext}"
+
+    # --- 接口实现，返回 (HTTP 状态码, JSON) ---
+    def reject(self):
+        """输入审核不通过：与真实接口一样以 HTTP 400 返回业务错误码"""
+        self._count("rejected")
+        return 400, {"code": 50411, "message": "Pre Img Risk Not Pass", "data": None}
+
+    def submit(self, body):
+        self._count("submit")
+        self._sleep(self.submit_latency, self.submit_jitter)
+        if random.random() < self.reject_rate:
+            return self.reject()
+        task_id = uuid.uuid4().hex
+        duration = max(0.0, self.processing + random.uniform(-self.processing_jitter, self.processing_jitter))
+        with self.lock:
+            self.tasks[task_id] = {
+                "req_key": body.get("req_key", ""),
+                "ready_at": time.time() + duration,
+                "fail": random.random() < self.failure_rate
+            }
+        return 200, {"code": 10000, "message": "Success", "data": {"task_id": task_id}}
+
+    def get_result(self, body, host):
+        self._count("get_result")
+        with self.lock:
+            task = self.tasks.get(body.get("task_id"))
+        if task is None:
+            return 200, {"code": 10000, "message": "Success", "data": {"status": "not_found"}}
+        if time.time() < task["ready_at"]:
+            return 200, {"code": 10000, "message": "Success", "data": {"status": "generating"}}
+        if task["fail"]:
+            return 200, {"code": 50413, "message": "Post Img Risk Not Pass",
+                         "data": {"status": "failed", "algorithm_base_resp": {"status_message": "fake failure"}}}
+        data = {"status": "done"}
+        url = self.file_url(host, task["req_key"])
+        if url.endswith('.mp4'):
+            data["video_url"] = url
+        else:
+            data["image_urls"] = [url]
+        return 200, {"code": 10000, "message": "Success", "data": data}
+
+    def cv_process(self, body, host):
+        self._count("cv_process")
+        self._sleep(self.submit_latency + self.processing, self.processing_jitter)
+        if random.random() < self.reject_rate:
+            return self.reject()
+        if random.random() < self.failure_rate:
+            return 200, {"code": 50413, "message": "Post Img Risk Not Pass", "data": None}
+        return 200, {"code": 10000, "message": "Success",
+                     "data": {"image_urls": [self.file_url(host, body.get("req_key", ""))]}}
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, data, content_type='application/json'):
+            body = data if isinstance(data, bytes) else json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            try:
+                body = json.loads(raw or b'{}')
+            except ValueError:
+                body = dict((k, v[0]) for k, v in parse_qs(raw.decode('utf-8')).items())
+            action = parse_qs(urlparse(self.path).query).get('Action', [''])[0]
+            host = self.headers.get('Host')
+
+            path = urlparse(self.path).path
+            if path == '/admin/outage':
+                seconds = float(parse_qs(urlparse(self.path).query).get('seconds', ['30'])[0])
+                fake.outage_until = time.time() + seconds
+                return self._send(200, {"outage_until": fake.outage_until})
+
+            if time.time() < fake.outage_until:
+                fake._count("outage")
+                return self._send(503, {"ResponseMetadata": {"Error": {"Code": "ServiceUnavailable"}}})
+            if random.random() < fake.http_error_rate:
+                fake._count("http_errors")
+                return self._send(500, {"ResponseMetadata": {"Error": {"Code": "InternalError"}}})
+            if random.random() < fake.throttle_rate:
+                fake._count("throttled")
+                return self._send(429, {"code": 50429, "message": "Request Has Reached API Limit", "data": None})
+            if random.random() < fake.slow_rate:
+                # 长尾响应：用于验证 GetResult 对冲
+                fake._count("slow")
+                time.sleep(fake.slow_latency)
+
+            if action == 'CVSync2AsyncSubmitTask':
+                status, data = fake.submit(body)
+            elif action == 'CVSync2AsyncGetResult':
+                status, data = fake.get_result(body, host)
+            elif action == 'CVProcess':
+                status, data = fake.cv_process(body, host)
+            else:
+                status, data = 400, {"message": f"unknown action {action}"}
+            self._send(status, data)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                return self._send(200, fake.stats)
+            if not self.path.startswith('/files/'):
+                return self._send(404, {"message": "not found"})
+            fake._count("download")
+            fake._sleep(fake.download_latency, 0)
+            content_type = 'video/mp4' if self.path.endswith('.mp4') else 'image/jpeg'
+            self._send(200, fake.payload, content_type)
+
+    return Handler
+
+
+def serve(port=9100, host='127.0.0.1', **options):
+    """创建假服务，返回 (fake, server)；调用 server.serve_forever() 开始服务，也可以放到线程里运行"""
+    fake = FakeJimeng(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    return fake, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假即梦服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--submit-latency', type=float, default=0.05, help="提交接口延迟（秒）")
+    parser.add_argument('--submit-jitter', type=float, default=0.02)
+    parser.add_argument('--processing', type=float, default=1.0, help="任务处理耗时（秒）")
+    parser.add_argument('--processing-jitter', type=float, default=0.5)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="任务失败（审核不通过）比例")
+    parser.add_argument('--reject-rate', type=float, default=0.0, help="以 HTTP 400 返回审核不通过 (code 50411) 的比例")
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help="直接返回 HTTP 500 的比例")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="返回 429 限流 (code 50429) 的比例")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="响应被拖慢的比例")
+    parser.add_argument('--slow-latency', type=float, default=5.0, help="被拖慢的响应额外延迟（秒）")
+    parser.add_argument('--download-size', type=int, default=200 * 1024, help="结果文件大小（字节）")
+    parser.add_argument('--download-latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake, server = serve(
+        port=args.port, host=args.host,
+        submit_latency=args.submit_latency, submit_jitter=args.submit_jitter,
+        processing=args.processing, processing_jitter=args.processing_jitter,
+        failure_rate=args.failure_rate, http_error_rate=args.http_error_rate,
+        download_size=args.download_size, download_latency=args.download_latency,
+        throttle_rate=args.throttle_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        reject_rate=args.reject_rate
+    )
+    print(f"fake jimeng listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+# bench/fake_thirdweb.py
+"""
+本地假 thirdweb 服务（IPFS 存储 + ERC721 mint），用于调试批量 mint，不上链也不消耗 gas
+
+支持:
+    POST /ipfs/upload                          上传文件 / metadata（multipart 或 JSON），返回 IpfsHash
+    POST /contract/<address>/erc721/mint       mint，返回 tokenId 与 transactionHash
+    GET  /stats                                请求计数与已 mint 的数量
+    POST /admin/outage?seconds=N               模拟服务宕机 N 秒（所有接口返回 503）
+
+用法 (在 backend 目录下):
+    python -m bench.fake_thirdweb --port 9200 --mint-latency 0.5
+
+不稳定服务（验证上传重试与 mint 不重复）:
+    python -m bench.fake_thirdweb --http-error-rate 0.2 --throttle-rate 0.1 --drop-rate 0.1
+
+后端指向它:
+    THIRDWEB_STORAGE_UPLOAD_URL=http://127.0.0.1:9200/ipfs/upload \\
+    THIRDWEB_API_BASE_URL=http://127.0.0.1:9200 python run.py
+"""
+
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeThirdweb:
+    def __init__(self, upload_latency=0.05, mint_latency=0.3, http_error_rate=0.0, throttle_rate=0.0,
+                 drop_rate=0.0):
+        self.upload_latency = upload_latency
+        self.mint_latency = mint_latency
+        self.http_error_rate = http_error_rate
+        self.throttle_rate = throttle_rate
+        # 读完请求、mint 成功之后直接断开连接，客户端看到的是 "Connection aborted"
+        self.drop_rate = drop_rate
+        self.outage_until = 0.0
+        self.next_token_id = 0
+        self.minted = []
+        self.lock = threading.Lock()
+        self.stats = {"upload": 0, "mint": 0, "http_errors": 0, "throttled": 0, "dropped": 0, "outage": 0}
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    # --- 接口实现，返回 (HTTP 状态码, JSON) ---
+    def upload(self, raw):
+        self._count("upload")
+        time.sleep(self.upload_latency)
+        # 与 IPFS 一样按内容寻址：相同内容得到相同的 CID
+        cid = "Qm" + hashlib.sha256(raw).hexdigest()[:44]
+        return 200, {"IpfsHash": cid, "uri": f"ipfs://{cid}"}
+
+    def mint(self, contract, body):
+        self._count("mint")
+        if not body.get("to") or not body.get("metadataUri"):
+            return 400, {"error": "to and metadataUri are required"}
+        time.sleep(self.mint_latency)
+        with self.lock:
+            token_id = self.next_token_id
+            self.next_token_id += 1
+            self.minted.append({"token_id": token_id, "to": body["to"], "metadata_uri": body["metadataUri"]})
+        return 200, {"tokenId": str(token_id), "transactionHash": "0x" + uuid.uuid4().hex + uuid.uuid4().hex,
+                     "contractAddress": contract}
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, data):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            parsed = urlparse(self.path)
+
+            if parsed.path == '/admin/outage':
+                seconds = float(parse_qs(parsed.query).get('seconds', ['30'])[0])
+                fake.outage_until = time.time() + seconds
+                return self._send(200, {"outage_until": fake.outage_until})
+
+            if time.time() < fake.outage_until:
+                fake._count("outage")
+                return self._send(503, {"error": "Service Unavailable"})
+            if random.random() < fake.http_error_rate:
+                fake._count("http_errors")
+                return self._send(500, {"error": "Internal Server Error"})
+            if random.random() < fake.throttle_rate:
+                fake._count("throttled")
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            parts = parsed.path.strip('/').split('/')
+            if parsed.path == '/ipfs/upload':
+                status, data = fake.upload(raw)
+            elif len(parts) == 4 and parts[0] == 'contract' and parts[2:] == ['erc721', 'mint']:
+                try:
+                    body = json.loads(raw or b'{}')
+                except ValueError:
+                    return self._send(400, {"error": "invalid json"})
+                status, data = fake.mint(parts[1], body)
+                if status == 200 and random.random() < fake.drop_rate:
+                    # 已经 mint 了但不返回响应
+                    fake._count("dropped")
+                    self.close_connection = True
+                    return
+            else:
+                status, data = 404, {"error": "not found"}
+            self._send(status, data)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                with fake.lock:
+                    return self._send(200, {**fake.stats, "minted": len(fake.minted)})
+            self._send(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(port=9200, host='127.0.0.1', **options):
+    """创建假服务，返回 (fake, server)；调用 server.serve_forever() 开始服务，也可以放到线程里运行"""
+    fake = FakeThirdweb(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    return fake, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假 thirdweb 服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9200)
+    parser.add_argument('--upload-latency', type=float, default=0.05, help="上传接口延迟（秒）")
+    parser.add_argument('--mint-latency', type=float, default=0.3, help="mint 接口延迟（秒）")
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help="直接返回 HTTP 500 的比例")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="返回 429 限流的比例")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="mint 成功后不返回响应、直接断开的比例")
+    args = parser.parse_args()
+
+    fake, server = serve(
+        port=args.port, host=args.host,
+        upload_latency=args.upload_latency, mint_latency=args.mint_latency,
+        http_error_rate=args.http_error_rate, throttle_rate=args.throttle_rate, drop_rate=args.drop_rate
+    )
+    print(f"fake thirdweb listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
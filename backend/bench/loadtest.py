@@ -0,0 +1,345 @@
+# bench/loadtest.py
+"""
+后端接口压测
+
+场景:
+    auth        注册 + 登录
+    upload      上传参考图
+    generation  发起生成任务并轮询到结束（配合 bench/fake_jimeng.py）
+    favorites   收藏夹 查询 / 新增 / 批量新增 / 删除
+
+用法 (在 backend 目录下，后端与假即梦服务已启动):
+    python -m bench.loadtest --base-url http://127.0.0.1:5000 --concurrency 8 --iterations 20
+    python -m bench.loadtest --save-baseline bench/baseline.json
+    python -m bench.loadtest --compare bench/baseline.json --tolerance 0.2
+
+每个场景输出吞吐量、各步骤的 p50/p95/p99，以及涉及接口的平均 SQL 条数（从 /metrics 读取）
+--compare 发现退化时以退出码 1 结束，可以接到 CI 里
+"""
+
+import io
+import re
+import sys
+import json
+import time
+import zlib
+import uuid
+import struct
+import argparse
+import threading
+import platform
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+SCENARIOS = ('auth', 'upload', 'generation', 'favorites')
+
+
+# ==========================================
+# 1. 工具
+# ==========================================
+def make_png(width=64, height=64):
+    """生成一张纯色 PNG（不依赖 Pillow）"""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+    row = b'\x00' + b'\x80\x40\xc0' * width
+    raw = row * height
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw))
+            + chunk(b'IEND', b''))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Recorder:
+    """按步骤记录耗时与错误"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, op, duration, ok=True):
+        with self._lock:
+            self.samples.setdefault(op, []).append(duration)
+            if not ok:
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+    def summary(self):
+        result = {}
+        for op, values in self.samples.items():
+            values = sorted(values)
+            result[op] = {
+                "count": len(values),
+                "errors": self.errors.get(op, 0),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2)
+            }
+        return result
+
+
+METRIC_LINE = re.compile(r'^aigc_http_db_queries_(sum|count)\{endpoint="([^"]*)"\} ([0-9.eE+-]+)$')
+
+def scrape_db_queries(session, metrics_url, token=None):
+    """读取 /metrics 中每个接口的 SQL 条数累计值: {endpoint: [sum, count]}"""
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    try:
+        text = session.get(metrics_url, headers=headers, timeout=10).text
+    except requests.RequestException:
+        return {}
+    result = {}
+    for line in text.splitlines():
+        m = METRIC_LINE.match(line)
+        if m:
+            kind, endpoint, value = m.groups()
+            entry = result.setdefault(endpoint, [0.0, 0.0])
+            entry[0 if kind == 'sum' else 1] = float(value)
+    return result
+
+
+# ==========================================
+# 2. 客户端
+# ==========================================
+class ApiClient:
+    def __init__(self, base_url, recorder, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.token = None
+
+    def call(self, op, method, path, **kwargs):
+        """发送请求并记录耗时；业务 code 不是 200 也算错误"""
+        headers = kwargs.pop('headers', {})
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        ok = False
+        body = {}
+        try:
+            resp = self.session.request(method, self.base_url + path, headers=headers,
+                                        timeout=self.timeout, **kwargs)
+            body = resp.json()
+            ok = resp.status_code < 400 and (not isinstance(body, dict) or body.get('code', 200) in (200, 201))
+        except (requests.RequestException, ValueError):
+            pass
+        self.recorder.record(op, time.perf_counter() - start, ok)
+        return ok, body
+
+    def register_and_login(self, prefix='bench'):
+        account = f"{prefix}_{uuid.uuid4().hex[:10]}"
+        password = "Bench@1234"
+        self.call('auth.register', 'POST', '/api/v1/auth/register',
+                  json={"account": account, "email": f"{account}@bench.local", "password": password})
+        ok, body = self.call('auth.login', 'POST', '/api/v1/auth/login',
+                             json={"account": account, "password": password})
+        if ok:
+            self.token = body['data']['token']
+        return ok
+
+
+# ==========================================
+# 3. 场景
+# ==========================================
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.png = make_png()
+
+    def _client(self, recorder, login=True):
+        client = ApiClient(self.args.base_url, recorder)
+        if login and not client.register_and_login():
+            raise RuntimeError("登录失败，确认后端已启动")
+        return client
+
+    def scenario_auth(self, recorder, worker):
+        client = ApiClient(self.args.base_url, recorder)
+        for _ in range(self.args.iterations):
+            client.token = None
+            client.register_and_login()
+
+    def scenario_upload(self, recorder, worker):
+        client = self._client(recorder)
+        for _ in range(self.args.iterations):
+            client.call('upload', 'POST', '/api/v1/upload',
+                        files={"file": ("bench.png", io.BytesIO(self.png), "image/png")})
+
+    def scenario_generation(self, recorder, worker):
+        client = self._client(recorder)
+        for i in range(self.args.iterations):
+            gen_type = self.args.generation_types[i % len(self.args.generation_types)]
+            start = time.perf_counter()
+            ok, body = client.call('generation.create', 'POST', '/api/v1/generation',
+                                   json={"prompt": f"bench prompt {worker}-{i}", "type": gen_type})
+            if not ok:
+                continue
+            task_id = body['data']['task_id']
+            deadline = time.time() + self.args.poll_timeout
+            finished = False
+            while time.time() < deadline:
+                time.sleep(self.args.poll_interval)
+                _, status_body = client.call('generation.poll', 'GET', f'/api/v1/generation/{task_id}')
+                status = (status_body.get('data') or {}).get('status')
+                if status in ('completed', 'failed'):
+                    finished = status == 'completed'
+                    break
+            recorder.record('generation.e2e', time.perf_counter() - start, finished)
+
+    def scenario_favorites(self, recorder, worker):
+        client = self._client(recorder)
+        for i in range(self.args.iterations):
+            client.call('favorites.list', 'GET', '/api/v1/user/favorite_list')
+            ok, body = client.call('favorites.create', 'POST', '/api/v1/user/favorite_list',
+                                   json={"parent_id": None, "name": f"folder_{i}", "node_type": "folder"})
+            items = [{"temp_id": 1, "name": f"batch_{i}", "node_type": "folder"}]
+            items += [{"temp_id": k, "parent_temp_id": 1, "name": f"child_{k}", "node_type": "folder"}
+                      for k in range(2, 2 + self.args.batch_size)]
+            batch_ok, batch_body = client.call('favorites.batch', 'POST', '/api/v1/user/favorite_list/batch',
+                                               json={"items": items})
+            if ok:
+                client.call('favorites.delete', 'DELETE', f"/api/v1/user/favorite_list/{body['data']['id']}")
+            # 批量创建的整棵子树也删掉（删除是递归的），否则收藏树逐次变大，favorites.list 的延迟会漂移
+            batch_root = ((batch_body.get('data') or {}).get('mapping') or {}).get('1') if batch_ok else None
+            if batch_root:
+                client.call('favorites.delete', 'DELETE', f"/api/v1/user/favorite_list/{batch_root}")
+
+    def run_scenario(self, name):
+        recorder = Recorder()
+        metrics_session = requests.Session()
+        before = scrape_db_queries(metrics_session, self.args.metrics_url, self.args.metrics_token)
+        runner = getattr(self, f"scenario_{name}")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            futures = [pool.submit(runner, recorder, w) for w in range(self.args.concurrency)]
+            for f in futures:
+                f.result()
+        wall = time.perf_counter() - start
+
+        after = scrape_db_queries(metrics_session, self.args.metrics_url, self.args.metrics_token)
+        db = {}
+        for endpoint, (total, count) in after.items():
+            prev_total, prev_count = before.get(endpoint, (0.0, 0.0))
+            if count > prev_count:
+                db[endpoint] = {
+                    "requests": int(count - prev_count),
+                    "avg_queries": round((total - prev_total) / (count - prev_count), 2)
+                }
+
+        ops = recorder.summary()
+        total_ops = sum(op["count"] for key, op in ops.items() if key != 'generation.e2e')
+        return {
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(total_ops / wall, 2) if wall else 0,
+            "ops": ops,
+            "db": db
+        }
+
+    def run(self):
+        results = {}
+        for name in self.args.scenarios:
+            print(f"== {name} (concurrency={self.args.concurrency}, iterations={self.args.iterations})")
+            results[name] = self.run_scenario(name)
+            print_scenario(results[name])
+        return {
+            "meta": {
+                "created_at": datetime.now().isoformat(),
+                "base_url": self.args.base_url,
+                "concurrency": self.args.concurrency,
+                "iterations": self.args.iterations,
+                "python": platform.python_version()
+            },
+            "scenarios": results
+        }
+
+
+# ==========================================
+# 4. 报告与基线对比
+# ==========================================
+def print_scenario(result):
+    print(f"   throughput: {result['throughput_rps']} req/s   wall: {result['wall_seconds']}s")
+    print(f"   {'op':<20}{'count':>7}{'err':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for op, s in sorted(result['ops'].items()):
+        print(f"   {op:<20}{s['count']:>7}{s['errors']:>6}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    for endpoint, d in sorted(result['db'].items()):
+        print(f"   db  {endpoint:<40} {d['requests']:>6} req  {d['avg_queries']:>7} queries/req")
+
+
+def compare(current, baseline, tolerance):
+    """返回退化列表：p95 变慢、吞吐下降、SQL 条数增加超过容差"""
+    regressions = []
+    for name, cur in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base["throughput_rps"] and cur["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {cur['throughput_rps']} req/s")
+        for op, s in cur["ops"].items():
+            b = base["ops"].get(op)
+            if b and b["p95_ms"] and s["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}.{op}: p95 {b['p95_ms']} -> {s['p95_ms']} ms")
+        for endpoint, d in cur["db"].items():
+            b = base["db"].get(endpoint)
+            if b and d["avg_queries"] > b["avg_queries"] * (1 + tolerance):
+                regressions.append(f"{name} {endpoint}: queries/req {b['avg_queries']} -> {d['avg_queries']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="后端接口压测")
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--metrics-url', default=None, help="默认 {base-url}/metrics")
+    parser.add_argument('--metrics-token', default=None)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=20, help="每个并发 worker 执行的轮数")
+    parser.add_argument('--generation-types', default='t2i', help="逗号分隔，例如 t2i,t2v")
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--poll-timeout', type=float, default=120)
+    parser.add_argument('--batch-size', type=int, default=10, help="批量新增收藏夹时每批的节点数")
+    parser.add_argument('--save-baseline', default=None, help="把结果写入基线文件")
+    parser.add_argument('--compare', default=None, help="与基线文件对比")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="对比时允许的退化比例")
+    args = parser.parse_args(argv)
+    args.scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知场景: {', '.join(sorted(unknown))}")
+    args.generation_types = [t for t in args.generation_types.split(',') if t]
+    args.metrics_url = args.metrics_url or args.base_url.rstrip('/') + '/metrics'
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = LoadTest(args).run()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print("no regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
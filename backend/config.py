@@ -21,12 +21,122 @@ class Config:
     # 即梦 AI (火山引擎) 的密钥
     VOLC_ACCESS_KEY_ID = "AKLTZGM1MTMxY2Q5ODg2NDFkMWE3ODI2MGYwODQ2NmUwNDQ"
     VOLC_SECRET_ACCESS_KEY = "TUdZMk56RTJORFZrT1RNd05ETTVZams0WXpFNVlqUmtaREZrWXpFNU16WQ=="
+    # 即梦接口地址与轮询间隔（压测时可指向 bench/fake_jimeng.py 启动的假服务）
+    VOLC_API_HOST = os.environ.get('VOLC_API_HOST', 'visual.volcengineapi.com')
+    VOLC_API_SCHEME = os.environ.get('VOLC_API_SCHEME', 'https')
+    JIMENG_IMAGE_POLL_INTERVAL = float(os.environ.get('JIMENG_IMAGE_POLL_INTERVAL', 2))
+    JIMENG_VIDEO_POLL_INTERVAL = float(os.environ.get('JIMENG_VIDEO_POLL_INTERVAL', 5))
+
+    # 即梦调用限流：按 req_key 配置 QPS(令牌桶) 与并发数，没有单独配置的用 default
+    # 多进程/多机部署时改用 redis，所有 worker 共享同一份配额
+    UPSTREAM_LIMITER_BACKEND = os.environ.get('UPSTREAM_LIMITER_BACKEND', 'memory')
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+    UPSTREAM_RATE_LIMITS = {
+        'default': {'qps': 2, 'burst': 2, 'concurrency': 2},
+        'jimeng_high_aes_general_v21_L': {'qps': 1, 'burst': 1, 'concurrency': 1},
+        'jimeng_t2v_v30_1080p': {'qps': 2, 'burst': 2, 'concurrency': 2},
+        'jimeng_i2v_first_v30_1080': {'qps': 2, 'burst': 2, 'concurrency': 2}
+    }
+    UPSTREAM_LIMITER_MAX_WAIT = 300     # 排队超过这个时间（秒）放弃并记为失败
+
+    # 即梦调用容错：按操作配置重试次数与退避（full jitter），poll 可以开启对冲请求
+    #   submit 提交任务：超时后重试可能产生重复任务，只做少量重试
+    #   poll   查询结果：幂等，放宽重试；hedge_after 秒未返回就并发再查一次，取先返回的
+    #   sync   文生图同步接口：不幂等，默认只重试一次
+    UPSTREAM_RESILIENCE = {
+        'default': {'max_attempts': 3, 'base_delay': 0.5, 'max_delay': 10},
+        'submit': {'max_attempts': 3, 'base_delay': 1, 'max_delay': 8},
+        'poll': {'max_attempts': 6, 'base_delay': 0.5, 'max_delay': 15, 'hedge_after': 5},
+        'sync': {'max_attempts': 2, 'base_delay': 2, 'max_delay': 10}
+    }
+    # 熔断：连续失败 failure_threshold 次后打开，reset_timeout 秒后放行一个探测请求；
+    # 打开期间新调用最多排队 queue_wait 秒等待恢复，超时才失败
+    UPSTREAM_CIRCUIT = {'failure_threshold': 5, 'reset_timeout': 30, 'queue_wait': 120}
+    UPSTREAM_HEDGE_POOL_SIZE = 8
+
+    # 生成任务调度：快慢两条通道各自的工作线程数与单任务耗时初始估计（秒，用于预计开始时间）
+    # 通道内按用户加权公平排队，权重按 User.role 配置（管理端可在运行时调整）
+    GENERATION_LANES = {
+        'fast': {'types': ['t2i', 'i2i'], 'workers': 4, 'est_seconds': 20},
+        'slow': {'types': ['t2v', 'i2v'], 'workers': 2, 'est_seconds': 180}
+    }
+    GENERATION_ROLE_WEIGHTS = {'user': 1, 'admin': 4}
+    GENERATION_BATCH_MAX_ITEMS = 50           # 批量发起任务单次最多条数
+    GENERATION_BATCH_STATUS_MAX_IDS = 200     # 批量查询状态单次最多条数
+    # 启动时恢复未完成的任务：超过这个时间的直接标记失败，其余重新入队（已提交的继续轮询）
+    GENERATION_RECOVERY_ENABLED = True
+    GENERATION_RECOVERY_MAX_AGE_HOURS = 6
+
+    # 客户端增量同步生成记录：每页条数、游标回看秒数（覆盖提交晚于游标的记录）、墓碑保留天数
+    # 游标比墓碑保留时间还旧的客户端会被要求全量同步
+    GENERATION_SYNC_PAGE_SIZE = 500
+    GENERATION_SYNC_OVERLAP_SECONDS = 5
+    GENERATION_TOMBSTONE_TTL_DAYS = 30
+
+    # 生成记录搜索：单页最大条数；ngram_token_size（MySQL 默认 2），比它短的词改用 LIKE
+    GENERATION_SEARCH_MAX_PAGE_SIZE = 100
+    GENERATION_SEARCH_NGRAM_SIZE = 2
+
+    # 文生图结果缓存：相同 prompt（归一化后）+ 模型参数直接复用已有结果
+    # off 关闭；user 只复用同一用户的结果；global 所有用户共用
+    PROMPT_CACHE_POLICY = os.environ.get('PROMPT_CACHE_POLICY', 'off')
+    PROMPT_CACHE_MAX_ENTRIES = 10000
+    PROMPT_CACHE_TTL = 24 * 3600            # 秒
+
     # 图片保存的根目录
     OUTPUTS_DIR = os.path.join(os.path.abspath(os.path.dirname(__name__)), 'generated_outputs')
 
     # 参考图片保存目录
     REF_DIR = os.path.join(os.path.abspath(os.path.dirname(__name__)), 'reference_images')
-    
+
+    # 分片上传：分片临时目录、单片大小、单文件大小上限
+    UPLOAD_CHUNK_DIR = os.path.join(REF_DIR, '.chunks')
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+
+    # 上传图片标准化：标准版本 / 预览版本的最长边与 JPEG 质量
+    IMAGE_CANONICAL_MAX_SIDE = 2048
+    IMAGE_CANONICAL_QUALITY = 90
+    IMAGE_PREVIEW_MAX_SIDE = 256
+    IMAGE_PREVIEW_QUALITY = 80
+
+    # 存储生命周期：后台清理孤儿文件、过期上传，并按用户限制占用空间
+    STORAGE_SWEEPER_ENABLED = True
+    STORAGE_SWEEP_INTERVAL = 2              # 每批之间的间隔（秒）
+    STORAGE_SWEEP_BATCH_SIZE = 500          # 每批最多处理的目录项/记录数
+    STORAGE_ORPHAN_GRACE_SECONDS = 3600     # 比这更新的文件不参与对账
+    STORAGE_REF_TTL_DAYS = 7                # 参考图最后一次被引用后的保留天数
+    UPLOAD_SESSION_TTL_HOURS = 24           # 未完成的分片上传保留小时数
+    STORAGE_USER_QUOTA_BYTES = 2 * 1024 * 1024 * 1024   # 每个用户的空间上限，0 表示不限制
+
+    # 结果/参考图存储后端: 'local' 使用上面的本地目录; 's3' 使用 S3 兼容对象存储 (本地联调可用 MinIO)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'http://127.0.0.1:9000')
+    S3_BUCKET = os.environ.get('S3_BUCKET', 'aigc')
+    S3_PREFIX = os.environ.get('S3_PREFIX', '')
+    S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+    S3_ACCESS_KEY = os.environ.get('S3_ACCESS_KEY', 'minioadmin')
+    S3_SECRET_KEY = os.environ.get('S3_SECRET_KEY', 'minioadmin')
+    S3_PRESIGN_REDIRECT = True          # /outputs 直接 302 到预签名地址，API 节点不转发文件
+    S3_PRESIGN_EXPIRES = 3600
+    S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+    S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+    STORAGE_META_CACHE_SIZE = 4096      # 进程内文件元数据缓存条数
+    STORAGE_META_CACHE_TTL = 60         # 秒
+
+    # 日志与指标
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    # 不为空时 /metrics 需要带 Authorization: Bearer <token>
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+    # 请求级性能剖析（开销很小，可以在生产环境常开）
+    PROFILE_ENABLED = True
+    PROFILE_SLOW_MS = 500                   # 超过这个耗时的请求记为慢请求
+    PROFILE_SAMPLE_RATE = 0.05              # 抽样做栈采样的请求比例
+    PROFILE_SAMPLE_INTERVAL = 0.01          # 栈采样间隔（秒）
+    PROFILE_MAX_DUMPS = 50                  # 最多保留的慢请求记录数
+    PROFILE_N_PLUS_ONE_THRESHOLD = 10       # 同一条 SQL 在一个请求中执行超过这个次数视为 N+1
+
     SERVER_NAME = "127.0.0.1:5000"
     
     # (可选，但推荐) 明确指定 URL 方案
@@ -42,6 +152,18 @@ class Config:
     THIRDWEB_CLIENT_ID = os.getenv("THIRDWEB_CLIENT_ID", "")
     THIRDWEB_NFT_CONTRACT = os.getenv("THIRDWEB_NFT_CONTRACT", "")
 
+    # thirdweb 接口地址（测试时可指向本地的假服务）、连接池与重试
+    THIRDWEB_STORAGE_UPLOAD_URL = os.getenv("THIRDWEB_STORAGE_UPLOAD_URL", "https://storage.thirdweb.com/ipfs/upload")
+    THIRDWEB_API_BASE_URL = os.getenv("THIRDWEB_API_BASE_URL", "https://api.thirdweb.com")
+    THIRDWEB_CONNECT_TIMEOUT = 5
+    THIRDWEB_READ_TIMEOUT = 60
+    THIRDWEB_MAX_RETRIES = 3
+    THIRDWEB_RETRY_BACKOFF = 0.5        # 秒，按 2^n 递增
+    THIRDWEB_POOL_SIZE = 10
+    NFT_MINT_CONCURRENCY = 4            # 批量 mint 的并发数
+    NFT_METADATA_BATCH_SIZE = 50        # 每次打包上传的 metadata 份数
+    NFT_JOB_STREAM_INTERVAL = 1         # 进度推送检查间隔（秒）
+
 
     # ⭐️⭐️⭐️ 新增邮件配置 (以QQ邮箱为例) ⭐️⭐️⭐️
     MAIL_SERVER = 'smtp.qq.com'          # QQ邮箱服务器
@@ -3,8 +3,11 @@
 # --- 关键点 3 ---
 # 这里，我们从 app 包中，导入 create_app 函数和 db 对象
 # 这能够成功的前提是：VS Code 的工作目录必须是 backend
+import os
 from app import create_app, db
 from app.models import User # 导入模型，确保 create_all 能找到它们
+from app.services.storage_service import start_storage_sweeper
+from app.services.generation_recovery import recover_generations
 
 app = create_app()
 
@@ -13,6 +16,16 @@ if __name__ == '__main__':
     # 这样 SQLAlchemy 才能知道连接哪个数据库
     with app.app_context():
         db.create_all()
+
+    debug = True
+
+    # 启动后台存储清理线程
+    # debug 模式下 reloader 会再起一个子进程，只在真正提供服务的子进程里启动
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_storage_sweeper(app)
+        # 对账重启前未完成的生成任务：过期的标记失败，其余重新入队
+        if app.config.get('GENERATION_RECOVERY_ENABLED'):
+            recover_generations(app)
     
     # 启动Web服务器
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=debug)
\ No newline at end of file